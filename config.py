@@ -20,7 +20,34 @@ REFERRAL_THRESHOLD = 10    # 10 referrals for 1 month premium
 
 # Database configuration
 DATABASE_PATH = "language_bot.db"
+DB_POOL_READERS = int(os.getenv("DB_POOL_READERS", "4"))  # reader connections besides the single writer
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))  # page cache per connection
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))  # 64 MB memory-mapped I/O
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))  # wait on locks instead of failing
+ACTIVITY_FLUSH_MS = int(os.getenv("ACTIVITY_FLUSH_MS", "1000"))  # write-behind flush interval
+ACTIVITY_FLUSH_EVENTS = int(os.getenv("ACTIVITY_FLUSH_EVENTS", "200"))  # flush early after this many events
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))  # user rows kept in memory
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))  # seconds before a cached row is reloaded
+PREMIUM_CACHE_TTL = int(os.getenv("PREMIUM_CACHE_TTL", "3600"))  # safety reload for entitlement entries
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "10"))  # rows kept in the leaderboard snapshot, at least 10
+LEADERBOARD_REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "10"))  # snapshot rebuild interval
+SEND_RATE_PER_SEC = float(os.getenv("SEND_RATE_PER_SEC", "29"))  # global cap, Telegram allows ~30 msg/s
+SEND_PER_CHAT_INTERVAL = float(os.getenv("SEND_PER_CHAT_INTERVAL", "1.0"))  # min seconds between messages to one chat
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "8"))  # concurrent senders in a bulk send
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))  # retries per message on flood wait or network errors
+SEND_BACKOFF_BASE = float(os.getenv("SEND_BACKOFF_BASE", "1.0"))  # first retry delay in seconds, doubled each time
+SEND_BACKOFF_MAX = float(os.getenv("SEND_BACKOFF_MAX", "30"))  # cap on a single retry delay
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))  # campaign recipients sent per checkpoint
+RECIPIENT_PAGE_SIZE = int(os.getenv("RECIPIENT_PAGE_SIZE", "500"))  # users read per page when streaming recipients
 
 # Scheduler configuration
 MOTIVATIONAL_MESSAGE_HOUR = 10  # 10 AM weekly messages
 PREMIUM_PROMOTION_DAYS = [1, 15]  # 1st and 15th of each month
+REMINDER_CATCHUP_MINUTES = int(os.getenv("REMINDER_CATCHUP_MINUTES", "60"))  # missed reminder minutes are still sent up to this late
+DEFAULT_TZ_OFFSET_MINUTES = int(os.getenv("DEFAULT_TZ_OFFSET_MINUTES", "300"))  # Tashkent, UTC+5
+CAMPAIGN_WINDOW_MINUTES = int(os.getenv("CAMPAIGN_WINDOW_MINUTES", "120"))  # scheduled campaigns are spread over this long
+CAMPAIGN_POLL_SECONDS = float(os.getenv("CAMPAIGN_POLL_SECONDS", "5"))  # the leader picks up new campaigns this often
+CAMPAIGN_CLAIM_SECONDS = int(os.getenv("CAMPAIGN_CLAIM_SECONDS", "300"))  # a crashed drainer's campaign is free again after this long
+JOB_MISFIRE_GRACE_SECONDS = int(os.getenv("JOB_MISFIRE_GRACE_SECONDS", "3600"))  # a job missed by less still runs after a restart
+SCHEDULER_LEASE_TTL = int(os.getenv("SCHEDULER_LEASE_TTL", "60"))  # seconds before a silent leader is replaced
+SCHEDULER_LEASE_HEARTBEAT = float(os.getenv("SCHEDULER_LEASE_HEARTBEAT", "15"))  # leader renews this often
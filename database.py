@@ -1,245 +1,612 @@
-import aiosqlite
 import asyncio
-from datetime import datetime, timedelta
-from typing import Optional, List, Tuple, Any
-from config import DATABASE_PATH
+import time
+from typing import Optional, Dict, List, Tuple, Any, AsyncIterator
+from models import User, Section, Quiz, Stats
+from config import (
+    DATABASE_PATH, DB_POOL_READERS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_BUSY_TIMEOUT_MS,
+    ACTIVITY_FLUSH_MS, ACTIVITY_FLUSH_EVENTS, USER_CACHE_SIZE, USER_CACHE_TTL, PREMIUM_CACHE_TTL,
+    LEADERBOARD_SIZE, LEADERBOARD_REFRESH_SECONDS, OUTBOX_BATCH_SIZE, CAMPAIGN_CLAIM_SECONDS, RECIPIENT_PAGE_SIZE,
+)
+from utils.db_pool import ConnectionPool
+from utils.migrations import apply_migrations, get_schema_version, latest_version, rebuild_table
+from utils.timeutil import DAY, SQL_NOW, days_ago, days_from_now, epoch_sql, now_ts, utc_minute_of_day
+from utils.write_behind import ActivityCoalescer
+from utils.rank_index import RankIndex
+from utils.leaderboard import LeaderboardSnapshots
+from utils.outbox import (
+    CampaignOutbox, add_campaign_claims, add_campaign_population, add_delivery_slots, create_outbox_tables,
+)
+from utils.send_engine import send_engine
+from utils.lease import create_lease_table
+from utils.rating_ledger import ACTIVITY_CODES, create_ledger_tables
+from utils.cache import TTLCache
 
-async def init_db():
-    """Initialize database with all required tables"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        # Users table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                is_premium BOOLEAN DEFAULT FALSE,
-                premium_expires_at TIMESTAMP,
-                referral_code TEXT UNIQUE,
-                referred_by INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                total_sessions INTEGER DEFAULT 0,
-                words_learned INTEGER DEFAULT 0,
-                quiz_score_total INTEGER DEFAULT 0,
-                quiz_attempts INTEGER DEFAULT 0,
-                rating_score REAL DEFAULT 0.0,
-                referral_count INTEGER DEFAULT 0
-            )
-        """)
-        
-        # Sections table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS sections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                description TEXT,
-                language TEXT,
-                is_premium BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_by INTEGER
-            )
-        """)
-        
-        # Subsections table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS subsections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                section_id INTEGER,
-                name TEXT NOT NULL,
-                description TEXT,
-                is_premium BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (section_id) REFERENCES sections (id)
-            )
-        """)
-        
-        # Content table - enhanced version
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS content (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                section_id INTEGER DEFAULT 0,
-                subsection_id INTEGER DEFAULT 0,
-                title TEXT NOT NULL,
-                description TEXT,
-                content_type TEXT,
-                file_id TEXT,
-                file_path TEXT,
-                content_text TEXT,
-                is_premium BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (section_id) REFERENCES sections (id),
-                FOREIGN KEY (subsection_id) REFERENCES subsections (id)
-            )
-        """)
-        
-        # Referrals table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS referrals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                referrer_id INTEGER,
-                referred_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (referrer_id) REFERENCES users (user_id),
-                FOREIGN KEY (referred_id) REFERENCES users (user_id)
-            )
-        """)
-        
-        # Drop old quizzes table if exists
-        await db.execute("DROP TABLE IF EXISTS quiz_questions")
-        await db.execute("DROP TABLE IF EXISTS quizzes")
-        
-        # Quizzes table - enhanced version
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS quizzes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                quiz_type TEXT DEFAULT 'topik',
-                difficulty TEXT DEFAULT 'beginner',
-                is_premium BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_by INTEGER
-            )
-        """)
-        
-        # Questions table - enhanced version
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS questions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                quiz_id INTEGER,
-                question_text TEXT NOT NULL,
-                options TEXT NOT NULL,
-                correct_answer TEXT NOT NULL,
-                explanation TEXT DEFAULT '',
-                points INTEGER DEFAULT 1,
-                FOREIGN KEY (quiz_id) REFERENCES quizzes (id)
-            )
-        """)
-        
-        # Quiz attempts table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS quiz_attempts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                quiz_id INTEGER,
-                score INTEGER,
-                total_questions INTEGER,
-                completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id),
-                FOREIGN KEY (quiz_id) REFERENCES quizzes (id)
-            )
-        """)
-        
-        # User progress table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS user_progress (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                content_id INTEGER,
-                completed BOOLEAN DEFAULT FALSE,
-                completed_at TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id),
-                FOREIGN KEY (content_id) REFERENCES content (id)
-            )
-        """)
-        
-        # Premium content table for Topik1, Topik2, JLPT
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS premium_content (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                section_type TEXT NOT NULL CHECK(section_type IN ('topik1', 'topik2', 'jlpt')),
-                title TEXT NOT NULL,
-                description TEXT,
-                file_id TEXT,
-                file_type TEXT CHECK(file_type IN ('photo', 'video', 'audio', 'document', 'music', 'text')),
-                content_text TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                order_index INTEGER DEFAULT 0
-            )
-        """)
-        
-        await db.commit()
+# Storage profile applied to every pooled connection
+STORAGE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -DB_CACHE_SIZE_KB,  # negative value = size in KiB
+    "mmap_size": DB_MMAP_SIZE,
+    "busy_timeout": DB_BUSY_TIMEOUT_MS,
+    "temp_store": "MEMORY",
+}
 
-async def get_user(user_id: int) -> Optional[Tuple[Any, ...]]:
-    """Get user by ID"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute(
-            "SELECT * FROM users WHERE user_id = ?", (user_id,)
+# Shared connection pool, opened in main() next to init_db()
+db_pool = ConnectionPool(DATABASE_PATH, readers=DB_POOL_READERS, pragmas=STORAGE_PRAGMAS)
+
+# Read-through cache of full user rows; every write to users must call invalidate_user()
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Premium entitlement: user_id -> expiry as epoch seconds, 0 when not premium
+premium_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=PREMIUM_CACHE_TTL)
+
+def invalidate_user(user_id: int) -> None:
+    """Drop cached state for a user after a write to their row"""
+    user_cache.invalidate(user_id)
+    premium_cache.invalidate(user_id)
+
+def invalidate_users(user_ids) -> None:
+    for user_id in user_ids:
+        invalidate_user(user_id)
+
+# In-memory rating order for rank lookups; loaded in main() before the activity flusher starts
+rank_index = RankIndex()
+
+# Top-N leaderboard with pre-rendered text; every leaderboard view reads from it
+leaderboard = LeaderboardSnapshots(db_pool, size=LEADERBOARD_SIZE, interval=LEADERBOARD_REFRESH_SECONDS)
+
+# Durable recipient lists for bulk sends; unfinished campaigns are resumed in main()
+campaign_outbox = CampaignOutbox(db_pool, batch_size=OUTBOX_BATCH_SIZE, claim_ttl=CAMPAIGN_CLAIM_SECONDS)
+
+def ratings_applied(deltas: Dict[int, float]) -> None:
+    """Propagate rating deltas committed to users.rating_score to the in-memory views"""
+    invalidate_users(deltas)
+    rank_index.apply_deltas(deltas.items())
+    leaderboard.notify({user_id: rank_index.score(user_id) for user_id in deltas})
+
+def _after_activity_flush(batch) -> None:
+    invalidate_users(batch)
+    ratings_applied({user_id: rating for user_id, (_, rating, _) in batch.items() if rating})
+
+# Batches session/rating/words updates; started in main() and flushed on shutdown
+activity_buffer = ActivityCoalescer(
+    db_pool, interval_ms=ACTIVITY_FLUSH_MS, max_events=ACTIVITY_FLUSH_EVENTS, on_flush=_after_activity_flush
+)
+
+# Managed index set for the hot query paths (migration 2); later indexes get their own migration
+INDEXES = [
+    # Leaderboards and rank lookups only ever look at users with points
+    "CREATE INDEX IF NOT EXISTS idx_users_rating ON users (rating_score DESC) WHERE rating_score > 0",
+    "CREATE INDEX IF NOT EXISTS idx_users_last_activity ON users (last_activity)",
+    "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)",
+    # Expiry scans and the admin premium list only touch premium users
+    "CREATE INDEX IF NOT EXISTS idx_users_premium_expires ON users (premium_expires_at) WHERE is_premium = 1",
+    "CREATE INDEX IF NOT EXISTS idx_sections_language ON sections (language, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_subsections_section ON subsections (section_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_content_section ON content (section_id, subsection_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_content_subsection ON content (subsection_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_content_created_at ON content (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_referrals_referrer ON referrals (referrer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_quizzes_created_by ON quizzes (created_by, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_quizzes_type ON quizzes (quiz_type, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_quizzes_created_at ON quizzes (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_questions_quiz ON questions (quiz_id)",
+    "CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user ON quiz_attempts (user_id, completed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_quiz_attempts_completed ON quiz_attempts (completed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_user_progress_user ON user_progress (user_id, completed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_user_progress_completed ON user_progress (completed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_premium_content_section ON premium_content (section_type, order_index)",
+]
+
+async def create_indexes(db) -> None:
+    """Create every index in INDEXES on the given connection"""
+    for statement in INDEXES:
+        await db.execute(statement)
+
+async def create_base_tables(db) -> None:
+    """Version 1 schema: all original tables"""
+    # Users table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            is_premium BOOLEAN DEFAULT FALSE,
+            premium_expires_at TIMESTAMP,
+            referral_code TEXT UNIQUE,
+            referred_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            total_sessions INTEGER DEFAULT 0,
+            words_learned INTEGER DEFAULT 0,
+            quiz_score_total INTEGER DEFAULT 0,
+            quiz_attempts INTEGER DEFAULT 0,
+            rating_score REAL DEFAULT 0.0,
+            referral_count INTEGER DEFAULT 0
+        )
+    """)
+    
+    # Sections table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS sections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            language TEXT,
+            is_premium BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by INTEGER
+        )
+    """)
+    
+    # Subsections table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS subsections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            section_id INTEGER,
+            name TEXT NOT NULL,
+            description TEXT,
+            is_premium BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (section_id) REFERENCES sections (id)
+        )
+    """)
+    
+    # Content table - enhanced version
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS content (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            section_id INTEGER DEFAULT 0,
+            subsection_id INTEGER DEFAULT 0,
+            title TEXT NOT NULL,
+            description TEXT,
+            content_type TEXT,
+            file_id TEXT,
+            file_path TEXT,
+            content_text TEXT,
+            is_premium BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (section_id) REFERENCES sections (id),
+            FOREIGN KEY (subsection_id) REFERENCES subsections (id)
+        )
+    """)
+    
+    # Referrals table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS referrals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            referrer_id INTEGER,
+            referred_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (referrer_id) REFERENCES users (user_id),
+            FOREIGN KEY (referred_id) REFERENCES users (user_id)
+        )
+    """)
+    
+    # Legacy table replaced by questions
+    await db.execute("DROP TABLE IF EXISTS quiz_questions")
+    
+    # Quizzes table - enhanced version
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS quizzes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            quiz_type TEXT DEFAULT 'topik',
+            difficulty TEXT DEFAULT 'beginner',
+            is_premium BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by INTEGER
+        )
+    """)
+    
+    # Questions table - enhanced version
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quiz_id INTEGER,
+            question_text TEXT NOT NULL,
+            options TEXT NOT NULL,
+            correct_answer TEXT NOT NULL,
+            explanation TEXT DEFAULT '',
+            points INTEGER DEFAULT 1,
+            FOREIGN KEY (quiz_id) REFERENCES quizzes (id)
+        )
+    """)
+    
+    # Quiz attempts table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            quiz_id INTEGER,
+            score INTEGER,
+            total_questions INTEGER,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (quiz_id) REFERENCES quizzes (id)
+        )
+    """)
+    
+    # User progress table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            content_id INTEGER,
+            completed BOOLEAN DEFAULT FALSE,
+            completed_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (content_id) REFERENCES content (id)
+        )
+    """)
+    
+    # Premium content table for Topik1, Topik2, JLPT
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS premium_content (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            section_type TEXT NOT NULL CHECK(section_type IN ('topik1', 'topik2', 'jlpt')),
+            title TEXT NOT NULL,
+            description TEXT,
+            file_id TEXT,
+            file_type TEXT CHECK(file_type IN ('photo', 'video', 'audio', 'document', 'music', 'text')),
+            content_text TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            order_index INTEGER DEFAULT 0
+        )
+    """)
+
+# Time columns per table, INTEGER epoch seconds from schema version 3
+TIME_COLUMNS = {
+    "users": ("premium_expires_at", "created_at", "last_activity"),
+    "sections": ("created_at",),
+    "subsections": ("created_at",),
+    "content": ("created_at",),
+    "referrals": ("created_at",),
+    "quizzes": ("created_at",),
+    "quiz_attempts": ("completed_at",),
+    "user_progress": ("completed_at",),
+    "premium_content": ("created_at",),
+}
+
+async def convert_timestamps_to_epoch(db) -> None:
+    """Version 3: rebuild tables so every time column holds epoch seconds"""
+    retype = {
+        r"TIMESTAMP DEFAULT CURRENT_TIMESTAMP": f"INTEGER DEFAULT {SQL_NOW}",
+        r"\bTIMESTAMP\b": "INTEGER",
+    }
+    for table, columns in TIME_COLUMNS.items():
+        await rebuild_table(db, table, retype, {column: epoch_sql(column) for column in columns})
+
+# Single-row dashboard counters (models.Stats) kept current by triggers, migration 4
+def _counter_trigger(name: str, table: str, event: str, updates: str) -> str:
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}
+        BEGIN
+            UPDATE stats_counters SET {updates} WHERE id = 1;
+        END
+    """
+
+STATS_TRIGGERS = [
+    _counter_trigger("trg_users_count_ins", "users", "INSERT",
+                     "total_users = total_users + 1, "
+                     "premium_users = premium_users + COALESCE(NEW.is_premium = 1, 0)"),
+    _counter_trigger("trg_users_count_del", "users", "DELETE",
+                     "total_users = total_users - 1, "
+                     "premium_users = premium_users - COALESCE(OLD.is_premium = 1, 0)"),
+    _counter_trigger("trg_users_count_premium", "users", "UPDATE OF is_premium",
+                     "premium_users = premium_users + COALESCE(NEW.is_premium = 1, 0) - COALESCE(OLD.is_premium = 1, 0)"),
+    _counter_trigger("trg_sections_count_ins", "sections", "INSERT", "total_sections = total_sections + 1"),
+    _counter_trigger("trg_sections_count_del", "sections", "DELETE", "total_sections = total_sections - 1"),
+    _counter_trigger("trg_content_count_ins", "content", "INSERT",
+                     "total_content = total_content + 1, "
+                     "premium_content = premium_content + COALESCE(NEW.is_premium = 1, 0)"),
+    _counter_trigger("trg_content_count_del", "content", "DELETE",
+                     "total_content = total_content - 1, "
+                     "premium_content = premium_content - COALESCE(OLD.is_premium = 1, 0)"),
+    _counter_trigger("trg_content_count_premium", "content", "UPDATE OF is_premium",
+                     "premium_content = premium_content + COALESCE(NEW.is_premium = 1, 0) - COALESCE(OLD.is_premium = 1, 0)"),
+    _counter_trigger("trg_quizzes_count_ins", "quizzes", "INSERT", "total_quizzes = total_quizzes + 1"),
+    _counter_trigger("trg_quizzes_count_del", "quizzes", "DELETE", "total_quizzes = total_quizzes - 1"),
+    _counter_trigger("trg_questions_count_ins", "questions", "INSERT", "total_questions = total_questions + 1"),
+    _counter_trigger("trg_questions_count_del", "questions", "DELETE", "total_questions = total_questions - 1"),
+    # New users per UTC day, for the weekly growth figures
+    f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_daily_ins AFTER INSERT ON users
+        BEGIN
+            INSERT INTO stats_daily (day, new_users)
+            VALUES (COALESCE(NEW.created_at, {SQL_NOW}) / {DAY}, 1)
+            ON CONFLICT (day) DO UPDATE SET new_users = new_users + 1;
+        END
+    """,
+]
+
+async def refresh_stats_counters(db) -> None:
+    """Recount every dashboard counter from the base tables"""
+    await db.execute("INSERT OR IGNORE INTO stats_counters (id) VALUES (1)")
+    await db.execute("""
+        UPDATE stats_counters SET
+            total_users = (SELECT COUNT(*) FROM users),
+            premium_users = (SELECT COUNT(*) FROM users WHERE is_premium = 1),
+            total_sections = (SELECT COUNT(*) FROM sections),
+            total_content = (SELECT COUNT(*) FROM content),
+            premium_content = (SELECT COUNT(*) FROM content WHERE is_premium = 1),
+            total_quizzes = (SELECT COUNT(*) FROM quizzes),
+            total_questions = (SELECT COUNT(*) FROM questions)
+        WHERE id = 1
+    """)
+    await db.execute("DELETE FROM stats_daily")
+    await db.execute(f"""
+        INSERT INTO stats_daily (day, new_users)
+        SELECT created_at / {DAY}, COUNT(*) FROM users
+        WHERE created_at IS NOT NULL
+        GROUP BY created_at / {DAY}
+    """)
+
+async def create_stats_counters(db) -> None:
+    """Version 4: counters table, per-day signups and the triggers maintaining them"""
+    await db.execute(f"""
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            {", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in Stats.COLUMNS)}
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day INTEGER PRIMARY KEY,
+            new_users INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    await refresh_stats_counters(db)
+    for statement in STATS_TRIGGERS:
+        await db.execute(statement)
+
+async def create_rating_ledger(db) -> None:
+    """Version 5: rating_events ledger; existing scores are carried over as one legacy event"""
+    await create_ledger_tables(db)
+    await db.execute("""
+        INSERT INTO rating_events (user_id, activity, points, ts)
+        SELECT user_id, ?, rating_score, ? FROM users WHERE rating_score != 0
+    """, (ACTIVITY_CODES['legacy'], now_ts()))
+    # Already part of rating_score, so the rollup starts after them
+    await db.execute(
+        "UPDATE rating_rollup SET last_event_id = COALESCE((SELECT MAX(id) FROM rating_events), 0) WHERE id = 1"
+    )
+
+async def create_rating_window_index(db) -> None:
+    """Version 6: covering index for windowed leaderboards over rating_daily"""
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_rating_daily_window ON rating_daily (day, user_id, points)"
+    )
+
+# Languages a user can study; stored in users.study_language
+STUDY_LANGUAGES = ("korean", "japanese")
+
+async def add_study_language(db) -> None:
+    """Version 7: users.study_language with a per-language rating index"""
+    await db.execute("ALTER TABLE users ADD COLUMN study_language TEXT")
+    # Leading language column partitions the rating order, so each language's top-N is a range read
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_language_rating
+        ON users (study_language, rating_score DESC) WHERE rating_score > 0
+    """)
+
+async def create_campaign_outbox(db) -> None:
+    """Version 8: campaigns and per-recipient outbox for resumable bulk sends"""
+    await create_outbox_tables(db)
+
+async def add_blocked_at(db) -> None:
+    """Version 9: users.blocked_at, set when a chat rejects our messages"""
+    await db.execute("ALTER TABLE users ADD COLUMN blocked_at INTEGER")
+    # Recipient scans filter on activity among reachable users only
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_reachable_activity
+        ON users (last_activity) WHERE blocked_at IS NULL
+    """)
+
+async def create_job_runs(db) -> None:
+    """Version 10: one row per scheduled job run"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            id INTEGER PRIMARY KEY,
+            job TEXT NOT NULL,
+            started_at INTEGER NOT NULL,
+            finished_at INTEGER,
+            duration_ms INTEGER,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            error TEXT
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs (job, started_at)")
+
+async def create_leases(db) -> None:
+    """Version 11: leases electing the replica that runs scheduled jobs"""
+    await create_lease_table(db)
+
+async def add_campaign_delivery_slots(db) -> None:
+    """Version 12: per-recipient send slots so campaigns spread over a delivery window"""
+    await add_delivery_slots(db)
+
+async def add_reminder_time(db) -> None:
+    """Version 13: preferred daily reminder time, bucketed by UTC minute of the day"""
+    await db.execute("ALTER TABLE users ADD COLUMN reminder_minute INTEGER")
+    await db.execute("ALTER TABLE users ADD COLUMN tz_offset INTEGER")
+    await db.execute("ALTER TABLE users ADD COLUMN reminder_utc_minute INTEGER")
+    # One minute's bucket of reachable users is a single range read
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_reminder
+        ON users (reminder_utc_minute, user_id)
+        WHERE reminder_utc_minute IS NOT NULL AND blocked_at IS NULL
+    """)
+
+async def add_campaign_population_marker(db) -> None:
+    """Version 14: campaigns record when all their recipients are stored, since that now spans transactions"""
+    await add_campaign_population(db)
+
+async def create_job_state(db) -> None:
+    """Version 15: per-job watermark, so a job can catch up on the periods it missed"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS job_state (
+            job TEXT PRIMARY KEY,
+            watermark INTEGER NOT NULL
         )
-        return await cursor.fetchone()
+    """)
+
+async def add_campaign_drain_claims(db) -> None:
+    """Version 16: campaigns record which process drains them, so only one replica sends a campaign"""
+    await add_campaign_claims(db)
+
+# Ordered, forward-only schema steps; append new ones, never edit applied ones
+MIGRATIONS = [
+    (1, "base tables", create_base_tables),
+    (2, "hot path indexes", create_indexes),
+    (3, "epoch integer timestamps", convert_timestamps_to_epoch),
+    (4, "dashboard counters", create_stats_counters),
+    (5, "rating event ledger", create_rating_ledger),
+    (6, "rating window index", create_rating_window_index),
+    (7, "study language", add_study_language),
+    (8, "campaign outbox", create_campaign_outbox),
+    (9, "blocked users", add_blocked_at),
+    (10, "job runs", create_job_runs),
+    (11, "leases", create_leases),
+    (12, "campaign delivery slots", add_campaign_delivery_slots),
+    (13, "reminder time", add_reminder_time),
+    (14, "campaign population marker", add_campaign_population_marker),
+    (15, "job watermarks", create_job_state),
+    (16, "campaign drain claims", add_campaign_drain_claims),
+]
+SCHEMA_VERSION = latest_version(MIGRATIONS)
+
+async def migrate(db) -> int:
+    """Bring the given connection up to SCHEMA_VERSION"""
+    return await apply_migrations(db, MIGRATIONS)
+
+async def init_db():
+    """Initialize database, running DDL only when the schema is behind"""
+    async with db_pool.acquire() as db:
+        version = await get_schema_version(db)
+    if version >= SCHEMA_VERSION:
+        return
+
+    async with db_pool.transaction() as db:
+        await migrate(db)
+
+GET_USER_QUERY = f"SELECT {User.select_list()} FROM users WHERE user_id = ?"
+
+async def get_user(user_id: int) -> Optional[User]:
+    """Get user by ID through the cache; rows are read and cached whole, so every caller shares them"""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(GET_USER_QUERY, (user_id,))
+        user = User.from_row(await cursor.fetchone())
+
+    # Unknown users are not cached so a following create_user is seen at once
+    if user is not None:
+        user_cache.set(user_id, user)
+    return user
 
 async def update_user_activity(user_id: int, activity_type: Optional[str] = None) -> None:
     """Update user's last activity and session count"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("""
-            UPDATE users 
-            SET last_activity = CURRENT_TIMESTAMP,
-                total_sessions = total_sessions + 1
-            WHERE user_id = ?
-        """, (user_id,))
-        await db.commit()
+    activity_buffer.record(user_id, sessions=1)
 
 async def create_user(user_id: int, username: Optional[str], first_name: str, last_name: Optional[str] = None, referred_by: Optional[int] = None) -> None:
     """Create new user"""
     import secrets
     referral_code = f"REF{secrets.randbelow(999999):06d}"
     
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with db_pool.transaction() as db:
         await db.execute("""
             INSERT OR IGNORE INTO users 
             (user_id, username, first_name, last_name, referral_code, referred_by)
             VALUES (?, ?, ?, ?, ?, ?)
         """, (user_id, username or "", first_name, last_name or "", referral_code, referred_by))
-        await db.commit()
+    invalidate_user(user_id)
+
+async def set_study_language(user_id: int, language: str) -> bool:
+    """Save the language the user studies; unknown languages are rejected"""
+    if language not in STUDY_LANGUAGES:
+        return False
+    async with db_pool.transaction() as db:
+        await db.execute(
+            "UPDATE users SET study_language = ? WHERE user_id = ?", (language, user_id)
+        )
+    invalidate_user(user_id)
+    return True
+
+async def set_reminder(user_id: int, local_minute: Optional[int], tz_offset: Optional[int] = None) -> bool:
+    """Save the daily reminder time (minute of the local day); None turns reminders off and keeps the time zone
+
+    Returns False if the user has no row yet.
+    """
+    utc_minute = None if local_minute is None else utc_minute_of_day(local_minute, tz_offset or 0)
+    async with db_pool.transaction() as db:
+        cursor = await db.execute("""
+            UPDATE users SET reminder_minute = ?, tz_offset = COALESCE(?, tz_offset), reminder_utc_minute = ?
+            WHERE user_id = ?
+        """, (local_minute, tz_offset, utc_minute, user_id))
+        updated = cursor.rowcount == 1
+    invalidate_user(user_id)
+    return updated
+
+REFERRAL_COUNT_QUERY = "SELECT COUNT(*) FROM referrals WHERE referrer_id = ?"
 
 async def get_user_referrals_count(user_id: int) -> int:
     """Get count of successful referrals for user"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute(
-            "SELECT COUNT(*) FROM referrals WHERE referrer_id = ?", (user_id,)
-        )
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(REFERRAL_COUNT_QUERY, (user_id,))
         result = await cursor.fetchone()
         return result[0] if result else 0
 
 async def add_referral(referrer_id: int, referred_id: int) -> None:
     """Add a referral record"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with db_pool.transaction() as db:
         await db.execute("""
             INSERT INTO referrals (referrer_id, referred_id)
             VALUES (?, ?)
         """, (referrer_id, referred_id))
-        await db.commit()
 
 async def activate_premium(user_id: int, duration_days: int = 30) -> None:
     """Activate premium for user"""
-    expires_at = datetime.now() + timedelta(days=duration_days)
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    expires_at = days_from_now(duration_days)
+    async with db_pool.transaction() as db:
         await db.execute("""
             UPDATE users 
             SET is_premium = TRUE, premium_expires_at = ?
             WHERE user_id = ?
         """, (expires_at, user_id))
-        await db.commit()
+    invalidate_user(user_id)
 
-async def is_premium_active(user_id: int) -> bool:
-    """Check if user's premium is active"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+async def _load_premium_expiry(user_id: int) -> float:
+    """Premium expiry as epoch seconds, 0 if the user has no active premium"""
+    async with db_pool.acquire() as db:
         cursor = await db.execute("""
             SELECT is_premium, premium_expires_at FROM users WHERE user_id = ?
         """, (user_id,))
         result = await cursor.fetchone()
-        
-        if not result or not result[0]:
-            return False
-            
-        expires_at = datetime.fromisoformat(result[1])
-        return datetime.now() < expires_at
+    
+    if not result or not result[0] or not result[1]:
+        return 0
+    
+    expires_at = result[1]
+    return expires_at if expires_at > time.time() else 0
 
-async def get_sections(language: Optional[str] = None, is_premium: Optional[bool] = None) -> List[Tuple[Any, ...]]:
+async def is_premium_active(user_id: int) -> bool:
+    """Check if user's premium is active; the DB is read again only once the cached expiry passes"""
+    expires_at = premium_cache.get(user_id)
+    if expires_at is None or 0 < expires_at <= time.time():
+        expires_at = await _load_premium_expiry(user_id)
+        premium_cache.set(user_id, expires_at)
+    return expires_at > time.time()
+
+async def get_sections(language: Optional[str] = None, is_premium: Optional[bool] = None) -> List[Section]:
     """Get sections, optionally filtered by language and premium status"""
-    query = "SELECT * FROM sections WHERE 1=1"
+    query = f"SELECT {Section.select_list(Section.LISTING)} FROM sections WHERE 1=1"
     params = []
     
     if language:
@@ -252,15 +619,100 @@ async def get_sections(language: Optional[str] = None, is_premium: Optional[bool
     
     query += " ORDER BY created_at"
     
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with db_pool.acquire() as db:
         cursor = await db.execute(query, params)
-        return await cursor.fetchall()
+        return Section.from_rows(await cursor.fetchall(), Section.LISTING)
+
+async def mark_users_blocked(user_ids: List[int]) -> None:
+    """Flag users whose chat rejected a message; bulk sends skip them until their next /start"""
+    async with db_pool.transaction() as db:
+        await db.executemany(
+            "UPDATE users SET blocked_at = ? WHERE user_id = ? AND blocked_at IS NULL",
+            [(now_ts(), user_id) for user_id in user_ids]
+        )
+    invalidate_users(user_ids)
+
+async def clear_blocked(user_id: int) -> None:
+    async with db_pool.transaction() as db:
+        await db.execute("UPDATE users SET blocked_at = NULL WHERE user_id = ?", (user_id,))
+    invalidate_user(user_id)
+
+# Every bulk sender reports dead chats here
+send_engine.on_blocked = mark_users_blocked
+
+async def start_job_run(job: str, started_at: Optional[int] = None) -> int:
+    """Open a job_runs row, returns its id"""
+    async with db_pool.transaction() as db:
+        cursor = await db.execute(
+            "INSERT INTO job_runs (job, started_at) VALUES (?, ?)", (job, started_at or now_ts())
+        )
+        return cursor.lastrowid
+
+async def finish_job_run(run_id: int, duration_ms: int, sent: int = 0, failed: int = 0,
+                         skipped: int = 0, error: Optional[str] = None) -> None:
+    """Close a job_runs row; skipped counts recipients whose chat is blocked"""
+    async with db_pool.transaction() as db:
+        await db.execute("""
+            UPDATE job_runs SET finished_at = ?, duration_ms = ?, sent = ?, failed = ?, skipped = ?, error = ?
+            WHERE id = ?
+        """, (now_ts(), duration_ms, sent, failed, skipped, error, run_id))
+
+def users_page_query(columns: Tuple[str, ...], where: str) -> str:
+    """One keyset page of iter_users(); params are (*where params, last user_id, page size)"""
+    return f"""
+        SELECT {", ".join(columns)} FROM users
+        WHERE ({where}) AND blocked_at IS NULL AND user_id > ?
+        ORDER BY user_id
+        LIMIT ?
+    """
 
-async def get_leaderboard(limit: int = 8) -> List[Tuple[Any, ...]]:
+async def get_job_watermark(job: str) -> Optional[int]:
+    """Last period a job finished, None before its first run"""
+    async with db_pool.acquire() as db:
+        cursor = await db.execute("SELECT watermark FROM job_state WHERE job = ?", (job,))
+        row = await cursor.fetchone()
+    return row[0] if row else None
+
+async def set_job_watermark(job: str, watermark: int) -> None:
+    async with db_pool.transaction() as db:
+        await db.execute("""
+            INSERT INTO job_state (job, watermark) VALUES (?, ?)
+            ON CONFLICT (job) DO UPDATE SET watermark = excluded.watermark
+        """, (job, watermark))
+
+async def iter_users(columns: Tuple[str, ...], where: str, params: tuple = (),
+                     page_size: int = RECIPIENT_PAGE_SIZE) -> AsyncIterator[tuple]:
+    """Stream reachable users matching `where` in user_id order, one keyset page per reader checkout
+
+    `columns` must start with user_id. Users flagged by mark_users_blocked() are skipped.
+    Memory stays at one page however many users match.
+    """
+    query = users_page_query(columns, where)
+    last_user_id = 0
+    while True:
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(query, (*params, last_user_id, page_size))
+            rows = await cursor.fetchall()
+        for row in rows:
+            yield row
+        if len(rows) < page_size:
+            return
+        last_user_id = rows[-1][0]
+
+async def get_user_rank(user_id: int) -> int:
+    """1-based rating position from the rank index"""
+    if not rank_index.loaded:
+        await rank_index.load(db_pool)
+    return rank_index.rank(user_id)
+
+async def get_leaderboard(limit: int = 8) -> List[User]:
     """Get top users by comprehensive performance metrics"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("""
-            SELECT user_id, first_name, username, rating_score, words_learned, quiz_score_total, quiz_attempts
+    if limit <= leaderboard.size:
+        return (await leaderboard.get()).rows[:limit]
+
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(f"""
+            SELECT {User.select_list(User.LEADERBOARD)}
             FROM users 
             WHERE rating_score IS NOT NULL AND rating_score > 0
             ORDER BY 
@@ -270,65 +722,78 @@ async def get_leaderboard(limit: int = 8) -> List[Tuple[Any, ...]]:
                 total_sessions DESC
             LIMIT ?
         """, (limit,))
-        return await cursor.fetchall()
+        return User.from_rows(await cursor.fetchall(), User.LEADERBOARD)
 
 # Premium content functions
 async def add_premium_content(section_type: str, title: str, description: Optional[str] = None, file_id: Optional[str] = None, file_type: Optional[str] = None, content_text: Optional[str] = None) -> bool:
     """Add premium content to database"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with db_pool.transaction() as db:
         await db.execute("""
             INSERT INTO premium_content (section_type, title, description, file_id, file_type, content_text, order_index)
             VALUES (?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(order_index), 0) + 1 FROM premium_content WHERE section_type = ?))
         """, (section_type, title, description, file_id, file_type, content_text, section_type))
-        await db.commit()
         return True
 
+PREMIUM_CONTENT_QUERY = """
+    SELECT id, title, description, file_id, file_type, content_text, order_index
+    FROM premium_content 
+    WHERE section_type = ?
+    ORDER BY order_index ASC
+"""
+
 async def get_premium_content(section_type: str) -> List[Tuple[Any, ...]]:
     """Get all premium content for a section"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("""
-            SELECT id, title, description, file_id, file_type, content_text, order_index
-            FROM premium_content 
-            WHERE section_type = ?
-            ORDER BY order_index ASC
-        """, (section_type,))
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(PREMIUM_CONTENT_QUERY, (section_type,))
         return await cursor.fetchall()
 
 async def delete_premium_content(content_id: int) -> bool:
     """Delete premium content"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with db_pool.transaction() as db:
         await db.execute("DELETE FROM premium_content WHERE id = ?", (content_id,))
-        await db.commit()
         return True
 
+STATS_QUERY = f"SELECT {Stats.select_list()} FROM stats_counters WHERE id = 1"
+
+async def get_stats() -> Stats:
+    """Dashboard counters in one row read"""
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(STATS_QUERY)
+        row = await cursor.fetchone()
+    return Stats.from_row(row) if row else Stats.empty()
+
+NEW_USERS_QUERY = "SELECT COALESCE(SUM(new_users), 0) FROM stats_daily WHERE day > ?"
+
+async def get_new_users_count(days: int = 7) -> int:
+    """Users who joined in the last `days` UTC days, today included"""
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(NEW_USERS_QUERY, (days_ago(days) // DAY,))
+        result = await cursor.fetchone()
+        return result[0] if result else 0
+
 async def get_user_stats(user_id: int = None):
     """Foydalanuvchi yoki umumiy statistikani olish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            if user_id:
-                # Individual user stats
-                cursor = await db.execute('''
-                    SELECT rating_score, referral_count, is_premium, premium_expires_at
-                    FROM users WHERE user_id = ?
-                ''', (user_id,))
-                result = await cursor.fetchone()
-                if result:
-                    return {
-                        'rating_score': result[0] or 0,
-                        'referral_count': result[1] or 0,
-                        'is_premium': result[2] or 0,
-                        'premium_expires_at': result[3]
-                    }
-                return {'referral_count': 0, 'rating_score': 0}
-            else:
-                # General stats
-                cursor = await db.execute("SELECT COUNT(*) FROM users")
-                total_users = (await cursor.fetchone())[0]
-                
-                cursor = await db.execute("SELECT COUNT(*) FROM users WHERE is_premium = 1")
-                premium_users = (await cursor.fetchone())[0]
-                
-                return total_users, premium_users
+        if not user_id:
+            # General stats; get_stats() takes its own reader, so none is held here
+            stats = await get_stats()
+            return stats.total_users, stats.premium_users
+        
+        # Individual user stats
+        async with db_pool.acquire() as db:
+            cursor = await db.execute('''
+                SELECT rating_score, referral_count, is_premium, premium_expires_at
+                FROM users WHERE user_id = ?
+            ''', (user_id,))
+            result = await cursor.fetchone()
+        if result:
+            return {
+                'rating_score': result[0] or 0,
+                'referral_count': result[1] or 0,
+                'is_premium': result[2] or 0,
+                'premium_expires_at': result[3]
+            }
+        return {'referral_count': 0, 'rating_score': 0}
     except Exception as e:
         print(f"Get user stats error: {e}")
         return {'referral_count': 0, 'rating_score': 0} if user_id else (0, 0)
@@ -340,13 +805,12 @@ async def get_user_stats(user_id: int = None):
 async def create_quiz(title: str, description: str, quiz_type: str, difficulty: str = "beginner", created_by: int = None):
     """Quiz yaratish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.transaction() as db:
             cursor = await db.execute('''
                 INSERT INTO quizzes (title, description, quiz_type, difficulty, created_by, created_at) 
-                VALUES (?, ?, ?, ?, ?, datetime('now'))
-            ''', (title, description, quiz_type, difficulty, created_by))
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (title, description, quiz_type, difficulty, created_by, now_ts()))
             quiz_id = cursor.lastrowid
-            await db.commit()
             return quiz_id
     except Exception as e:
         print(f"Create quiz error: {e}")
@@ -355,64 +819,57 @@ async def create_quiz(title: str, description: str, quiz_type: str, difficulty:
 async def add_question(quiz_id: int, question_text: str, options: str, correct_answer: str, explanation: str = ""):
     """Savolni qo'shish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.transaction() as db:
             cursor = await db.execute('''
                 INSERT INTO questions (quiz_id, question_text, options, correct_answer, explanation) 
                 VALUES (?, ?, ?, ?, ?)
             ''', (quiz_id, question_text, options, correct_answer, explanation))
             question_id = cursor.lastrowid
-            await db.commit()
             return question_id
     except Exception as e:
         print(f"Add question error: {e}")
         return None
 
+QUIZZES_BY_TYPE_QUERY = f'''
+    SELECT {Quiz.select_list(Quiz.LISTING)}
+    FROM quizzes WHERE quiz_type = ? 
+    ORDER BY created_at DESC
+'''
+
 async def get_quizzes(quiz_type: str = None):
     """Testlarni olish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             if quiz_type:
-                cursor = await db.execute('''
-                    SELECT id, title, description, quiz_type, difficulty 
-                    FROM quizzes WHERE quiz_type = ? 
-                    ORDER BY created_at DESC
-                ''', (quiz_type,))
+                cursor = await db.execute(QUIZZES_BY_TYPE_QUERY, (quiz_type,))
             else:
-                cursor = await db.execute('''
-                    SELECT id, title, description, quiz_type, difficulty 
+                cursor = await db.execute(f'''
+                    SELECT {Quiz.select_list(Quiz.LISTING)}
                     FROM quizzes 
                     ORDER BY created_at DESC
                 ''')
-            return await cursor.fetchall()
+            return Quiz.from_rows(await cursor.fetchall(), Quiz.LISTING)
     except Exception as e:
         print(f"Get quizzes error: {e}")
         return []
 
+QUIZ_QUESTIONS_QUERY = '''
+    SELECT id, question_text, options, correct_answer, explanation 
+    FROM questions WHERE quiz_id = ? 
+    ORDER BY id
+'''
+
 async def get_quiz_questions(quiz_id: int):
     """Test savollarini olish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute('''
-                SELECT id, question_text, options, correct_answer, explanation 
-                FROM questions WHERE quiz_id = ? 
-                ORDER BY id
-            ''', (quiz_id,))
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(QUIZ_QUESTIONS_QUERY, (quiz_id,))
             return await cursor.fetchall()
     except Exception as e:
         print(f"Get quiz questions error: {e}")
         return []
 
-async def update_user_rating(user_id: int, points: float):
+async def update_user_rating(user_id: int, points: float, activity: str = 'other'):
     """Foydalanuvchi reytingini yangilash"""
-    try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            await db.execute('''
-                UPDATE users 
-                SET rating_score = rating_score + ?, last_activity = datetime('now')
-                WHERE user_id = ?
-            ''', (points, user_id))
-            await db.commit()
-            return True
-    except Exception as e:
-        print(f"Update user rating error: {e}")
-        return False
\ No newline at end of file
+    activity_buffer.record(user_id, rating=points, activity=activity)
+    return True
\ No newline at end of file
@@ -1,17 +1,21 @@
-import asyncio
-import aiosqlite
 from datetime import datetime
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from typing import cast
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.filters import StateFilter
+from aiogram.filters import Command, StateFilter
 
-from config import BOT_TOKEN, ADMIN_ID, DATABASE_PATH, PREMIUM_PRICE_UZS
-from database import get_user, update_user_activity
-from keyboards import get_admin_menu
+from config import ADMIN_ID, PREMIUM_PRICE_UZS
+from database import (
+    db_pool, get_user, update_user_activity, invalidate_user, user_cache, premium_cache,
+    get_stats, get_new_users_count, leaderboard, campaign_outbox, STUDY_LANGUAGES,
+)
+from keyboards import LANGUAGE_TITLES, get_admin_menu, get_section_language_keyboard
 from messages import ADMIN_WELCOME_MESSAGE
+from utils.rating_system import reprice_ratings
+from utils.send_engine import send_engine
+from utils.timeutil import days_ago, days_from_now, format_ts, now_ts
 
 router = Router()
 
@@ -86,6 +90,23 @@ async def admin_panel(callback: CallbackQuery):
         except:
             pass
 
+@router.message(Command("reprice_ratings"))
+@admin_only
+async def reprice_ratings_command(message: Message):
+    """Apply the current rating point table to every past event and rebuild the ratings"""
+    try:
+        await message.answer("⏳ Reytinglar qayta hisoblanmoqda...")
+        ranked = await reprice_ratings()
+        await message.answer(f"✅ Reytinglar qayta hisoblandi: {ranked} ta foydalanuvchi")
+    except Exception as e:
+        print(f"Reprice ratings error: {e}")
+        await message.answer("❌ Xatolik yuz berdi")
+
+ACTIVE_USERS_QUERY = """
+    SELECT COUNT(*) FROM users 
+    WHERE last_activity > ?
+"""
+
 @router.callback_query(F.data == "admin_stats") 
 async def admin_stats(callback: CallbackQuery):
     """Safe admin stats handler"""
@@ -106,38 +127,25 @@ async def admin_stats(callback: CallbackQuery):
         total_quizzes = 0
         
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                # Total users
-                cursor = await db.execute("SELECT COUNT(*) FROM users")
-                result = await cursor.fetchone()
-                total_users = result[0] if result else 0
-                
-                # Premium users  
-                cursor = await db.execute("SELECT COUNT(*) FROM users WHERE is_premium = 1")
-                result = await cursor.fetchone()
-                premium_users = result[0] if result else 0
-                
+            # Totals come from the trigger-maintained counters row
+            stats = await get_stats()
+            total_users = stats.total_users
+            premium_users = stats.premium_users
+            total_sections = stats.total_sections
+            total_quizzes = stats.total_quizzes
+
+            async with db_pool.acquire() as db:
                 # Active today
-                cursor = await db.execute("""
-                    SELECT COUNT(*) FROM users 
-                    WHERE last_activity > datetime('now', '-1 day')
-                """)
+                cursor = await db.execute(ACTIVE_USERS_QUERY, (days_ago(1),))
                 result = await cursor.fetchone()
                 active_today = result[0] if result else 0
                 
-                # Total sections
-                cursor = await db.execute("SELECT COUNT(*) FROM sections")
-                result = await cursor.fetchone()
-                total_sections = result[0] if result else 0
-                
-                # Total quizzes
-                cursor = await db.execute("SELECT COUNT(*) FROM quizzes")
-                result = await cursor.fetchone()
-                total_quizzes = result[0] if result else 0
-                
         except Exception as db_error:
             print(f"Database error: {db_error}")
 
+        cache_stats = user_cache.stats()
+        premium_stats = premium_cache.stats()
+
         stats_text = f"""📊 <b>Bot Statistikasi</b>
 
 👥 <b>Foydalanuvchilar:</b>
@@ -149,6 +157,12 @@ async def admin_stats(callback: CallbackQuery):
 • Bo'limlar: {total_sections}
 • Testlar: {total_quizzes}
 
+🗄 <b>Foydalanuvchi keshi:</b>
+• Hajm: {cache_stats['size']}/{cache_stats['maxsize']}
+• Hit/miss: {cache_stats['hits']}/{cache_stats['misses']} ({cache_stats['hit_rate']:.0%})
+• Chiqarilgan: {cache_stats['evictions']}
+• Premium hit/miss: {premium_stats['hits']}/{premium_stats['misses']} ({premium_stats['hit_rate']:.0%})
+
 💰 <b>Premium narxi:</b> {PREMIUM_PRICE_UZS:,} so'm"""
 
         message = cast(Message, callback.message)
@@ -189,6 +203,7 @@ async def admin_broadcast_menu(callback: CallbackQuery):
             "⚠️ Xabar yuborishdan oldin tekshirish bo'ladi",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="📝 Matn xabar yuborish", callback_data="broadcast_text")],
+                [InlineKeyboardButton(text="📬 Kampaniyalar holati", callback_data="admin_campaigns")],
                 [InlineKeyboardButton(text="🔙 Admin panel", callback_data="admin_panel")]
             ])
         )
@@ -286,30 +301,21 @@ async def confirm_broadcast(callback: CallbackQuery, state: FSMContext):
             return
             
         message = cast(Message, callback.message)
-        await message.edit_text("🚀 Yuborilmoqda...")
         
-        # Send to all users - simplified for now
-        sent_count = 0
-        try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                cursor = await db.execute("SELECT user_id FROM users")
-                users = await cursor.fetchall()
-                
-                for user_row in users:
-                    try:
-                        bot = Bot(token=BOT_TOKEN)
-                        await bot.send_message(user_row[0], data.get('message_text', ''))
-                        sent_count += 1
-                    except Exception:
-                        pass  # User might have blocked bot
-        except Exception as e:
-            print(f"Broadcast error: {e}")
+        # Only stored here; the scheduler leader drains the outbox, so no two replicas send it
+        campaign = await send_broadcast_message(data, key=f"broadcast:{callback.id}")
         
         await state.clear()
+        if campaign is None:
+            await message.edit_text("❌ Xabar yuborishda xatolik yuz berdi")
+            await callback.answer()
+            return
         await message.edit_text(
-            f"✅ <b>Xabar yuborildi!</b>\n\n"
-            f"📊 {sent_count} ta foydalanuvchiga yuborildi",
+            f"✅ <b>Xabar navbatga qo'yildi!</b>\n\n"
+            f"{format_campaign(campaign)}\n\n"
+            f"📬 Yuborilishini Kampaniyalar bo'limida kuzating",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="📬 Kampaniyalar", callback_data="admin_campaigns")],
                 [InlineKeyboardButton(text="🔙 Admin panel", callback_data="admin_panel")]
             ])
         )
@@ -351,40 +357,75 @@ async def cancel_broadcast(callback: CallbackQuery, state: FSMContext):
         except:
             pass
 
-async def send_broadcast_message(data):
-    """Safe broadcast sender"""
-    bot = Bot(token=BOT_TOKEN)
-    sent_count = 0
+# All reachable users, copied into the outbox inside the database
+BROADCAST_RECIPIENTS_QUERY = "SELECT user_id FROM users WHERE blocked_at IS NULL"
+
+async def send_broadcast_message(data, key: str):
+    """Store a broadcast campaign for the scheduler leader to send, returns it with its counters"""
+    message_text = data.get("message_text", "")
+    if not message_text:
+        return None
     
     try:
-        # Get all users
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("SELECT user_id FROM users")
-            users = await cursor.fetchall()
-        
-        message_text = data.get("message_text", "")
+        campaign_id, _ = await campaign_outbox.create_for_query(
+            key, "Admin xabari", message_text, BROADCAST_RECIPIENTS_QUERY
+        )
+        return await campaign_outbox.progress(campaign_id)
         
-        if not message_text:
-            return 0
+    except Exception as e:
+        print(f"Broadcast error: {e}")
+        return None
+
+def format_campaign(campaign) -> str:
+    """Delivery counters of one campaign"""
+    status = "✅ Tugagan" if campaign.finished_at else "⏳ Yuborilmoqda"
+    done = campaign.total - campaign.pending
+    percent = done * 100 // campaign.total if campaign.total else 100
+    return (
+        f"📬 <b>{campaign.title}</b> (#{campaign.id}) - {status}\n"
+        f"🕒 {format_ts(campaign.created_at, '%d.%m.%Y %H:%M')}\n"
+        f"📊 {done}/{campaign.total} ({percent}%)\n"
+        f"✅ Yuborildi: {campaign.sent} | 🚫 Bloklagan: {campaign.blocked} | "
+        f"⚠️ Xato: {campaign.failed} | ⏳ Navbatda: {campaign.pending}"
+    )
+
+@router.callback_query(F.data == "admin_campaigns")
+async def admin_campaigns(callback: CallbackQuery):
+    """Progress of the latest bulk sends"""
+    try:
+        # Check admin access
+        if not callback.from_user or callback.from_user.id != ADMIN_ID:
+            await callback.answer("❌ Sizda admin huquqlari yo'q!", show_alert=True)
+            return
             
-        for (user_id,) in users:
-            try:
-                await bot.send_message(user_id, message_text)
-                sent_count += 1
-                await asyncio.sleep(0.05)  # Rate limiting
-            except Exception:
-                continue
+        if not callback.message:
+            await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
+            return
         
-        await bot.session.close()
-        return sent_count
+        campaigns = await campaign_outbox.recent(5)
+        if campaigns:
+            text = "📬 <b>So'nggi kampaniyalar</b>\n\n" + "\n\n".join(format_campaign(c) for c in campaigns)
+        else:
+            text = "📬 <b>So'nggi kampaniyalar</b>\n\nHali kampaniyalar yo'q"
+        
+        message = cast(Message, callback.message)
+        await message.edit_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔄 Yangilash", callback_data="admin_campaigns")],
+                [InlineKeyboardButton(text="🔙 Xabar yuborish", callback_data="admin_broadcast")]
+            ]),
+            parse_mode="HTML"
+        )
+        
+        await callback.answer()
         
     except Exception as e:
-        print(f"Broadcast error: {e}")
+        print(f"Admin campaigns error: {e}")
         try:
-            await bot.session.close()
+            await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
         except:
             pass
-        return sent_count
 
 # ================================
 # OTHER ADMIN HANDLERS - SAFE STUBS
@@ -454,14 +495,9 @@ async def admin_content(callback: CallbackQuery):
         
         # Get content statistics
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                cursor = await db.execute("SELECT COUNT(*) FROM content")
-                content_count = await cursor.fetchone()
-                content_total = content_count[0] if content_count else 0
-                
-                cursor = await db.execute("SELECT COUNT(*) FROM content WHERE is_premium = 1")
-                premium_count = await cursor.fetchone()
-                premium_total = premium_count[0] if premium_count else 0
+            stats = await get_stats()
+            content_total = stats.total_content
+            premium_total = stats.premium_content
         except Exception:
             content_total = 0
             premium_total = 0
@@ -507,14 +543,9 @@ async def admin_quiz(callback: CallbackQuery):
         
         # Get quiz statistics
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                cursor = await db.execute("SELECT COUNT(*) FROM quizzes")
-                quiz_count = await cursor.fetchone()
-                quiz_total = quiz_count[0] if quiz_count else 0
-                
-                cursor = await db.execute("SELECT COUNT(*) FROM questions")
-                question_count = await cursor.fetchone()
-                question_total = question_count[0] if question_count else 0
+            stats = await get_stats()
+            quiz_total = stats.total_quizzes
+            question_total = stats.total_questions
         except Exception:
             quiz_total = 0
             question_total = 0
@@ -561,14 +592,9 @@ async def admin_premium(callback: CallbackQuery):
         
         # Get premium user statistics
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                cursor = await db.execute("SELECT COUNT(*) FROM users WHERE is_premium = 1")
-                premium_count = await cursor.fetchone()
-                premium_users = premium_count[0] if premium_count else 0
-                
-                cursor = await db.execute("SELECT COUNT(*) FROM users")
-                total_count = await cursor.fetchone()
-                total_users = total_count[0] if total_count else 0
+            stats = await get_stats()
+            premium_users = stats.premium_users
+            total_users = stats.total_users
         except Exception:
             premium_users = 0
             total_users = 0
@@ -614,7 +640,7 @@ async def admin_payments(callback: CallbackQuery):
         
         # Get pending payment requests (if any)
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
+            async with db_pool.acquire() as db:
                 cursor = await db.execute("SELECT COUNT(*) FROM users WHERE payment_pending = 1")
                 pending_count = await cursor.fetchone()
                 pending_payments = pending_count[0] if pending_count else 0
@@ -729,7 +755,7 @@ async def delete_section_menu(callback: CallbackQuery):
         keyboard = []
         
         for i, section in enumerate(sections_list[:8], 1):  # Limit to 8 sections
-            section_id, name, description, language, is_premium = section
+            section_id, name, language, is_premium = section.id, section.name, section.language, section.is_premium
             premium_text = " (Premium)" if is_premium else ""
             text += f"{i}. <b>{name}</b>{premium_text} ({language})\n"
             
@@ -763,7 +789,7 @@ async def confirm_delete_section(callback: CallbackQuery):
         section_id = int(callback.data.split("_")[-1])
         
         # Get section details for confirmation
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             cursor = await db.execute("SELECT name, description FROM sections WHERE id = ?", (section_id,))
             section = await cursor.fetchone()
             
@@ -822,18 +848,19 @@ async def execute_delete_section(callback: CallbackQuery):
             
         section_id = int(callback.data.split("_")[-1])
         
-        # Delete section and all related data
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            # Get section name for confirmation message
+        # Get section name for confirmation message
+        async with db_pool.acquire() as db:
             cursor = await db.execute("SELECT name FROM sections WHERE id = ?", (section_id,))
             section = await cursor.fetchone()
             
-            if not section:
-                await callback.answer("❌ Bo'lim topilmadi", show_alert=True)
-                return
-                
-            section_name = section[0]
+        if not section:
+            await callback.answer("❌ Bo'lim topilmadi", show_alert=True)
+            return
             
+        section_name = section[0]
+        
+        # Delete section and all related data
+        async with db_pool.transaction() as db:
             # Delete all related content first
             await db.execute("DELETE FROM content WHERE section_id = ?", (section_id,))
             
@@ -842,8 +869,6 @@ async def execute_delete_section(callback: CallbackQuery):
             
             # Finally delete the section
             await db.execute("DELETE FROM sections WHERE id = ?", (section_id,))
-            
-            await db.commit()
         
         if not callback.message:
             await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
@@ -896,7 +921,9 @@ async def view_all_sections(callback: CallbackQuery):
         keyboard = []
         
         for i, section in enumerate(sections_list[:10], 1):  # Limit to 10 sections
-            section_id, name, description, language, is_premium = section
+            section_id, name, description, language, is_premium = (
+                section.id, section.name, section.description, section.language, section.is_premium
+            )
             premium_text = "💎 Premium" if is_premium else "🆓 Tekin"
             text += f"{i}. <b>{name}</b> ({premium_text})\n"
             text += f"   📖 {description}\n"
@@ -961,7 +988,7 @@ async def view_all_content(callback: CallbackQuery):
             await callback.answer("❌ Sizda admin huquqlari yo'q!", show_alert=True)
             return
             
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             cursor = await db.execute("""
                 SELECT c.id, c.title, c.content_type, c.is_premium, s.name as section_name
                 FROM content c
@@ -1030,7 +1057,7 @@ async def add_new_content(callback: CallbackQuery):
             
         keyboard = []
         for section in sections_list[:8]:  # Limit display
-            section_id, name, _, _, is_premium = section
+            section_id, name, is_premium = section.id, section.name, section.is_premium
             premium_icon = "💎" if is_premium else "📂"
             keyboard.append([InlineKeyboardButton(
                 text=f"{premium_icon} {name}", 
@@ -1064,7 +1091,7 @@ async def view_all_quizzes(callback: CallbackQuery):
             await callback.answer("❌ Sizda admin huquqlari yo'q!", show_alert=True)
             return
             
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             cursor = await db.execute("""
                 SELECT q.id, q.title, q.quiz_type, q.difficulty, 
                        COUNT(qu.id) as question_count
@@ -1144,6 +1171,14 @@ async def create_new_quiz(callback: CallbackQuery, state: FSMContext):
 # PREMIUM MANAGEMENT HANDLERS
 # =======================================================
 
+PREMIUM_USERS_QUERY = """
+    SELECT user_id, first_name, last_name, username, premium_expires_at, rating_score
+    FROM users 
+    WHERE is_premium = 1
+    ORDER BY premium_expires_at DESC
+    LIMIT 15
+"""
+
 @router.callback_query(F.data == "view_premium_users")
 async def view_premium_users(callback: CallbackQuery):
     """View premium users"""
@@ -1152,14 +1187,8 @@ async def view_premium_users(callback: CallbackQuery):
             await callback.answer("❌ Sizda admin huquqlari yo'q!", show_alert=True)
             return
             
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT user_id, first_name, last_name, username, premium_expires_at, rating_score
-                FROM users 
-                WHERE is_premium = 1
-                ORDER BY premium_expires_at DESC
-                LIMIT 15
-            """)
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(PREMIUM_USERS_QUERY)
             premium_users = await cursor.fetchall()
         
         if not premium_users:
@@ -1176,7 +1205,7 @@ async def view_premium_users(callback: CallbackQuery):
             text += f"{i}. <b>{name}</b> {username_text}\n"
             text += f"   🆔 {user_id}\n"
             text += f"   ⭐ {rating or 0} reyting\n"
-            text += f"   📅 {premium_expires_at or 'Cheksiz'}\n\n"
+            text += f"   📅 {format_ts(premium_expires_at, default='Cheksiz')}\n\n"
         
         keyboard = [
             [InlineKeyboardButton(text="🔙 Premium boshqaruv", callback_data="admin_premium")]
@@ -1267,7 +1296,7 @@ async def receive_section_name(message: Message, state: FSMContext):
 
 @router.message(F.text, StateFilter("creating_section_description"))
 async def receive_section_description(message: Message, state: FSMContext):
-    """Receive section description and ask premium status"""
+    """Receive section description and ask the study language"""
     try:
         if not message.from_user or message.from_user.id != ADMIN_ID:
             await message.answer("❌ Sizda admin huquqlari yo'q!")
@@ -1290,18 +1319,48 @@ async def receive_section_description(message: Message, state: FSMContext):
             return
             
         await state.update_data(section_description=section_description)
+        await state.set_state("creating_section_language")
+        
+        await message.answer(
+            f"📝 <b>Bo'lim nomi:</b> {section_name}\n"
+            f"📖 <b>Tavsif:</b> {section_description}\n\n"
+            f"🌐 <b>Bo'lim qaysi til uchun?</b>",
+            reply_markup=get_section_language_keyboard(STUDY_LANGUAGES, "section_lang_", "admin_sections"),
+            parse_mode="HTML"
+        )
+            
+    except Exception as e:
+        print(f"Section description error: {e}")
+        await message.answer("❌ Xatolik yuz berdi")
+
+@router.callback_query(F.data.startswith("section_lang_"), StateFilter("creating_section_language"))
+async def receive_section_language(callback: CallbackQuery, state: FSMContext):
+    """Receive the study language and ask premium status"""
+    try:
+        if not callback.from_user or callback.from_user.id != ADMIN_ID:
+            await callback.answer("❌ Sizda admin huquqlari yo'q!", show_alert=True)
+            return
+            
+        language = callback.data[len("section_lang_"):]
+        if language not in STUDY_LANGUAGES or not callback.message:
+            await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
+            return
+            
+        data = await state.get_data()
+        await state.update_data(section_language=language)
         await state.set_state("creating_section_premium")
         
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🆓 Tekin", callback_data="section_premium_free")],
             [InlineKeyboardButton(text="💎 Premium", callback_data="section_premium_paid")],
             [InlineKeyboardButton(text="❌ Bekor qilish", callback_data="admin_sections")]
         ])
         
-        await message.answer(
-            f"📝 <b>Bo'lim nomi:</b> {section_name}\n"
-            f"📖 <b>Tavsif:</b> {section_description}\n\n"
+        message = cast(Message, callback.message)
+        await message.edit_text(
+            f"📝 <b>Bo'lim nomi:</b> {data.get('section_name', '')}\n"
+            f"📖 <b>Tavsif:</b> {data.get('section_description', '')}\n"
+            f"🌐 <b>Til:</b> {LANGUAGE_TITLES.get(language, language)}\n\n"
             f"🔒 <b>Bo'lim turini tanlang:</b>\n\n"
             f"🆓 <b>Tekin</b> - barcha foydalanuvchilar ko'ra oladi\n"
             f"💎 <b>Premium</b> - faqat premium foydalanuvchilar ko'ra oladi\n\n"
@@ -1309,10 +1368,14 @@ async def receive_section_description(message: Message, state: FSMContext):
             reply_markup=keyboard,
             parse_mode="HTML"
         )
+        await callback.answer()
             
     except Exception as e:
-        print(f"Section description error: {e}")
-        await message.answer("❌ Xatolik yuz berdi")
+        print(f"Section language error: {e}")
+        try:
+            await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
+        except:
+            pass
 
 @router.callback_query(F.data.startswith("section_premium_"))
 async def receive_section_premium_status(callback: CallbackQuery, state: FSMContext):
@@ -1328,13 +1391,14 @@ async def receive_section_premium_status(callback: CallbackQuery, state: FSMCont
         data = await state.get_data()
         section_name = data.get("section_name", "")
         section_description = data.get("section_description", "")
+        section_language = data.get("section_language", "korean")
         
         # Create the section in database
         from .sections import create_section
         section_id = await create_section(
             name=section_name,
             description=section_description,
-            language="korean",
+            language=section_language,
             is_premium=is_premium
         )
         
@@ -1356,6 +1420,7 @@ async def receive_section_premium_status(callback: CallbackQuery, state: FSMCont
                 f"✅ <b>Bo'lim muvaffaqiyatli yaratildi!</b>\n\n"
                 f"📝 <b>Nomi:</b> {section_name}\n"
                 f"📖 <b>Tavsif:</b> {section_description}\n"
+                f"🌐 <b>Til:</b> {LANGUAGE_TITLES.get(section_language, section_language)}\n"
                 f"🔒 <b>Turi:</b> {premium_text}\n"
                 f"🆔 <b>ID:</b> {section_id}\n\n"
                 f"Endi bo'limga kontent qo'shishingiz mumkin!",
@@ -1481,30 +1546,30 @@ async def receive_premium_user_id(message: Message, state: FSMContext):
             return
             
         # Check if user exists and grant premium
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             cursor = await db.execute("SELECT first_name, is_premium FROM users WHERE user_id = ?", (user_id,))
             user = await cursor.fetchone()
             
-            if not user:
-                await message.answer("❌ Bunday foydalanuvchi topilmadi")
-                return
-                
-            first_name, is_premium = user
+        if not user:
+            await message.answer("❌ Bunday foydalanuvchi topilmadi")
+            return
             
-            if is_premium:
-                await message.answer(f"⚠️ {first_name} allaqachon premium foydalanuvchi")
-                return
-                
-            # Grant premium for 30 days
-            from datetime import datetime, timedelta
-            premium_expires_at = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+        first_name, is_premium = user
+        
+        if is_premium:
+            await message.answer(f"⚠️ {first_name} allaqachon premium foydalanuvchi")
+            return
             
+        # Grant premium for 30 days
+        premium_expires_at = days_from_now(30)
+        
+        async with db_pool.transaction() as db:
             await db.execute("""
                 UPDATE users 
                 SET is_premium = 1, premium_expires_at = ? 
                 WHERE user_id = ?
             """, (premium_expires_at, user_id))
-            await db.commit()
+        invalidate_user(user_id)
             
         await state.clear()
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -1516,27 +1581,24 @@ async def receive_premium_user_id(message: Message, state: FSMContext):
             f"✅ <b>Premium muvaffaqiyatli berildi!</b>\n\n"
             f"👤 Foydalanuvchi: {first_name}\n"
             f"🆔 ID: {user_id}\n"
-            f"📅 Muddat: {premium_expires_at} gacha",
+            f"📅 Muddat: {format_ts(premium_expires_at)} gacha",
             reply_markup=keyboard,
             parse_mode="HTML"
         )
         
-        # Notify user about premium
-        try:
-            bot = Bot(token=BOT_TOKEN)
-            await bot.send_message(
-                user_id,
-                "🎉 <b>Tabriklaymiz!</b>\n\n"
-                "Sizga admin tomonidan 30 kunlik premium obuna berildi!\n\n"
-                "💎 Premium imkoniyatlar:\n"
-                "• Barcha testlarga kirish\n"
-                "• Premium kontentlar\n"
-                "• Cheksiz AI suhbat\n\n"
-                "Premium obunangizdan foydalaning! 🚀",
-                parse_mode="HTML"
-            )
-        except Exception:
-            pass  # User might have blocked bot
+        # Notify user about premium; a blocked chat is flagged by the send engine
+        await send_engine.send(
+            message.bot,
+            user_id,
+            "🎉 <b>Tabriklaymiz!</b>\n\n"
+            "Sizga admin tomonidan 30 kunlik premium obuna berildi!\n\n"
+            "💎 Premium imkoniyatlar:\n"
+            "• Barcha testlarga kirish\n"
+            "• Premium kontentlar\n"
+            "• Cheksiz AI suhbat\n\n"
+            "Premium obunangizdan foydalaning! 🚀",
+            parse_mode="HTML"
+        )
             
     except Exception as e:
         print(f"Grant premium error: {e}")
@@ -1570,6 +1632,16 @@ async def revoke_premium(callback: CallbackQuery, state: FSMContext):
         print(f"Revoke premium error: {e}")
         await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
 
+ACTIVE_PREMIUM_COUNT_QUERY = """
+    SELECT COUNT(*) FROM users 
+    WHERE is_premium = 1 AND premium_expires_at >= ?
+"""
+
+EXPIRED_PREMIUM_COUNT_QUERY = """
+    SELECT COUNT(*) FROM users 
+    WHERE is_premium = 1 AND premium_expires_at < ?
+"""
+
 @router.callback_query(F.data == "premium_stats")
 async def premium_stats(callback: CallbackQuery):
     """Premium statistics"""
@@ -1583,44 +1655,22 @@ async def premium_stats(callback: CallbackQuery):
             return
             
         # Get comprehensive premium statistics
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            # Total users
-            cursor = await db.execute("SELECT COUNT(*) FROM users")
-            total_users = (await cursor.fetchone())[0]
-            
-            # Premium users
-            cursor = await db.execute("SELECT COUNT(*) FROM users WHERE is_premium = 1")
-            premium_users = (await cursor.fetchone())[0]
-            
-            # New users this week
-            cursor = await db.execute("""
-                SELECT COUNT(*) FROM users 
-                WHERE created_at >= datetime('now', '-7 days')
-            """)
-            new_users_week = (await cursor.fetchone())[0]
-            
+        stats = await get_stats()
+        total_users = stats.total_users
+        premium_users = stats.premium_users
+        new_users_week = await get_new_users_count(7)
+
+        async with db_pool.acquire() as db:
             # Premium users this week
-            cursor = await db.execute("""
-                SELECT COUNT(*) FROM users 
-                WHERE is_premium = 1 AND premium_expires_at >= datetime('now')
-            """)
+            cursor = await db.execute(ACTIVE_PREMIUM_COUNT_QUERY, (now_ts(),))
             active_premium = (await cursor.fetchone())[0]
             
             # Expired premium
-            cursor = await db.execute("""
-                SELECT COUNT(*) FROM users 
-                WHERE is_premium = 1 AND premium_expires_at < datetime('now')
-            """)
+            cursor = await db.execute(EXPIRED_PREMIUM_COUNT_QUERY, (now_ts(),))
             expired_premium = (await cursor.fetchone())[0]
-            
-            # Top users by rating
-            cursor = await db.execute("""
-                SELECT first_name, rating_score, is_premium FROM users 
-                WHERE rating_score > 0
-                ORDER BY rating_score DESC 
-                LIMIT 5
-            """)
-            top_users = await cursor.fetchall()
+
+        # Top users by rating, pre-rendered in the leaderboard snapshot
+        snapshot = await leaderboard.get()
         
         premium_percentage = (premium_users / total_users * 100) if total_users > 0 else 0
         
@@ -1637,11 +1687,7 @@ async def premium_stats(callback: CallbackQuery):
 
 ⭐ <b>Top foydalanuvchilar:</b>
 """
-        
-        for i, (name, rating, is_premium) in enumerate(top_users, 1):
-            premium_mark = "💎" if is_premium else "🆓"
-            unknown_text = "Noma'lum"
-            stats_text += f"{i}. {name or unknown_text} - {rating or 0} ⭐ {premium_mark}\n"
+        stats_text += snapshot.admin_top_text
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🔄 Yangilash", callback_data="premium_stats")],
@@ -1683,27 +1729,28 @@ async def receive_revoke_premium_id(message: Message, state: FSMContext):
             return
             
         # Check if user exists and remove premium
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             cursor = await db.execute("SELECT first_name, is_premium FROM users WHERE user_id = ?", (user_id,))
             user = await cursor.fetchone()
             
-            if not user:
-                await message.answer("❌ Bunday foydalanuvchi topilmadi")
-                return
-                
-            first_name, is_premium = user
+        if not user:
+            await message.answer("❌ Bunday foydalanuvchi topilmadi")
+            return
             
-            if not is_premium:
-                await message.answer(f"⚠️ {first_name} premium foydalanuvchi emas")
-                return
-                
-            # Remove premium
+        first_name, is_premium = user
+        
+        if not is_premium:
+            await message.answer(f"⚠️ {first_name} premium foydalanuvchi emas")
+            return
+            
+        # Remove premium
+        async with db_pool.transaction() as db:
             await db.execute("""
                 UPDATE users 
                 SET is_premium = 0, premium_expires_at = NULL 
                 WHERE user_id = ?
             """, (user_id,))
-            await db.commit()
+        invalidate_user(user_id)
             
         await state.clear()
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -1719,18 +1766,15 @@ async def receive_revoke_premium_id(message: Message, state: FSMContext):
             parse_mode="HTML"
         )
         
-        # Notify user about premium removal
-        try:
-            bot = Bot(token=BOT_TOKEN)
-            await bot.send_message(
-                user_id,
-                "📢 <b>Premium obuna tugadi</b>\n\n"
-                "Sizning premium obunangiz admin tomonidan bekor qilindi.\n\n"
-                "Premium obunani qayta olish uchun /premium buyrug'idan foydalaning.",
-                parse_mode="HTML"
-            )
-        except Exception:
-            pass  # User might have blocked bot
+        # Notify user about premium removal; a blocked chat is flagged by the send engine
+        await send_engine.send(
+            message.bot,
+            user_id,
+            "📢 <b>Premium obuna tugadi</b>\n\n"
+            "Sizning premium obunangiz admin tomonidan bekor qilindi.\n\n"
+            "Premium obunani qayta olish uchun /premium buyrug'idan foydalaning.",
+            parse_mode="HTML"
+        )
             
     except Exception as e:
         print(f"Revoke premium error: {e}")
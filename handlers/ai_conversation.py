@@ -246,7 +246,7 @@ async def handle_korean_conversation(message: Message, state: FSMContext):
         ai_response = await korean_ai.generate_response(user_message, user_id)
         
         # Reyting yangilash (+1.5 ball)
-        await update_user_rating(user_id, 1.5)
+        await update_user_rating(user_id, 1.5, 'conversation_ai')
         
         # Exit keyboard
         exit_keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -292,7 +292,7 @@ async def handle_japanese_conversation(message: Message, state: FSMContext):
         ai_response = await japanese_ai.generate_response(user_message, user_id)
         
         # Reyting yangilash (+1.5 ball)
-        await update_user_rating(user_id, 1.5)
+        await update_user_rating(user_id, 1.5, 'conversation_ai')
         
         # Exit keyboard
         exit_keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -1,15 +1,16 @@
 """
 Kontent boshqaruvi - video, audio, hujjat va matn yuklash
 """
-import aiosqlite
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from typing import cast
 
-from config import DATABASE_PATH, ADMIN_ID
-from database import get_user
+from config import ADMIN_ID
+from database import db_pool, get_stats, is_premium_active
+from models import Content
+from utils.timeutil import now_ts
 
 router = Router()
 
@@ -30,32 +31,37 @@ async def add_content(section_id: int, subsection_id: int, title: str, descripti
                      text_content: str = None, is_premium: bool = False):
     """Kontent qo'shish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.transaction() as db:
             cursor = await db.execute("""
                 INSERT INTO content (
                     section_id, subsection_id, title, description, content_type,
                     file_id, file_path, content_text, is_premium, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 section_id or 0, subsection_id or 0, title, description, content_type,
-                file_id, file_path, text_content, is_premium
+                file_id, file_path, text_content, is_premium, now_ts()
             ))
-            await db.commit()
             return cursor.lastrowid
     except Exception as e:
         print(f"Add content error: {e}")
         return None
 
+CONTENT_BY_SECTION_QUERY = f"""
+    SELECT {Content.select_list(Content.LISTING)} FROM content 
+    WHERE section_id = ? ORDER BY created_at DESC
+"""
+
+CONTENT_BY_SUBSECTION_QUERY = f"""
+    SELECT {Content.select_list(Content.LISTING)} FROM content 
+    WHERE subsection_id = ? ORDER BY created_at DESC
+"""
+
 async def get_content_by_section(section_id: int):
     """Bo'lim bo'yicha kontentni olish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT id, title, description, content_type, file_id, file_path, 
-                       content_text, is_premium FROM content 
-                WHERE section_id = ? ORDER BY created_at DESC
-            """, (section_id,))
-            return await cursor.fetchall()
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(CONTENT_BY_SECTION_QUERY, (section_id,))
+            return Content.from_rows(await cursor.fetchall(), Content.LISTING)
     except Exception as e:
         print(f"Get content by section error: {e}")
         return []
@@ -63,13 +69,9 @@ async def get_content_by_section(section_id: int):
 async def get_content_by_subsection(subsection_id: int):
     """Pastki bo'lim bo'yicha kontentni olish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT id, title, description, content_type, file_id, file_path, 
-                       content_text, is_premium FROM content 
-                WHERE subsection_id = ? ORDER BY created_at DESC
-            """, (subsection_id,))
-            return await cursor.fetchall()
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(CONTENT_BY_SUBSECTION_QUERY, (subsection_id,))
+            return Content.from_rows(await cursor.fetchall(), Content.LISTING)
     except Exception as e:
         print(f"Get content by subsection error: {e}")
         return []
@@ -77,13 +79,12 @@ async def get_content_by_subsection(subsection_id: int):
 async def get_content_by_id(content_id: int):
     """ID bo'yicha kontentni olish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT id, section_id, subsection_id, title, description, content_type, 
-                       file_id, file_path, content_text, is_premium FROM content 
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(f"""
+                SELECT {Content.select_list(Content.DETAIL)} FROM content 
                 WHERE id = ?
             """, (content_id,))
-            return await cursor.fetchone()
+            return Content.from_row(await cursor.fetchone(), Content.DETAIL)
     except Exception as e:
         print(f"Get content by id error: {e}")
         return None
@@ -91,9 +92,8 @@ async def get_content_by_id(content_id: int):
 async def delete_content(content_id: int):
     """Kontentni o'chirish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.transaction() as db:
             await db.execute("DELETE FROM content WHERE id = ?", (content_id,))
-            await db.commit()
             return True
     except Exception as e:
         print(f"Delete content error: {e}")
@@ -380,13 +380,12 @@ async def user_subsection_view(callback: CallbackQuery):
             return
         
         user_id = callback.from_user.id
-        user = await get_user(user_id)
         
         # Premium check
-        is_premium = user[8] if user and len(user) > 8 else False
+        is_premium = await is_premium_active(user_id)
         
         # Pastki bo'lim ma'lumotlarini olish
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             cursor = await db.execute("""
                 SELECT s.id, s.name, s.description, sec.name as section_name
                 FROM subsections s
@@ -411,7 +410,8 @@ async def user_subsection_view(callback: CallbackQuery):
         if content_list:
             subsection_text += f"📁 <b>Mavjud kontentlar:</b>\n"
             for content in content_list:
-                content_id, title, desc, c_type, file_id, file_path, text_content, is_content_premium = content
+                content_id, title, c_type = content.id, content.title, content.content_type
+                is_content_premium = content.is_premium
                 
                 # Premium content check
                 if is_content_premium and not is_premium:
@@ -431,7 +431,7 @@ async def user_subsection_view(callback: CallbackQuery):
         
         # Premium content promotion for non-premium users
         if not is_premium:
-            premium_content_count = len([c for c in content_list if c[7]])  # is_premium field
+            premium_content_count = len([c for c in content_list if c.is_premium])
             if premium_content_count > 0:
                 subsection_text += f"\n\n💎 <b>Premium kontentlar:</b> {premium_content_count} ta\n"
                 subsection_text += "Premium obuna uchun /premium buyrug'idan foydalaning"
@@ -467,10 +467,9 @@ async def view_content(callback: CallbackQuery):
             return
         
         user_id = callback.from_user.id
-        user = await get_user(user_id)
         
         # Premium check
-        is_premium = user[8] if user and len(user) > 8 else False
+        is_premium = await is_premium_active(user_id)
         
         # Kontent ma'lumotlarini olish
         content = await get_content_by_id(content_id)
@@ -479,7 +478,8 @@ async def view_content(callback: CallbackQuery):
             await callback.answer("❌ Kontent topilmadi!", show_alert=True)
             return
         
-        content_id, section_id, subsection_id, title, description, content_type, file_id, file_path, text_content, is_content_premium = content
+        title, description, content_type = content.title, content.description, content.content_type
+        file_id, text_content, is_content_premium = content.file_id, content.content_text, content.is_premium
         
         # Premium content check
         if is_content_premium and not is_premium:
@@ -557,12 +557,9 @@ async def admin_content_menu(callback: CallbackQuery):
             return
             
         # Get content statistics
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("SELECT COUNT(*) FROM content")
-            total_content = (await cursor.fetchone())[0]
-            
-            cursor = await db.execute("SELECT COUNT(*) FROM content WHERE is_premium = 1")
-            premium_content = (await cursor.fetchone())[0]
+        stats = await get_stats()
+        total_content = stats.total_content
+        premium_content = stats.premium_content
         
         content_text = f"📁 <b>Kontent boshqaruvi</b>\n\n"
         content_text += f"📊 <b>Statistika:</b>\n"
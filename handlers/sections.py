@@ -1,15 +1,17 @@
 """
 Bo'limlar va pastki bo'limlar boshqaruvi
 """
-import aiosqlite
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from typing import cast
 
-from config import DATABASE_PATH, ADMIN_ID
-from database import get_user
+from config import ADMIN_ID
+from database import db_pool, get_user, is_premium_active, set_study_language, STUDY_LANGUAGES
+from keyboards import LANGUAGE_TITLES, get_languages_keyboard, get_section_language_keyboard
+from models import Section, Content
+from utils.timeutil import now_ts
 
 router = Router()
 
@@ -17,6 +19,7 @@ class SectionStates(StatesGroup):
     creating_section = State()
     section_name = State()
     section_description = State()
+    section_language = State()
     creating_subsection = State()
     subsection_name = State()
     subsection_description = State()
@@ -51,12 +54,11 @@ def admin_only(func):
 async def create_section(name: str, description: str, language: str = "korean", is_premium: bool = False):
     """Bo'lim yaratish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.transaction() as db:
             cursor = await db.execute("""
                 INSERT INTO sections (name, description, language, is_premium, created_at) 
-                VALUES (?, ?, ?, ?, datetime('now'))
-            """, (name, description, language, is_premium))
-            await db.commit()
+                VALUES (?, ?, ?, ?, ?)
+            """, (name, description, language, is_premium, now_ts()))
             return cursor.lastrowid
     except Exception as e:
         print(f"Create section error: {e}")
@@ -65,44 +67,47 @@ async def create_section(name: str, description: str, language: str = "korean",
 async def create_subsection(section_id: int, name: str, description: str):
     """Pastki bo'lim yaratish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.transaction() as db:
             cursor = await db.execute("""
                 INSERT INTO subsections (section_id, name, description, created_at) 
-                VALUES (?, ?, ?, datetime('now'))
-            """, (section_id, name, description))
-            await db.commit()
+                VALUES (?, ?, ?, ?)
+            """, (section_id, name, description, now_ts()))
             return cursor.lastrowid
     except Exception as e:
         print(f"Create subsection error: {e}")
         return None
 
+SECTIONS_BY_LANGUAGE_QUERY = f"""
+    SELECT {Section.select_list(Section.LISTING)} FROM sections 
+    WHERE language = ? ORDER BY created_at DESC
+"""
+
 async def get_sections(language: str = None):
     """Bo'limlarni olish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             if language:
-                cursor = await db.execute("""
-                    SELECT id, name, description, language, is_premium FROM sections 
-                    WHERE language = ? ORDER BY created_at DESC
-                """, (language,))
+                cursor = await db.execute(SECTIONS_BY_LANGUAGE_QUERY, (language,))
             else:
-                cursor = await db.execute("""
-                    SELECT id, name, description, language, is_premium FROM sections 
+                cursor = await db.execute(f"""
+                    SELECT {Section.select_list(Section.LISTING)} FROM sections 
                     ORDER BY created_at DESC
                 """)
-            return await cursor.fetchall()
+            return Section.from_rows(await cursor.fetchall(), Section.LISTING)
     except Exception as e:
         print(f"Get sections error: {e}")
         return []
 
+SUBSECTIONS_QUERY = """
+    SELECT id, name, description FROM subsections 
+    WHERE section_id = ? ORDER BY created_at DESC
+"""
+
 async def get_subsections(section_id: int):
     """Pastki bo'limlarni olish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT id, name, description FROM subsections 
-                WHERE section_id = ? ORDER BY created_at DESC
-            """, (section_id,))
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(SUBSECTIONS_QUERY, (section_id,))
             return await cursor.fetchall()
     except Exception as e:
         print(f"Get subsections error: {e}")
@@ -111,12 +116,11 @@ async def get_subsections(section_id: int):
 async def delete_section(section_id: int):
     """Bo'limni o'chirish"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.transaction() as db:
             # Avval pastki bo'limlarni o'chirish
             await db.execute("DELETE FROM subsections WHERE section_id = ?", (section_id,))
             # Keyin bo'limni o'chirish
             await db.execute("DELETE FROM sections WHERE id = ?", (section_id,))
-            await db.commit()
             return True
     except Exception as e:
         print(f"Delete section error: {e}")
@@ -141,8 +145,8 @@ async def admin_sections_menu(callback: CallbackQuery):
         if sections:
             sections_text += "📋 <b>Mavjud bo'limlar:</b>\n"
             for section in sections:
-                subsections = await get_subsections(section[0])
-                sections_text += f"• {section[1]} ({len(subsections)} pastki bo'lim)\n"
+                subsections = await get_subsections(section.id)
+                sections_text += f"• {section.name} ({len(subsections)} pastki bo'lim)\n"
         else:
             sections_text += "📭 Hozircha bo'limlar yo'q"
             
@@ -235,24 +239,54 @@ async def section_description_received(message: Message, state: FSMContext):
             await message.answer("❌ Bekor qilindi")
             return
         
+        await state.update_data(section_description=message.text)
+        await state.set_state(SectionStates.section_language)
+        
+        await message.answer(
+            f"✅ <b>Bo'lim ta'rifi:</b> {message.text}\n\n"
+            "🌐 Bo'lim qaysi til uchun?",
+            reply_markup=get_section_language_keyboard(STUDY_LANGUAGES, "new_section_lang_", "admin_sections"),
+            parse_mode="HTML"
+        )
+        
+    except Exception as e:
+        print(f"Section description received error: {e}")
+
+@router.callback_query(SectionStates.section_language, F.data.startswith("new_section_lang_"))
+@admin_only
+async def section_language_received(callback: CallbackQuery, state: FSMContext):
+    """Bo'lim tilini qabul qilish va bo'limni saqlash"""
+    try:
+        language = callback.data[len("new_section_lang_"):]
+        if language not in STUDY_LANGUAGES:
+            await callback.answer("❌ Xatolik!", show_alert=True)
+            return
+        
         data = await state.get_data()
         section_name = data.get('section_name', '')
+        section_description = data.get('section_description', '')
         
         # Bo'limni saqlash
         section_id = await create_section(
             name=section_name,
-            description=message.text,
-            language="korean",
+            description=section_description,
+            language=language,
             is_premium=False  # Default as free
         )
         
         await state.clear()
         
+        if not callback.message:
+            await callback.answer("❌ Xatolik!", show_alert=True)
+            return
+        
+        message = cast(Message, callback.message)
         if section_id:
-            await message.answer(
+            await message.edit_text(
                 f"✅ <b>Bo'lim muvaffaqiyatli yaratildi!</b>\n\n"
                 f"📚 <b>Nomi:</b> {section_name}\n"
-                f"📝 <b>Ta'rifi:</b> {message.text}\n"
+                f"📝 <b>Ta'rifi:</b> {section_description}\n"
+                f"🌐 <b>Til:</b> {LANGUAGE_TITLES.get(language, language)}\n"
                 f"🆔 <b>ID:</b> {section_id}",
                 reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                     [InlineKeyboardButton(text="➕ Pastki bo'lim qo'shish", callback_data=f"add_subsection_{section_id}")],
@@ -261,10 +295,15 @@ async def section_description_received(message: Message, state: FSMContext):
                 parse_mode="HTML"
             )
         else:
-            await message.answer("❌ Bo'lim yaratishda xatolik yuz berdi")
+            await message.edit_text("❌ Bo'lim yaratishda xatolik yuz berdi")
+        await callback.answer()
         
     except Exception as e:
-        print(f"Section description received error: {e}")
+        print(f"Section language received error: {e}")
+        try:
+            await callback.answer("❌ Xatolik!", show_alert=True)
+        except:
+            pass
 
 @router.callback_query(F.data.startswith("add_subsection_"))
 @admin_only
@@ -393,9 +432,9 @@ async def view_sections(callback: CallbackQuery):
         
         keyboard = []
         for section in sections:
-            subsections = await get_subsections(section[0])
-            button_text = f"📚 {section[1]} ({len(subsections)} pastki bo'lim)"
-            keyboard.append([InlineKeyboardButton(text=button_text, callback_data=f"section_details_{section[0]}")])
+            subsections = await get_subsections(section.id)
+            button_text = f"📚 {section.name} ({len(subsections)} pastki bo'lim)"
+            keyboard.append([InlineKeyboardButton(text=button_text, callback_data=f"section_details_{section.id}")])
         
         keyboard.append([InlineKeyboardButton(text="🔙 Orqaga", callback_data="admin_sections")])
         
@@ -427,11 +466,12 @@ async def section_details(callback: CallbackQuery):
             return
         
         # Bo'lim ma'lumotlarini olish
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT id, name, description, language FROM sections WHERE id = ?
+        async with db_pool.acquire() as db:
+            columns = ("id", "name", "description", "language")
+            cursor = await db.execute(f"""
+                SELECT {Section.select_list(columns)} FROM sections WHERE id = ?
             """, (section_id,))
-            section = await cursor.fetchone()
+            section = Section.from_row(await cursor.fetchone(), columns)
         
         if not section:
             await callback.answer("❌ Bo'lim topilmadi!", show_alert=True)
@@ -439,10 +479,10 @@ async def section_details(callback: CallbackQuery):
         
         subsections = await get_subsections(section_id)
         
-        details_text = f"📚 <b>{section[1]}</b>\n\n"
-        details_text += f"📝 <b>Ta'rif:</b> {section[2]}\n"
-        details_text += f"🌐 <b>Til:</b> {section[3]}\n"
-        details_text += f"🆔 <b>ID:</b> {section[0]}\n\n"
+        details_text = f"📚 <b>{section.name}</b>\n\n"
+        details_text += f"📝 <b>Ta'rif:</b> {section.description}\n"
+        details_text += f"🌐 <b>Til:</b> {section.language}\n"
+        details_text += f"🆔 <b>ID:</b> {section.id}\n\n"
         
         if subsections:
             details_text += f"📂 <b>Pastki bo'limlar ({len(subsections)}):</b>\n"
@@ -492,7 +532,12 @@ async def user_sections(callback: CallbackQuery):
             await callback.answer("❌ Foydalanuvchi topilmadi!", show_alert=True)
             return
         
-        sections = await get_sections("korean")
+        # Ask for the study language once, sections are listed per language
+        if user.study_language not in STUDY_LANGUAGES:
+            await show_language_choice(callback)
+            return
+        
+        sections = await get_sections(user.study_language)
         
         if not sections:
             message = cast(Message, callback.message)
@@ -500,6 +545,7 @@ async def user_sections(callback: CallbackQuery):
                 "📭 <b>Hozircha bo'limlar yo'q</b>\n\n"
                 "Admin tomonidan bo'limlar qo'shilguncha kuting",
                 reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="🌐 Tilni o'zgartirish", callback_data="choose_language")],
                     [InlineKeyboardButton(text="🔙 Bosh menu", callback_data="main_menu")]
                 ]),
                 parse_mode="HTML"
@@ -508,10 +554,10 @@ async def user_sections(callback: CallbackQuery):
             return
         
         keyboard = []
-        is_premium = user[8] if user and len(user) > 8 else False
+        is_premium = await is_premium_active(user_id)
         
         for section in sections:
-            section_id, name, description, language, section_is_premium = section
+            section_id, name, section_is_premium = section.id, section.name, section.is_premium
             subsections = await get_subsections(section_id)
             
             if section_is_premium and not is_premium:
@@ -524,6 +570,7 @@ async def user_sections(callback: CallbackQuery):
                 button_text = f"{icon} {name} ({len(subsections)})"
                 keyboard.append([InlineKeyboardButton(text=button_text, callback_data=f"user_section_{section_id}")])
         
+        keyboard.append([InlineKeyboardButton(text="🌐 Tilni o'zgartirish", callback_data="choose_language")])
         keyboard.append([InlineKeyboardButton(text="🔙 Bosh menu", callback_data="main_menu")])
         
         message = cast(Message, callback.message)
@@ -542,6 +589,44 @@ async def user_sections(callback: CallbackQuery):
         except:
             pass
 
+@router.callback_query(F.data == "choose_language")
+async def show_language_choice(callback: CallbackQuery):
+    """O'rganiladigan tilni tanlash"""
+    try:
+        message = cast(Message, callback.message)
+        await message.edit_text(
+            "🌐 <b>Qaysi tilni o'rganasiz?</b>\n\n"
+            "Bo'limlar va til reytingi tanlangan til bo'yicha ko'rsatiladi.",
+            reply_markup=get_languages_keyboard(),
+            parse_mode="HTML"
+        )
+        await callback.answer()
+    except Exception as e:
+        print(f"Language choice error: {e}")
+
+@router.callback_query(F.data.in_(STUDY_LANGUAGES))
+async def select_study_language(callback: CallbackQuery):
+    """Tanlangan tilni saqlash"""
+    try:
+        if not callback.from_user:
+            await callback.answer("❌ Xatolik!", show_alert=True)
+            return
+        
+        await set_study_language(callback.from_user.id, callback.data)
+        await user_sections(callback)
+    except Exception as e:
+        print(f"Select language error: {e}")
+        try:
+            await callback.answer("❌ Xatolik!", show_alert=True)
+        except:
+            pass
+
+# Content placed directly in a section, outside any subsection
+SECTION_ROOT_CONTENT_QUERY = f"""
+    SELECT {Content.select_list(Content.LISTING)} FROM content 
+    WHERE section_id = ? AND subsection_id = 0 ORDER BY created_at DESC
+"""
+
 @router.callback_query(F.data.startswith("user_section_"))
 async def user_section_view(callback: CallbackQuery):
     """Foydalanuvchi bo'limini ko'rish"""
@@ -553,24 +638,23 @@ async def user_section_view(callback: CallbackQuery):
             return
         
         user_id = callback.from_user.id
-        user = await get_user(user_id)
         
         # Premium check
-        is_premium = user[8] if user and len(user) > 8 else False
+        is_premium = await is_premium_active(user_id)
         
         # Bo'lim ma'lumontlarini olish
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT id, name, description, language, is_premium FROM sections WHERE id = ?
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(f"""
+                SELECT {Section.select_list(Section.LISTING)} FROM sections WHERE id = ?
             """, (section_id,))
-            section = await cursor.fetchone()
+            section = Section.from_row(await cursor.fetchone(), Section.LISTING)
         
         if not section:
             await callback.answer("❌ Bo'lim topilmadi!", show_alert=True)
             return
             
         # Premium access check
-        section_is_premium = section[4] if len(section) > 4 else False
+        section_is_premium = section.is_premium
         if section_is_premium and not is_premium:
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="💎 Premium sotib olish", callback_data="premium")],
@@ -579,7 +663,7 @@ async def user_section_view(callback: CallbackQuery):
             
             message = cast(Message, callback.message)
             await message.edit_text(
-                f"🔒 <b>{section[1]}</b>\n\n"
+                f"🔒 <b>{section.name}</b>\n\n"
                 f"❌ Bu bo'lim premium foydalanuvchilar uchun!\n\n"
                 f"💎 Premium obunani olish uchun /premium buyrug'idan foydalaning",
                 reply_markup=keyboard,
@@ -590,24 +674,14 @@ async def user_section_view(callback: CallbackQuery):
         
         subsections = await get_subsections(section_id)
         
-        # Bo'limning to'g'ridan-to'g'ri kontentini olish
-        from .content import get_content_by_section
-        all_content = await get_content_by_section(section_id)
-        
-        # Database da subsection_id ni to'g'ri olish uchun to'liq query
-        direct_content = []
-        if all_content:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                cursor = await db.execute("""
-                    SELECT id, title, description, content_type, file_id, file_path, 
-                           content_text, is_premium, subsection_id FROM content 
-                    WHERE section_id = ? AND subsection_id = 0 ORDER BY created_at DESC
-                """, (section_id,))
-                direct_content = await cursor.fetchall()
+        # Bo'limning to'g'ridan-to'g'ri kontentini olish (pastki bo'limsiz)
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(SECTION_ROOT_CONTENT_QUERY, (section_id,))
+            direct_content = Content.from_rows(await cursor.fetchall(), Content.LISTING)
         
         premium_icon = "💎" if section_is_premium else "📚"
-        section_text = f"{premium_icon} <b>{section[1]}</b>\n\n"
-        section_text += f"📝 {section[2]}\n\n"
+        section_text = f"{premium_icon} <b>{section.name}</b>\n\n"
+        section_text += f"📝 {section.description}\n\n"
         
         keyboard = []
         
@@ -615,7 +689,8 @@ async def user_section_view(callback: CallbackQuery):
         if direct_content:
             section_text += f"📁 <b>Bo'lim kontenti:</b>\n"
             for content in direct_content:
-                content_id, title, desc, c_type, file_id, file_path, text_content, is_content_premium, subsection_id = content
+                content_id, title, c_type = content.id, content.title, content.content_type
+                is_content_premium = content.is_premium
                 
                 # Premium content check
                 if is_content_premium and not is_premium:
@@ -670,7 +745,7 @@ async def premium_required_handler(callback: CallbackQuery):
             return
             
         # Bo'lim nomini olish
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             cursor = await db.execute("SELECT name FROM sections WHERE id = ?", (section_id,))
             section = await cursor.fetchone()
         
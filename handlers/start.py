@@ -1,17 +1,20 @@
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-import aiosqlite
 
-from database import get_user, create_user, update_user_activity, add_referral
+from database import db_pool, get_user, create_user, update_user_activity, add_referral, invalidate_user, clear_blocked, set_reminder
+from models import User
 from utils.subscription_check import check_subscriptions
 from utils.rating_system import update_user_rating
-from keyboards import get_main_menu, get_subscription_keyboard
+from utils.send_engine import send_engine
+from keyboards import LANGUAGE_TITLES, get_main_menu, get_subscription_keyboard
 from messages import WELCOME_MESSAGE, SUBSCRIPTION_REQUIRED_MESSAGE
-from config import ADMIN_ID, DATABASE_PATH
-from datetime import datetime, timedelta
+from config import ADMIN_ID, DEFAULT_TZ_OFFSET_MINUTES
+from utils.timeutil import days_from_now, format_ts
 
 router = Router()
 
@@ -21,7 +24,7 @@ class StartStates(StatesGroup):
 async def process_new_referral(referrer_id: int, new_user_id: int, new_user_name: str, bot):
     """Process new referral - update count and check for premium upgrade"""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.transaction() as db:
             # Update referrer's referral count
             await db.execute("""
                 UPDATE users 
@@ -40,68 +43,66 @@ async def process_new_referral(referrer_id: int, new_user_id: int, new_user_name
                 return
                 
             referrer_name, referral_count, is_premium = referrer_data
-            await db.commit()
+        invalidate_user(referrer_id)
         
         # Check if referrer reached 10 referrals and isn't already premium
         if referral_count >= 10 and not is_premium:
             # Grant premium for 30 days
-            premium_expires_at = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+            premium_expires_at = days_from_now(30)
             
-            async with aiosqlite.connect(DATABASE_PATH) as db:
+            async with db_pool.transaction() as db:
                 await db.execute("""
                     UPDATE users 
                     SET is_premium = 1, premium_expires_at = ?
                     WHERE user_id = ?
                 """, (premium_expires_at, referrer_id))
-                await db.commit()
+            invalidate_user(referrer_id)
             
             # Send premium notification
-            try:
-                await bot.send_message(
-                    referrer_id,
-                    "🎉🎉🎉 <b>TABRIKLAYMIZ!</b> 🎉🎉🎉\n\n"
-                    f"👤 <b>{new_user_name}</b> sizning 10-referalingiz bo'ldi!\n\n"
-                    "💎 <b>PREMIUM MUKOFOT:</b>\n"
-                    "✅ 30 kunlik premium obuna berildi!\n"
-                    "✅ Barcha premium bo'limlarga kirish\n"
-                    "✅ Maxsus materiallar va testlar\n"
-                    "✅ AI suhbat bilan amaliyot\n\n"
-                    f"🗓 Muddat: {premium_expires_at.split()[0]} gacha\n\n"
-                    "🚀 Premium imkoniyatlardan foydalaning!",
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
+            await send_engine.send(
+                bot,
+                referrer_id,
+                "🎉🎉🎉 <b>TABRIKLAYMIZ!</b> 🎉🎉🎉\n\n"
+                f"👤 <b>{new_user_name}</b> sizning 10-referalingiz bo'ldi!\n\n"
+                "💎 <b>PREMIUM MUKOFOT:</b>\n"
+                "✅ 30 kunlik premium obuna berildi!\n"
+                "✅ Barcha premium bo'limlarga kirish\n"
+                "✅ Maxsus materiallar va testlar\n"
+                "✅ AI suhbat bilan amaliyot\n\n"
+                f"🗓 Muddat: {format_ts(premium_expires_at, '%Y-%m-%d')} gacha\n\n"
+                "🚀 Premium imkoniyatlardan foydalaning!",
+                parse_mode="HTML"
+            )
                 
             # Reset referral count for next reward cycle
-            async with aiosqlite.connect(DATABASE_PATH) as db:
+            async with db_pool.transaction() as db:
                 await db.execute("""
                     UPDATE users 
                     SET referral_count = 0 
                     WHERE user_id = ?
                 """, (referrer_id,))
-                await db.commit()
+            invalidate_user(referrer_id)
                 
         else:
             # Send regular referral notification
             remaining_referrals = max(0, 10 - referral_count)
-            try:
-                await bot.send_message(
-                    referrer_id,
-                    f"🎉 <b>Yangi referral!</b>\n\n"
-                    f"👤 <b>{new_user_name}</b> sizning taklifingiz bilan qo'shildi!\n\n"
-                    f"📊 <b>Referral hisobi:</b>\n"
-                    f"✅ Hozirgi: {referral_count}/10\n"
-                    f"⏳ Qolgan: {remaining_referrals} ta\n\n"
-                    f"💎 {remaining_referrals} ta referral qoldi va 1 oy bepul premium olasiz!",
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
+            await send_engine.send(
+                bot,
+                referrer_id,
+                f"🎉 <b>Yangi referral!</b>\n\n"
+                f"👤 <b>{new_user_name}</b> sizning taklifingiz bilan qo'shildi!\n\n"
+                f"📊 <b>Referral hisobi:</b>\n"
+                f"✅ Hozirgi: {referral_count}/10\n"
+                f"⏳ Qolgan: {remaining_referrals} ta\n\n"
+                f"💎 {remaining_referrals} ta referral qoldi va 1 oy bepul premium olasiz!",
+                parse_mode="HTML"
+            )
                 
     except Exception as e:
         print(f"Referral processing error: {e}")
 
+REFERRER_QUERY = "SELECT user_id FROM users WHERE referral_code = ?"
+
 @router.message(CommandStart())
 async def start_command(message: Message, state: FSMContext):
     if not message.from_user:
@@ -116,14 +117,8 @@ async def start_command(message: Message, state: FSMContext):
     if message.text and len(message.text.split()) > 1:
         referral_code = message.text.split()[1]
         # Get referrer by referral code
-        import aiosqlite
-        from config import DATABASE_PATH
-        
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute(
-                "SELECT user_id FROM users WHERE referral_code = ?", 
-                (referral_code,)
-            )
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(REFERRER_QUERY, (referral_code,))
             referrer = await cursor.fetchone()
             if referrer:
                 referred_by = referrer[0]
@@ -142,6 +137,9 @@ async def start_command(message: Message, state: FSMContext):
         if referred_by:
             await add_referral(referred_by, user_id)
             await process_new_referral(referred_by, user_id, message.from_user.first_name, message.bot)
+    elif user.blocked_at:
+        # Writing /start again means the chat is open, so bulk sends include them again
+        await clear_blocked(user_id)
     
     # Update user activity
     await update_user_activity(user_id)
@@ -223,6 +221,7 @@ async def help_command(message: Message):
 /help - Yordam
 /profile - Profilingizni ko'rish
 /leaderboard - Reytingli foydalanuvchilar ro'yxati
+/reminder - Kunlik eslatma vaqtini sozlash
 
 <b>Botdan foydalanish:</b>
 1️⃣ Barcha kanallarga obuna bo'ling
@@ -262,16 +261,16 @@ async def profile_command(message: Message):
 👤 <b>Sizning profilingiz</b>
 
 🆔 ID: {user_id}
-👤 Ism: {user[2]} {user[3] or ''}
-📊 Reyting: {user[14]:.1f}
-📚 O'rganilgan so'zlar: {user[10]}
-🧠 Test natijalari: {user[11]}/{user[12]} (ball/urinish)
-📈 Umumiy sessiyalar: {user[9]}
+👤 Ism: {user.first_name} {user.last_name or ''}
+📊 Reyting: {user.rating_score or 0:.1f}
+📚 O'rganilgan so'zlar: {user.words_learned or 0}
+🧠 Test natijalari: {user.quiz_score_total or 0}/{user.quiz_attempts or 0} (ball/urinish)
+📈 Umumiy sessiyalar: {user.total_sessions or 0}
 
 💎 Premium status: {"✅ Faol" if is_premium else "❌ Faol emas"}
 👥 Taklif qilinganlar: {referrals_count}/10
 
-🔗 Sizning referral kodingiz: <code>{user[6]}</code>
+🔗 Sizning referral kodingiz: <code>{user.referral_code}</code>
 
 <i>Bu kodni do'stlaringiz bilan baham ko'ring!</i>
     """
@@ -280,48 +279,150 @@ async def profile_command(message: Message):
 
 @router.message(Command("leaderboard"))
 async def leaderboard_command(message: Message):
-    from database import get_leaderboard
+    from database import leaderboard
     
     try:
-        leaders = await get_leaderboard(10)
+        snapshot = await leaderboard.get()
         
-        if not leaders:
+        if not snapshot.rows:
             await message.answer("📊 Hozircha reyting jadvalida hech kim yo'q.")
             return
         
-        leaderboard_text = "🏆 <b>Top 10 foydalanuvchilar</b>\n\n"
-        
-        for i, (first_name, rating, words, quiz_score, quiz_attempts) in enumerate(leaders, 1):
-            name = first_name or "Noma'lum"
-            
-            # Medal emojis for top 3
-            if i == 1:
-                medal = "🥇"
-            elif i == 2:
-                medal = "🥈"
-            elif i == 3:
-                medal = "🥉"
-            else:
-                medal = f"{i}."
-            
-            leaderboard_text += f"{medal} <b>{name}</b>\n"
-            leaderboard_text += f"   📊 Reyting: {rating:.1f}\n"
-            leaderboard_text += f"   📚 So'zlar: {words or 0} | 🧠 Test: {quiz_score or 0}\n\n"
-        
-        await message.answer(leaderboard_text)
+        await message.answer(snapshot.command_text)
         
     except Exception as e:
         await message.answer("❌ Reyting ma'lumotlarini yuklashda xatolik yuz berdi.")
 
 
 
+# Quick picks offered by /reminder, local time
+REMINDER_PRESETS = ["08:00", "12:00", "18:00", "20:00", "21:00"]
+
+# Reminder commands from someone with no users row yet
+START_FIRST_TEXT = "❗ Avval /start buyrug'ini yuboring, keyin eslatmani sozlang."
+
+def parse_clock(text: str) -> Optional[int]:
+    """'HH:MM' -> minute of the day, None if malformed"""
+    try:
+        hours, minutes = (int(part) for part in text.split(":"))
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+def parse_tz_offset(text: str) -> Optional[int]:
+    """'+5', '-3', '+5:30' -> minutes east of UTC, None if malformed"""
+    sign = -1 if text.startswith("-") else 1
+    hours, _, minutes = (text[1:] if text[:1] in ("+", "-") else text).partition(":")
+    try:
+        hours, minutes = int(hours), int(minutes or 0)
+    except ValueError:
+        return None
+    if hours < 0 or not 0 <= minutes < 60 or hours * 60 + minutes > 14 * 60:
+        return None
+    return sign * (hours * 60 + minutes)
+
+def format_clock(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+def format_tz_offset(offset: int) -> str:
+    sign = "-" if offset < 0 else "+"
+    hours, minutes = divmod(abs(offset), 60)
+    return f"UTC{sign}{hours}" + (f":{minutes:02d}" if minutes else "")
+
+async def saved_tz_offset(user_id: int) -> int:
+    """The user's time zone if one was chosen before, Tashkent otherwise"""
+    user = await get_user(user_id)
+    if user is not None and user.tz_offset is not None:
+        return user.tz_offset
+    return DEFAULT_TZ_OFFSET_MINUTES
+
+def get_reminder_keyboard(enabled: bool) -> InlineKeyboardMarkup:
+    buttons = [[
+        InlineKeyboardButton(text=preset, callback_data=f"reminder_set_{preset}")
+        for preset in REMINDER_PRESETS
+    ]]
+    if enabled:
+        buttons.append([InlineKeyboardButton(text="🔕 O'chirish", callback_data="reminder_off")])
+    buttons.append([InlineKeyboardButton(text="🏠 Bosh menu", callback_data="main_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def reminder_status_text(user: Optional[User]) -> str:
+    if user is None or user.reminder_minute is None:
+        status = "🔕 Kunlik eslatma o'chirilgan."
+    else:
+        status = (f"⏰ Kunlik eslatma: <b>{format_clock(user.reminder_minute)}</b> "
+                  f"({format_tz_offset(user.tz_offset or 0)})")
+    return f"""
+{status}
+
+Vaqtni tanlang yoki yuboring:
+<code>/reminder 20:30</code> - saqlangan vaqt mintaqangiz bilan (standart: Toshkent)
+<code>/reminder 20:30 +9</code> - boshqa vaqt mintaqasi bilan
+<code>/reminder off</code> - o'chirish
+    """
+
+@router.message(Command("reminder"))
+async def reminder_command(message: Message):
+    user_id = message.from_user.id
+    args = (message.text or "").split()[1:]
+    
+    if args and args[0].lower() == "off":
+        if not await set_reminder(user_id, None):
+            await message.answer(START_FIRST_TEXT)
+            return
+        await message.answer("🔕 Kunlik eslatma o'chirildi.")
+        return
+    
+    if args:
+        local_minute = parse_clock(args[0])
+        tz_offset = parse_tz_offset(args[1]) if len(args) > 1 else await saved_tz_offset(user_id)
+        if local_minute is None or tz_offset is None:
+            await message.answer("❌ Noto'g'ri format. Masalan: <code>/reminder 20:30</code> yoki <code>/reminder 20:30 +5</code>")
+            return
+        if not await set_reminder(user_id, local_minute, tz_offset):
+            await message.answer(START_FIRST_TEXT)
+            return
+        await message.answer(
+            f"✅ Kunlik eslatma har kuni {format_clock(local_minute)} ({format_tz_offset(tz_offset)}) da yuboriladi."
+        )
+        return
+    
+    user = await get_user(user_id)
+    await message.answer(
+        reminder_status_text(user),
+        reply_markup=get_reminder_keyboard(user is not None and user.reminder_minute is not None)
+    )
+
+@router.callback_query(F.data.startswith("reminder_set_"))
+async def reminder_set_callback(callback: CallbackQuery):
+    local_minute = parse_clock(callback.data[len("reminder_set_"):])
+    if local_minute is None:
+        await callback.answer("❌ Noto'g'ri vaqt", show_alert=True)
+        return
+    
+    if not await set_reminder(callback.from_user.id, local_minute, await saved_tz_offset(callback.from_user.id)):
+        await callback.answer(START_FIRST_TEXT, show_alert=True)
+        return
+    
+    user = await get_user(callback.from_user.id)
+    await callback.message.edit_text(reminder_status_text(user), reply_markup=get_reminder_keyboard(True))
+    await callback.answer(f"✅ {format_clock(local_minute)}")
+
+@router.callback_query(F.data == "reminder_off")
+async def reminder_off_callback(callback: CallbackQuery):
+    await set_reminder(callback.from_user.id, None)
+    await callback.message.edit_text(reminder_status_text(None), reply_markup=get_reminder_keyboard(False))
+    await callback.answer("🔕 O'chirildi")
+
 @router.callback_query(F.data == "show_rating")
 async def show_rating_callback(callback: CallbackQuery):
     """Show user's detailed rating and leaderboard"""
     user_id = callback.from_user.id
     
     try:
-        from database import get_user, get_leaderboard
+        from database import get_user, get_user_rank, leaderboard, rank_index
         
         # Get user data from database
         user = await get_user(user_id)
@@ -330,26 +431,19 @@ async def show_rating_callback(callback: CallbackQuery):
             return
         
         # Extract user data
-        rating_score = user[14] if len(user) > 14 else 0.0  # rating_score
-        words_learned = user[10] if len(user) > 10 else 0   # words_learned
-        quiz_score = user[11] if len(user) > 11 else 0      # quiz_score_total
-        quiz_attempts = user[12] if len(user) > 12 else 0   # quiz_attempts
-        total_sessions = user[9] if len(user) > 9 else 0    # total_sessions
+        rating_score = user.rating_score or 0.0
+        words_learned = user.words_learned or 0
+        quiz_score = user.quiz_score_total or 0
+        quiz_attempts = user.quiz_attempts or 0
+        total_sessions = user.total_sessions or 0
         
         # Calculate level and ranking
         level = min(100, max(1, int(rating_score / 50) + 1))
         
-        # Get ranking by counting users with higher rating
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT COUNT(*) + 1 as ranking
-                FROM users 
-                WHERE rating_score > ? AND rating_score > 0
-            """, (rating_score,))
-            ranking = (await cursor.fetchone())[0]
+        ranking = await get_user_rank(user_id)
         
-        # Get top 8 users with highest ratings and best performance  
-        leaderboard = await get_leaderboard(8)
+        # Top 8 comes pre-rendered from the leaderboard snapshot
+        snapshot = await leaderboard.get()
         
         # Color code based on rating
         if rating_score >= 200:
@@ -377,29 +471,12 @@ async def show_rating_callback(callback: CallbackQuery):
 🏆 <b>TOP 8 ENG YAXSHI FOYDALANUVCHILAR</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"""
         
-        # Add leaderboard - show top 8 users
-        if leaderboard and len(leaderboard) > 0:
-            for i, leader in enumerate(leaderboard[:8], 1):
-                user_id_leader, first_name, username, rating, words, quiz_score_leader, quiz_attempts_leader = leader
-                name = first_name or "Noma'lum"
-                
-                if i == 1:
-                    medal = "🥇"
-                elif i == 2:
-                    medal = "🥈" 
-                elif i == 3:
-                    medal = "🥉"
-                else:
-                    medal = f"{i}."
-                
-                # Highlight current user
-                if user_id_leader == callback.from_user.id:
-                    rating_text += f"\n{medal} <b>👤 {name} (SIZ)</b> - {rating:.1f} ball"
-                else:
-                    rating_text += f"\n{medal} <b>{name}</b> - {rating:.1f} ball"
+        # Add leaderboard - show top 8 users, current user highlighted
+        if snapshot.rows:
+            rating_text += snapshot.rating_block(user_id)
             
             # Show total users count
-            rating_text += f"\n\n👥 <b>Jami ishtirokchilar:</b> {len(leaderboard)} ta"
+            rating_text += f"\n\n👥 <b>Jami ishtirokchilar:</b> {len(rank_index)} ta"
         else:
             rating_text += f"\n\n🎯 <b>Birinchi bo'ling!</b>"
             rating_text += f"\n• Testlarni ishlang va ball to'plang"
@@ -436,8 +513,8 @@ async def show_rating_callback(callback: CallbackQuery):
         try:
             user = await get_user(user_id)
             if user:
-                rating_score = user[14] if len(user) > 14 else 0.0
-                words_learned = user[10] if len(user) > 10 else 0
+                rating_score = user.rating_score or 0.0
+                words_learned = user.words_learned or 0
                 simple_text = f"""📊 <b>SIZNING REYTINGINGIZ</b>
 
 📈 <b>Reyting:</b> {rating_score:.1f} ball
@@ -459,7 +536,7 @@ async def show_rating(callback: CallbackQuery):
     user_id = callback.from_user.id
     
     try:
-        from database import get_user, get_leaderboard
+        from database import get_user, leaderboard
         
         # Direct user data olish
         user = await get_user(user_id)
@@ -472,12 +549,12 @@ async def show_rating(callback: CallbackQuery):
             return
         
         # Safe data extraction
-        first_name = str(user[2]) if len(user) > 2 and user[2] else 'Anonim'
-        rating_score = float(user[14]) if len(user) > 14 and user[14] is not None else 0.0
-        words_learned = int(user[11]) if len(user) > 11 and user[11] is not None else 0
-        quiz_score_total = int(user[12]) if len(user) > 12 and user[12] is not None else 0
-        quiz_attempts = int(user[13]) if len(user) > 13 and user[13] is not None else 0
-        total_sessions = int(user[10]) if len(user) > 10 and user[10] is not None else 0
+        first_name = user.first_name or 'Anonim'
+        rating_score = float(user.rating_score or 0.0)
+        words_learned = int(user.words_learned or 0)
+        quiz_score_total = int(user.quiz_score_total or 0)
+        quiz_attempts = int(user.quiz_attempts or 0)
+        total_sessions = int(user.total_sessions or 0)
         
         # Calculate level
         level = min(100, max(1, int(rating_score / 50) + 1))
@@ -495,15 +572,9 @@ async def show_rating(callback: CallbackQuery):
 
         # Leaderboard qo'shish - xatoliksiz
         try:
-            leaderboard = await get_leaderboard(5)
-            if leaderboard and len(leaderboard) > 0:
-                rating_text += f"\n\n⭐ <b>TOP 5 LIDERLAR:</b>\n"
-                for i, leader in enumerate(leaderboard, 1):
-                    if leader and len(leader) >= 2:
-                        name = str(leader[0]) if leader[0] else 'Anonim'
-                        score = float(leader[1]) if leader[1] is not None else 0.0
-                        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-                        rating_text += f"{medal} {name}: {score:.1f} ball\n"
+            snapshot = await leaderboard.get()
+            if snapshot.rows:
+                rating_text += snapshot.top5_text
             else:
                 rating_text += f"\n\n📊 <b>Hozircha boshqa liderlar yo'q.</b>"
         except Exception as le:
@@ -521,6 +592,8 @@ async def show_rating(callback: CallbackQuery):
             rating_text += f"\n\n🏆 <b>Zo'r:</b> Siz professional darajada!"
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            get_window_buttons(),
+            get_language_rating_buttons(),
             [InlineKeyboardButton(text="🔄 Yangilash", callback_data="rating")],
             [InlineKeyboardButton(text="🏠 Bosh menu", callback_data="main_menu")]
         ])
@@ -546,6 +619,110 @@ Iltimos qayta urinib ko'ring.
         await callback.message.edit_text(simple_text, reply_markup=keyboard, parse_mode="HTML")
         await callback.answer("❌ Xatolik!")
 
+WINDOW_TITLES = {
+    'day': "📅 Bugun",
+    'week': "🗓 Hafta",
+    'month': "📆 Oy",
+}
+
+def get_window_buttons(current: str = None):
+    """Buttons switching between the windowed leaderboards"""
+    return [
+        InlineKeyboardButton(
+            text=f"• {title} •" if window == current else title,
+            callback_data=f"rating_window_{window}"
+        )
+        for window, title in WINDOW_TITLES.items()
+    ]
+
+@router.callback_query(F.data.startswith("rating_window_"))
+async def show_window_leaderboard(callback: CallbackQuery):
+    """Kunlik / haftalik / oylik reyting"""
+    user_id = callback.from_user.id
+    window = callback.data.split("_")[-1]
+    if window not in WINDOW_TITLES:
+        await callback.answer("❌ Xatolik!")
+        return
+    
+    try:
+        from utils.rating_system import get_window_leaderboard, get_window_rank
+        
+        leaders = await get_window_leaderboard(window, 10)
+        ranking, points = await get_window_rank(user_id, window)
+        
+        text = f"🏆 <b>TOP 10 — {WINDOW_TITLES[window]}</b>\n\n"
+        if leaders:
+            for i, (leader_id, name, leader_points) in enumerate(leaders, 1):
+                medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+                name = name or "Noma'lum"
+                if leader_id == user_id:
+                    text += f"{medal} <b>👤 {name} (SIZ)</b> - {leader_points:.1f} ball\n"
+                else:
+                    text += f"{medal} <b>{name}</b> - {leader_points:.1f} ball\n"
+        else:
+            text += "📊 Bu davrda hali hech kim ball to'plamagan.\n"
+        
+        text += f"\n📈 <b>Sizning ballingiz:</b> {points:.1f}"
+        if points > 0:
+            text += f"\n🏆 <b>O'rin:</b> {ranking}-chi"
+        
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            get_window_buttons(window),
+            [InlineKeyboardButton(text="📊 Umumiy reyting", callback_data="rating")],
+            [InlineKeyboardButton(text="🏠 Bosh menu", callback_data="main_menu")]
+        ])
+        
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+        await callback.answer()
+    except Exception as e:
+        print(f"Window leaderboard error: {e}")
+        await callback.answer("❌ Reyting ma'lumotlarini yuklashda xatolik!", show_alert=True)
+
+def get_language_rating_buttons():
+    """Buttons opening the per-language leaderboards"""
+    return [
+        InlineKeyboardButton(text=title, callback_data=f"rating_lang_{language}")
+        for language, title in LANGUAGE_TITLES.items()
+    ]
+
+@router.callback_query(F.data.startswith("rating_lang_"))
+async def show_language_leaderboard(callback: CallbackQuery):
+    """Til bo'yicha reyting"""
+    user_id = callback.from_user.id
+    language = callback.data.split("_")[-1]
+    if language not in LANGUAGE_TITLES:
+        await callback.answer("❌ Xatolik!")
+        return
+    
+    try:
+        from utils.rating_system import get_rating_leaderboard
+        
+        leaders = await get_rating_leaderboard(10, language)
+        
+        text = f"🏆 <b>TOP 10 — {LANGUAGE_TITLES[language]}</b>\n\n"
+        if leaders:
+            for i, leader in enumerate(leaders, 1):
+                medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+                name = leader.first_name or "Noma'lum"
+                if leader.user_id == user_id:
+                    text += f"{medal} <b>👤 {name} (SIZ)</b> - {leader.rating_score:.1f} ball\n"
+                else:
+                    text += f"{medal} <b>{name}</b> - {leader.rating_score:.1f} ball\n"
+        else:
+            text += "📊 Bu til bo'yicha hali reyting yo'q.\n"
+        
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            get_language_rating_buttons(),
+            [InlineKeyboardButton(text="📊 Umumiy reyting", callback_data="rating")],
+            [InlineKeyboardButton(text="🏠 Bosh menu", callback_data="main_menu")]
+        ])
+        
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+        await callback.answer()
+    except Exception as e:
+        print(f"Language leaderboard error: {e}")
+        await callback.answer("❌ Reyting ma'lumotlarini yuklashda xatolik!", show_alert=True)
+
 @router.callback_query(F.data == "conversation")
 async def show_conversation_menu(callback: CallbackQuery):
     """Premium AI suhbat menu"""
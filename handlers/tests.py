@@ -3,10 +3,9 @@ from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKe
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from typing import cast
-import aiosqlite
 
 from config import ADMIN_ID
-from database import DATABASE_PATH, get_user, create_quiz, add_question, get_quizzes, get_quiz_questions
+from database import db_pool, get_user, create_quiz, add_question, get_quizzes, get_quiz_questions
 
 router = Router()
 
@@ -36,7 +35,7 @@ async def main_tests_menu(callback: CallbackQuery):
         is_admin = (user_id == ADMIN_ID)
         
         # Get user's quiz statistics
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             cursor = await db.execute("""
                 SELECT COUNT(*) FROM quizzes WHERE created_by = ?
             """, (user_id,))
@@ -91,7 +90,7 @@ async def take_quizzes_menu(callback: CallbackQuery):
             return
         
         # Get all available quizzes with questions
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             cursor = await db.execute("""
                 SELECT q.id, q.title, q.quiz_type, q.created_by, u.first_name, COUNT(qu.id) as question_count
                 FROM quizzes q
@@ -319,6 +318,15 @@ async def user_quiz_description_received(message: Message, state: FSMContext):
 # MENING TESTLARIM
 # =====================
 
+MY_QUIZZES_QUERY = """
+    SELECT q.id, q.title, q.quiz_type, COUNT(qu.id) as question_count
+    FROM quizzes q
+    LEFT JOIN questions qu ON q.id = qu.quiz_id
+    WHERE q.created_by = ?
+    GROUP BY q.id
+    ORDER BY q.created_at DESC
+"""
+
 @router.callback_query(F.data == "my_quizzes")
 async def my_quizzes_list(callback: CallbackQuery):
     """Foydalanuvchining testlari"""
@@ -329,15 +337,8 @@ async def my_quizzes_list(callback: CallbackQuery):
             
         user_id = callback.from_user.id
         
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT q.id, q.title, q.quiz_type, COUNT(qu.id) as question_count
-                FROM quizzes q
-                LEFT JOIN questions qu ON q.id = qu.quiz_id
-                WHERE q.created_by = ?
-                GROUP BY q.id
-                ORDER BY q.created_at DESC
-            """, (user_id,))
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(MY_QUIZZES_QUERY, (user_id,))
             my_quizzes = await cursor.fetchall()
         
         if not my_quizzes:
@@ -401,7 +402,7 @@ async def popular_quizzes_menu(callback: CallbackQuery):
             return
         
         # Get popular quizzes (most questions)
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db_pool.acquire() as db:
             cursor = await db.execute("""
                 SELECT q.id, q.title, q.quiz_type, q.created_by, u.first_name, COUNT(qu.id) as question_count
                 FROM quizzes q
@@ -297,6 +297,20 @@ def get_jlpt_level_tests_keyboard(level):
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+LANGUAGE_TITLES = {
+    'korean': "🇰🇷 Koreys tili",
+    'japanese': "🇯🇵 Yapon tili",
+}
+
+def get_section_language_keyboard(languages, prefix: str, cancel_data: str):
+    """Study language choice for a new section, one button per language"""
+    buttons = [
+        [InlineKeyboardButton(text=LANGUAGE_TITLES.get(language, language), callback_data=f"{prefix}{language}")]
+        for language in languages
+    ]
+    buttons.append([InlineKeyboardButton(text="❌ Bekor qilish", callback_data=cancel_data)])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
 def get_languages_keyboard():
     """Language selection keyboard"""
     buttons = [
@@ -315,7 +329,7 @@ def get_sections_keyboard(sections, language):
     buttons = []
     
     for section in sections:
-        section_id, name, description, lang, is_premium, created_at, created_by = section
+        section_id, name, is_premium = section.id, section.name, section.is_premium
         premium_icon = "💎 " if is_premium else ""
         buttons.append([
             InlineKeyboardButton(
@@ -358,12 +372,7 @@ def get_content_keyboard(subsection_id, section_id, language, content_items):
     buttons = []
     
     for content in content_items:
-        # Handle variable number of columns - content table has: id, subsection_id, title, file_id, file_type, caption, is_premium, created_at, content_text
-        if len(content) >= 8:
-            content_id, sub_id, title, file_id, file_type, caption, is_premium, created_at = content[:8]
-        else:
-            # Fallback for older structure
-            content_id, sub_id, title, file_id, file_type, caption, is_premium, created_at = content
+        content_id, title, file_type, is_premium = content.id, content.title, content.content_type, content.is_premium
         
         # Add file type emoji
         type_emoji = {
@@ -492,8 +501,8 @@ def get_quizzes_keyboard(quizzes, language):
     buttons = []
     
     for quiz in quizzes:
-        quiz_id, title, description, is_premium = quiz
-        premium_icon = "💎 " if is_premium else ""
+        quiz_id, title = quiz.id, quiz.title
+        premium_icon = "💎 " if quiz.is_premium else ""
         
         buttons.append([
             InlineKeyboardButton(
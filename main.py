@@ -6,10 +6,10 @@ from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import BOT_TOKEN
-from database import init_db
+from database import init_db, db_pool, activity_buffer, rank_index, leaderboard
 from handlers import start, admin, content, sections, tests
 from handlers import ai_conversation
-from utils.scheduler import start_scheduler
+from utils.scheduler import start_scheduler, stop_scheduler
 
 # Bot versiya: 2.0.1 - AI Conversation Update (2025-01-24)
 # Configure logging
@@ -22,8 +22,13 @@ bot = None
 async def main():
     global bot
     
-    # Initialize database
+    # Open the shared connection pool and initialize database
+    await db_pool.open()
     await init_db()
+    await rank_index.load(db_pool)
+    activity_buffer.start()
+    await leaderboard.refresh()
+    leaderboard.start()
     
     # Initialize bot and dispatcher
     bot = Bot(
@@ -40,12 +45,18 @@ async def main():
     dp.include_router(tests.router)
     dp.include_router(ai_conversation.router)
     
-    # Start scheduler for automated messages
+    # Start scheduler for automated messages; the lease holder also finishes interrupted campaigns
     await start_scheduler(bot)
     
     # Start polling
     logger.info("Bot started")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await stop_scheduler()
+        await leaderboard.stop()
+        await activity_buffer.stop()
+        await db_pool.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -35,6 +35,7 @@ Salom admin! Quyidagi amallarni bajarishingiz mumkin:
 📁 <b>Kontent:</b> Video, audio, rasm, PDF fayllar yuklash
 🧠 <b>Testlar:</b> Savol-javob testlari yaratish
 📊 <b>Statistika:</b> Foydalanuvchilar va bot statistikasi
+🏆 <b>/reprice_ratings:</b> Yangi ball jadvalini o'tgan faoliyatga qo'llash
 
 Nima qilmoqchisiz?
 """
@@ -0,0 +1,102 @@
+from typing import Any, Optional, Sequence, Tuple
+
+class Row:
+    """Base for slotted row models; COLUMNS is the table's column order"""
+    __slots__ = ()
+    COLUMNS: Tuple[str, ...] = ()
+
+    @classmethod
+    def select_list(cls, columns: Optional[Sequence[str]] = None) -> str:
+        """Comma separated column list for a SELECT"""
+        return ", ".join(columns or cls.COLUMNS)
+
+    @classmethod
+    def from_row(cls, row: Optional[Sequence[Any]], columns: Optional[Sequence[str]] = None):
+        """Build a model from a row selected with the same column list"""
+        if row is None:
+            return None
+        obj = cls.__new__(cls)
+        for name, value in zip(columns or cls.COLUMNS, row):
+            setattr(obj, name, value)
+        return obj
+
+    @classmethod
+    def from_rows(cls, rows, columns: Optional[Sequence[str]] = None) -> list:
+        return [cls.from_row(row, columns) for row in rows]
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in self.COLUMNS if hasattr(self, name)
+        )
+        return f"{type(self).__name__}({fields})"
+
+class User(Row):
+    COLUMNS = (
+        "user_id", "username", "first_name", "last_name", "is_premium", "premium_expires_at",
+        "referral_code", "referred_by", "created_at", "last_activity", "total_sessions",
+        "words_learned", "quiz_score_total", "quiz_attempts", "rating_score", "referral_count",
+        "study_language", "blocked_at", "reminder_minute", "tz_offset", "reminder_utc_minute",
+    )
+    __slots__ = COLUMNS
+
+    # Column sets for the common callers
+    RATING = (
+        "user_id", "first_name", "rating_score", "words_learned",
+        "quiz_score_total", "quiz_attempts", "total_sessions", "last_activity", "created_at",
+    )
+    LEADERBOARD = (
+        "user_id", "first_name", "username", "rating_score",
+        "words_learned", "quiz_score_total", "quiz_attempts",
+    )
+    PREMIUM = ("user_id", "is_premium", "premium_expires_at")
+    SNAPSHOT = LEADERBOARD + ("total_sessions", "is_premium")
+
+class Section(Row):
+    COLUMNS = ("id", "name", "description", "language", "is_premium", "created_at", "created_by")
+    __slots__ = COLUMNS
+
+    LISTING = ("id", "name", "description", "language", "is_premium")
+
+class Content(Row):
+    COLUMNS = (
+        "id", "section_id", "subsection_id", "title", "description", "content_type",
+        "file_id", "file_path", "content_text", "is_premium", "created_at",
+    )
+    __slots__ = COLUMNS
+
+    LISTING = ("id", "title", "content_type", "is_premium")
+    DETAIL = ("id", "title", "description", "content_type", "file_id", "content_text", "is_premium")
+
+class Quiz(Row):
+    COLUMNS = (
+        "id", "title", "description", "quiz_type", "difficulty", "is_premium", "created_at", "created_by",
+    )
+    __slots__ = COLUMNS
+
+    LISTING = ("id", "title", "description", "quiz_type", "difficulty", "is_premium")
+
+class Stats(Row):
+    """The single stats_counters row"""
+    COLUMNS = (
+        "total_users", "premium_users", "total_sections",
+        "total_content", "premium_content", "total_quizzes", "total_questions",
+    )
+    __slots__ = COLUMNS
+
+    @classmethod
+    def empty(cls) -> "Stats":
+        return cls.from_row((0,) * len(cls.COLUMNS))
+
+class Campaign(Row):
+    """A bulk send and its delivery counters"""
+    COLUMNS = (
+        "id", "key", "title", "text", "created_at", "finished_at", "total", "sent", "failed", "blocked",
+        "populated_at",
+    )
+    __slots__ = COLUMNS
+
+    PROGRESS = ("id", "title", "created_at", "finished_at", "total", "sent", "failed", "blocked")
+
+    @property
+    def pending(self) -> int:
+        return self.total - self.sent - self.failed - self.blocked
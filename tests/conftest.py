@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the bot modules the way main.py does, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+@pytest.fixture(autouse=True)
+def temp_database(tmp_path, monkeypatch):
+    """Each test gets its own database file (DATABASE_PATH is relative) and empty caches"""
+    monkeypatch.chdir(tmp_path)
+    database.user_cache.clear()
+    database.premium_cache.clear()
@@ -0,0 +1,80 @@
+import asyncio
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import ADMIN_ID
+from database import db_pool, init_db
+from handlers.admin import (
+    delete_section_menu, receive_section_language, receive_section_premium_status, view_all_sections,
+)
+from handlers.sections import create_section, get_sections
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+
+class FakeCallback:
+    def __init__(self, user_id, data=None):
+        self.from_user = FakeUser(user_id)
+        self.data = data
+        self.message = FakeMessage()
+        self.answers = []
+
+    async def answer(self, text=None, **kwargs):
+        self.answers.append(text)
+
+def render(handler):
+    """Run an admin callback handler against a fresh database with two sections"""
+    async def run():
+        await db_pool.open()
+        try:
+            await init_db()
+            await create_section("Alifbo", "Hangul harflari", "korean")
+            await create_section("Kanji", "Asosiy belgilar", "japanese", is_premium=True)
+            callback = FakeCallback(ADMIN_ID)
+            await handler(callback)
+            return callback
+        finally:
+            await db_pool.close()
+    return asyncio.run(run())
+
+def test_view_all_sections_renders():
+    callback = render(view_all_sections)
+    text, = callback.message.edits
+    assert "Hangul harflari" in text
+    assert "Japanese" in text
+    assert "❌ Xatolik yuz berdi" not in callback.answers
+
+def test_delete_section_menu_renders():
+    callback = render(delete_section_menu)
+    text, = callback.message.edits
+    assert "<b>Kanji</b> (Premium) (japanese)" in text
+    assert "❌ Xatolik yuz berdi" not in callback.answers
+
+def test_created_section_keeps_chosen_language():
+    async def run():
+        await db_pool.open()
+        try:
+            await init_db()
+            state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=ADMIN_ID, user_id=ADMIN_ID))
+            await state.set_state("creating_section_language")
+            await state.update_data(section_name="Kana", section_description="Hiragana va katakana")
+            await receive_section_language(FakeCallback(ADMIN_ID, "section_lang_japanese"), state)
+            assert await state.get_state() == "creating_section_premium"
+            await receive_section_premium_status(FakeCallback(ADMIN_ID, "section_premium_free"), state)
+            return await get_sections("japanese"), await get_sections("korean")
+        finally:
+            await db_pool.close()
+
+    japanese, korean = asyncio.run(run())
+    assert [section.name for section in japanese] == ["Kana"]
+    assert korean == []
@@ -0,0 +1,55 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from utils.db_pool import ConnectionPool
+
+def with_pool(body):
+    async def run():
+        pool = ConnectionPool("pool.db", readers=2, pragmas={"journal_mode": "WAL"})
+        await pool.open()
+        try:
+            async with pool.transaction() as db:
+                await db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+            return await body(pool)
+        finally:
+            await pool.close()
+    return asyncio.run(run())
+
+async def count_items(pool) -> int:
+    async with pool.acquire() as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM items")
+        return (await cursor.fetchone())[0]
+
+def test_transaction_commits():
+    async def body(pool):
+        async with pool.transaction() as db:
+            await db.execute("INSERT INTO items (name) VALUES ('a')")
+        return await count_items(pool)
+
+    assert with_pool(body) == 1
+
+def test_transaction_rolls_back_on_exception():
+    async def body(pool):
+        with pytest.raises(RuntimeError):
+            async with pool.transaction() as db:
+                await db.execute("INSERT INTO items (name) VALUES ('a')")
+                raise RuntimeError("handler failed")
+        # The writer is usable again and the failed insert is gone
+        async with pool.transaction() as db:
+            await db.execute("INSERT INTO items (name) VALUES ('b')")
+        async with pool.acquire() as db:
+            cursor = await db.execute("SELECT name FROM items")
+            return await cursor.fetchall()
+
+    assert with_pool(body) == [("b",)]
+
+def test_readers_refuse_writes():
+    async def body(pool):
+        async with pool.acquire() as db:
+            with pytest.raises(sqlite3.OperationalError):
+                await db.execute("INSERT INTO items (name) VALUES ('a')")
+        return await count_items(pool)
+
+    assert with_pool(body) == 0
@@ -0,0 +1,8 @@
+import pytest
+
+from utils.leaderboard import RENDERED_ROWS, LeaderboardSnapshots
+
+def test_snapshot_smaller_than_rendered_rows_is_refused():
+    with pytest.raises(ValueError):
+        LeaderboardSnapshots(pool=None, size=RENDERED_ROWS - 1)
+    assert LeaderboardSnapshots(pool=None, size=RENDERED_ROWS).size == RENDERED_ROWS
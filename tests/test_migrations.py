@@ -0,0 +1,68 @@
+import asyncio
+
+import aiosqlite
+
+import database
+from config import DATABASE_PATH
+from database import SCHEMA_VERSION, create_base_tables, db_pool, init_db
+
+async def create_baseline_database():
+    """A database as the pre-migration release left it: version 1 tables, text timestamps"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await create_base_tables(db)
+        await db.execute("""
+            INSERT INTO users (user_id, first_name, referral_code, is_premium, premium_expires_at, created_at, last_activity)
+            VALUES (1, 'Ali', 'REF000001', 1, '2030-01-01 00:00:00', '2024-01-01 00:00:00', '2024-01-02 12:00:00')
+        """)
+        await db.execute("""
+            INSERT INTO users (user_id, first_name, referral_code, created_at)
+            VALUES (2, 'Vali', 'REF000002', '2024-01-01 08:00:00')
+        """)
+        await db.execute("INSERT INTO sections (name, language, created_at) VALUES ('Alifbo', 'korean', '2024-01-03 00:00:00')")
+        await db.commit()
+
+def test_baseline_database_is_upgraded(capsys):
+    async def run():
+        await create_baseline_database()
+        await db_pool.open()
+        try:
+            await init_db()
+            async with db_pool.acquire() as db:
+                cursor = await db.execute("SELECT created_at, last_activity, premium_expires_at FROM users WHERE user_id = 1")
+                timestamps = await cursor.fetchone()
+                cursor = await db.execute("SELECT total_users, premium_users, total_sections FROM stats_counters")
+                counters = await cursor.fetchone()
+                cursor = await db.execute("SELECT new_users FROM stats_daily WHERE day = ?", (1704067200 // 86400,))
+                daily = await cursor.fetchone()
+                cursor = await db.execute("PRAGMA journal_mode")
+                journal_mode = (await cursor.fetchone())[0]
+                cursor = await db.execute("SELECT MAX(version) FROM schema_version")
+                version = (await cursor.fetchone())[0]
+        finally:
+            await db_pool.close()
+        return timestamps, counters, daily, journal_mode, version
+
+    timestamps, counters, daily, journal_mode, version = asyncio.run(run())
+    assert timestamps == (1704067200, 1704196800, 1893456000)
+    assert counters == (2, 1, 1)
+    assert daily == (2,)
+    assert journal_mode == "wal"
+    assert version == SCHEMA_VERSION
+    assert "Applied migration 1:" in capsys.readouterr().out
+
+def test_second_start_skips_ddl(monkeypatch, capsys):
+    async def start():
+        await db_pool.open()
+        try:
+            await init_db()
+        finally:
+            await db_pool.close()
+
+    asyncio.run(start())
+    capsys.readouterr()
+
+    async def fail(db):
+        raise AssertionError("migrate() ran on an up-to-date database")
+    monkeypatch.setattr(database, "migrate", fail)
+    asyncio.run(start())
+    assert "Applied migration" not in capsys.readouterr().out
@@ -0,0 +1,77 @@
+import asyncio
+
+from config import DATABASE_PATH
+from database import STORAGE_PRAGMAS, campaign_outbox, create_user, db_pool, init_db
+from handlers.admin import send_broadcast_message
+from utils.db_pool import ConnectionPool
+from utils.outbox import CampaignOutbox
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+def test_broadcast_is_only_stored_and_the_outbox_loop_sends_it():
+    async def run():
+        await db_pool.open()
+        try:
+            await init_db()
+            for user_id in (1, 2, 3):
+                await create_user(user_id, None, f"User {user_id}")
+            bot = StubBot()
+            campaign = await send_broadcast_message({"message_text": "Salom"}, key="broadcast:test")
+            sent_by_handler = list(bot.sent)
+
+            serving = asyncio.create_task(campaign_outbox.serve(bot, interval=0.05))
+            try:
+                for _ in range(100):
+                    progress = await campaign_outbox.progress(campaign.id)
+                    if progress.finished_at:
+                        break
+                    await asyncio.sleep(0.05)
+            finally:
+                serving.cancel()
+                await asyncio.gather(serving, return_exceptions=True)
+            return campaign, sent_by_handler, bot.sent, progress
+        finally:
+            await db_pool.close()
+
+    campaign, sent_by_handler, sent, progress = asyncio.run(run())
+    assert campaign.total == 3 and campaign.pending == 3
+    assert sent_by_handler == []
+    assert sorted(sent) == [(1, "Salom"), (2, "Salom"), (3, "Salom")]
+    assert progress.finished_at and progress.sent == 3
+
+def test_two_processes_draining_one_campaign_send_it_once():
+    async def run():
+        await db_pool.open()
+        try:
+            await init_db()
+            for user_id in (1, 2, 3):
+                await create_user(user_id, None, f"User {user_id}")
+            campaign = await send_broadcast_message({"message_text": "Salom"}, key="broadcast:twice")
+        finally:
+            await db_pool.close()
+
+        # A second replica: its own pool on the same database file and its own outbox
+        pools = [ConnectionPool(DATABASE_PATH, readers=2, pragmas=STORAGE_PRAGMAS) for _ in range(2)]
+        outboxes = [CampaignOutbox(pool, batch_size=1, holder=f"replica-{i}") for i, pool in enumerate(pools)]
+        bots = [StubBot(), StubBot()]
+        for pool in pools:
+            await pool.open()
+        try:
+            results = await asyncio.gather(*(
+                outbox.drain(bot, campaign.id) for outbox, bot in zip(outboxes, bots)
+            ))
+            progress = await outboxes[0].progress(campaign.id)
+        finally:
+            for pool in pools:
+                await pool.close()
+        return results, [bot.sent for bot in bots], progress
+
+    results, sent, progress = asyncio.run(run())
+    assert sorted(len(s) for s in sent) == [0, 3]
+    assert [r is None for r in results].count(True) == 1
+    assert progress.finished_at and progress.sent == 3
@@ -0,0 +1,14 @@
+import asyncio
+
+import aiosqlite
+
+from database import migrate
+from utils.query_plan_check import check_query_plans
+
+def test_known_queries_use_indexes():
+    async def run():
+        async with aiosqlite.connect(":memory:") as db:
+            await migrate(db)
+            return await check_query_plans(db)
+
+    assert asyncio.run(run()) == []
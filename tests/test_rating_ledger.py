@@ -0,0 +1,34 @@
+import asyncio
+
+from database import activity_buffer, create_user, db_pool, get_user, init_db, invalidate_user
+from utils import rating_system
+from utils.rating_system import reprice_ratings, update_user_rating
+
+def test_reprice_applies_new_points_to_past_events(monkeypatch):
+    async def run():
+        await db_pool.open()
+        try:
+            await init_db()
+            await create_user(1, "ali", "Ali")
+            await update_user_rating(1, 'quiz_complete')
+            await update_user_rating(1, 'content_view')
+            await activity_buffer.flush()
+            invalidate_user(1)
+            before = (await get_user(1)).rating_score
+
+            monkeypatch.setitem(rating_system.RATING_POINTS, 'quiz_complete', 50.0)
+            ranked = await reprice_ratings()
+            after = (await get_user(1)).rating_score
+
+            async with db_pool.acquire() as db:
+                cursor = await db.execute("SELECT SUM(points) FROM rating_daily WHERE user_id = 1")
+                daily, = await cursor.fetchone()
+            return before, after, daily, ranked
+        finally:
+            await db_pool.close()
+
+    before, after, daily, ranked = asyncio.run(run())
+    assert before == 8.0
+    assert after == 53.0
+    assert daily == 53.0
+    assert ranked == 1
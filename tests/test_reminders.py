@@ -0,0 +1,74 @@
+import asyncio
+
+from database import create_user, db_pool, init_db, set_job_watermark, set_reminder
+from handlers.start import parse_clock, parse_tz_offset
+from utils import scheduler
+from utils.timeutil import MINUTES_PER_DAY
+
+def test_parse_clock():
+    assert parse_clock("00:00") == 0
+    assert parse_clock("20:30") == 20 * 60 + 30
+    assert parse_clock("7:05") == 7 * 60 + 5
+    for text in ("24:00", "12:60", "12:-1", "12", "ab:cd", "1:2:3", ""):
+        assert parse_clock(text) is None, text
+
+def test_parse_tz_offset():
+    assert parse_tz_offset("+5") == 300
+    assert parse_tz_offset("5") == 300
+    assert parse_tz_offset("-3") == -180
+    assert parse_tz_offset("+5:30") == 330
+    assert parse_tz_offset("-9:30") == -570
+    assert parse_tz_offset("+14") == 840
+    for text in ("+5:99", "+5:60", "+5:-30", "+15", "+14:30", "--5", "+-5", "UTC", ""):
+        assert parse_tz_offset(text) is None, text
+
+def test_set_reminder_reports_a_missing_user():
+    async def run():
+        await db_pool.open()
+        try:
+            await init_db()
+            await create_user(1, None, "Ali")
+            return await set_reminder(1, 600, 300), await set_reminder(2, 600, 300)
+        finally:
+            await db_pool.close()
+
+    assert asyncio.run(run()) == (True, False)
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+
+def test_reminders_catch_up_missed_minutes_once(monkeypatch):
+    current = 30_000_000  # absolute UTC minute of the tick
+    monkeypatch.setattr(scheduler, "now_ts", lambda: current * 60 + 5)
+    # user -> minutes before the tick their bucket was due
+    due = {1: 0, 2: 1, 3: 7, 4: scheduler.REMINDER_CATCHUP_MINUTES + 5}
+
+    async def run():
+        await db_pool.open()
+        try:
+            await init_db()
+            for user_id in due:
+                await create_user(user_id, None, f"User {user_id}")
+            async with db_pool.transaction() as db:
+                for user_id, late in due.items():
+                    await db.execute(
+                        "UPDATE users SET reminder_utc_minute = ? WHERE user_id = ?",
+                        ((current - late) % MINUTES_PER_DAY, user_id)
+                    )
+            # Nothing served for longer than the catch-up limit
+            await set_job_watermark('daily_reminders', current - 500)
+            bot = StubBot()
+            await scheduler.send_daily_reminders(bot)
+            first_tick = sorted(bot.sent)
+            await scheduler.send_daily_reminders(bot)
+            return first_tick, sorted(bot.sent)
+        finally:
+            await db_pool.close()
+
+    first_tick, after_repeat = asyncio.run(run())
+    assert first_tick == [1, 2, 3]
+    assert after_repeat == [1, 2, 3]
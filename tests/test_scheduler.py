@@ -0,0 +1,91 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from database import create_user, db_pool, get_job_watermark, init_db, set_job_watermark
+from utils import scheduler
+from utils.send_engine import SENT
+from utils.timeutil import DAY, now_ts
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+
+class RenewingPool:
+    """Renews one user's premium right before the first write, as a payment landing mid-job would"""
+
+    def __init__(self, pool, user_id):
+        self.pool = pool
+        self.user_id = user_id
+        self.renewed = False
+
+    def acquire(self):
+        return self.pool.acquire()
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.pool.transaction() as db:
+            if not self.renewed:
+                await db.execute(
+                    "UPDATE users SET premium_expires_at = ? WHERE user_id = ?", (now_ts() + 30 * DAY, self.user_id)
+                )
+                self.renewed = True
+            yield db
+
+def test_renewed_premium_is_not_told_it_expired(monkeypatch):
+    monkeypatch.setattr(scheduler, "db_pool", RenewingPool(db_pool, user_id=2))
+
+    async def run():
+        await db_pool.open()
+        try:
+            await init_db()
+            for user_id in (1, 2):
+                await create_user(user_id, None, f"User {user_id}")
+            async with db_pool.transaction() as db:
+                await db.execute("UPDATE users SET is_premium = 1, premium_expires_at = ?", (now_ts() - DAY,))
+            bot = StubBot()
+            counts = await scheduler.cleanup_expired_premiums(bot)
+            async with db_pool.acquire() as db:
+                cursor = await db.execute("SELECT user_id, is_premium FROM users ORDER BY user_id")
+                premium = await cursor.fetchall()
+            return bot.sent, counts, premium
+        finally:
+            await db_pool.close()
+
+    sent, counts, premium = asyncio.run(run())
+    assert sent == [1]
+    assert counts[SENT] == 1
+    assert premium == [(1, 0), (2, 1)]
+
+def test_new_leader_runs_a_job_missed_since_its_last_run(monkeypatch):
+    monkeypatch.setattr(scheduler, "JOB_MISFIRE_GRACE_SECONDS", 2 * DAY)
+
+    async def run():
+        await db_pool.open()
+        try:
+            await init_db()
+            scheduler.scheduler.start(paused=True)
+            scheduler._configure_jobs()
+            now = now_ts()
+            # cleanup_premiums last ran a minute before its latest fire time; weekly_bonuses after it
+            cleanup = scheduler.scheduler.get_job('cleanup_premiums')
+            missed = cleanup.trigger.get_next_fire_time(None, datetime.fromtimestamp(now - DAY, cleanup.trigger.timezone))
+            await set_job_watermark(scheduler.last_run_key('cleanup_premiums'), int(missed.timestamp()) - 60)
+            await set_job_watermark(scheduler.last_run_key('weekly_bonuses'), now)
+
+            await scheduler._catch_up_missed_runs()
+            next_runs = {job.id: job.next_run_time.timestamp() for job in scheduler.scheduler.get_jobs()}
+            first_seen = await get_job_watermark(scheduler.last_run_key('engagement_reminders'))
+            return now, next_runs, first_seen
+        finally:
+            scheduler.scheduler.remove_all_jobs()
+            scheduler.scheduler.shutdown(wait=False)
+            await db_pool.close()
+
+    now, next_runs, first_seen = asyncio.run(run())
+    assert next_runs['cleanup_premiums'] <= now + 1
+    assert next_runs['weekly_bonuses'] > now + 60
+    assert first_seen is not None and first_seen >= now
@@ -0,0 +1,79 @@
+import asyncio
+
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError,
+)
+from aiogram.methods import SendMessage
+
+from utils.send_engine import BLOCKED, FAILED, SENT, SendEngine, TokenBucket
+
+METHOD = SendMessage(chat_id=1, text="Salom")
+
+class StubBot:
+    """Raises the queued errors in order, then delivers"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+
+class RecordingBucket(TokenBucket):
+    """Records flood-wait pauses instead of waiting them out"""
+
+    def __init__(self, rate):
+        super().__init__(rate)
+        self.pauses = []
+
+    def pause(self, seconds):
+        self.pauses.append(seconds)
+
+def make_engine(**kwargs):
+    options = dict(rate=1000, per_chat_interval=0, backoff_base=0.001, backoff_max=0.001)
+    options.update(kwargs)
+    return SendEngine(**options)
+
+def test_retry_after_pauses_the_shared_bucket():
+    engine = make_engine()
+    engine.bucket = RecordingBucket(1000)
+    bot = StubBot(TelegramRetryAfter(METHOD, "Flood control exceeded", retry_after=7))
+
+    assert asyncio.run(engine.send(bot, 1, "Salom")) == SENT
+    assert engine.bucket.pauses == [7]
+    assert bot.calls == 2
+
+def test_forbidden_and_missing_chat_are_blocked():
+    blocked = []
+
+    async def on_blocked(chat_ids):
+        blocked.extend(chat_ids)
+
+    engine = make_engine()
+    engine.on_blocked = on_blocked
+    forbidden = StubBot(TelegramForbiddenError(METHOD, "Forbidden: bot was blocked by the user"))
+    missing = StubBot(TelegramBadRequest(METHOD, "Bad Request: chat not found"))
+
+    assert asyncio.run(engine.send(forbidden, 1, "Salom")) == BLOCKED
+    assert asyncio.run(engine.send(missing, 2, "Salom")) == BLOCKED
+    assert blocked == [1, 2]
+    assert forbidden.calls == missing.calls == 1
+
+def test_transient_errors_back_off_up_to_max_retries():
+    engine = make_engine(max_retries=2)
+    recovers = StubBot(TelegramServerError(METHOD, "Bad Gateway"), TelegramNetworkError(METHOD, "timeout"))
+    keeps_failing = StubBot(*[TelegramServerError(METHOD, "Bad Gateway")] * 5)
+
+    assert asyncio.run(engine.send(recovers, 1, "Salom")) == SENT
+    assert recovers.calls == 3
+    assert asyncio.run(engine.send(keeps_failing, 2, "Salom")) == FAILED
+    assert keeps_failing.calls == 3
+
+def test_other_bad_requests_fail_without_retry():
+    engine = make_engine()
+    bot = StubBot(TelegramBadRequest(METHOD, "Bad Request: message text is empty"))
+
+    assert asyncio.run(engine.send(bot, 1, "Salom")) == FAILED
+    assert bot.calls == 1
@@ -0,0 +1,66 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from database import create_user, db_pool, init_db
+from utils.write_behind import ActivityCoalescer
+
+class BrokenPool:
+    """Pool whose writer fails every transaction"""
+
+    @asynccontextmanager
+    async def transaction(self):
+        raise RuntimeError("database is locked")
+        yield
+
+async def user_row(user_id):
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(
+            "SELECT total_sessions, words_learned, rating_score FROM users WHERE user_id = ?", (user_id,)
+        )
+        return await cursor.fetchone()
+
+def with_users(body):
+    async def run():
+        await db_pool.open()
+        try:
+            await init_db()
+            await create_user(1, None, "Ali")
+            await create_user(2, None, "Vali")
+            return await body()
+        finally:
+            await db_pool.close()
+    return asyncio.run(run())
+
+def test_records_are_merged_per_user():
+    flushed = []
+
+    async def body():
+        buffer = ActivityCoalescer(db_pool, on_flush=flushed.append)
+        buffer.record(1, sessions=1)
+        buffer.record(1, sessions=1, rating=2.0, words=1, activity='quiz_complete')
+        buffer.record(2, rating=3.0, activity='quiz_complete')
+        assert buffer.pending_users == 2
+        assert await buffer.flush() == 2
+        return await user_row(1), await user_row(2)
+
+    assert with_users(body) == ((2, 1, 2.0), (0, 0, 3.0))
+    assert flushed == [{1: [2, 2.0, 1], 2: [0, 3.0, 0]}]
+
+def test_failed_batch_is_put_back():
+    async def body():
+        buffer = ActivityCoalescer(BrokenPool())
+        buffer.record(1, sessions=1, rating=2.0, activity='quiz_complete')
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        assert buffer.pending_users == 1
+
+        # Newer deltas merge into the restored batch and both reach the database
+        buffer.record(1, sessions=1, words=1)
+        buffer.pool = db_pool
+        assert await buffer.flush() == 1
+        assert buffer.pending_users == 0
+        return await user_row(1)
+
+    assert with_users(body) == (2, 1, 2.0)
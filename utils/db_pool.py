@@ -0,0 +1,92 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import aiosqlite
+
+
+class ConnectionPool:
+    """Process-wide aiosqlite pool: bounded reader connections plus one writer"""
+
+    def __init__(self, database_path: str, readers: int = 4, pragmas: Optional[Dict[str, object]] = None):
+        self.database_path = database_path
+        self.readers = max(1, readers)
+        self.pragmas = dict(pragmas or {})
+        self._idle: Optional[asyncio.Queue] = None
+        self._all_readers: List[aiosqlite.Connection] = []
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.database_path)
+        for name, value in self.pragmas.items():
+            # journal_mode is persistent in the file, the writer sets it once
+            if read_only and name == "journal_mode":
+                continue
+            await conn.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            await conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    async def open(self) -> None:
+        """Open the writer and all reader connections (idempotent)"""
+        async with self._open_lock:
+            if self.is_open:
+                return
+
+            # Writer first so WAL is in place before readers attach
+            self._writer = await self._connect()
+            self._idle = asyncio.Queue()
+            for _ in range(self.readers):
+                conn = await self._connect(read_only=True)
+                self._all_readers.append(conn)
+                self._idle.put_nowait(conn)
+
+    async def close(self) -> None:
+        """Close every pooled connection"""
+        async with self._open_lock:
+            for conn in self._all_readers:
+                try:
+                    await conn.close()
+                except Exception as e:
+                    print(f"Pool reader close error: {e}")
+            self._all_readers = []
+            self._idle = None
+
+            if self._writer is not None:
+                try:
+                    await self._writer.close()
+                except Exception as e:
+                    print(f"Pool writer close error: {e}")
+                self._writer = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a reader connection for read-only queries"""
+        if not self.is_open:
+            await self.open()
+
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Run statements on the single writer; commit on success, rollback on error"""
+        if not self.is_open:
+            await self.open()
+
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
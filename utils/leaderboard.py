@@ -0,0 +1,141 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from models import User
+
+# Same order as the original leaderboard queries
+LEADERBOARD_QUERY = f"""
+    SELECT {User.select_list(User.SNAPSHOT)}
+    FROM users
+    WHERE rating_score > 0
+    ORDER BY rating_score DESC, words_learned DESC, quiz_score_total DESC, total_sessions DESC
+    LIMIT ?
+"""
+
+# Most rows any renderer below shows; the snapshot must hold at least this many
+RENDERED_ROWS = 10
+
+def _medal(i: int) -> str:
+    return "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+
+def render_command(rows: List[User]) -> str:
+    """/leaderboard message"""
+    text = f"🏆 <b>Top {RENDERED_ROWS} foydalanuvchilar</b>\n\n"
+    for i, leader in enumerate(rows[:RENDERED_ROWS], 1):
+        name = leader.first_name or "Noma'lum"
+        text += f"{_medal(i)} <b>{name}</b>\n"
+        text += f"   📊 Reyting: {leader.rating_score:.1f}\n"
+        text += f"   📚 So'zlar: {leader.words_learned or 0} | 🧠 Test: {leader.quiz_score_total or 0}\n\n"
+    return text
+
+def render_top5(rows: List[User]) -> str:
+    """Top 5 block of the rating screen"""
+    text = "\n\n⭐ <b>TOP 5 LIDERLAR:</b>\n"
+    for i, leader in enumerate(rows[:5], 1):
+        text += f"{_medal(i)} {leader.first_name or 'Anonim'}: {float(leader.rating_score or 0.0):.1f} ball\n"
+    return text
+
+def render_rating_lines(rows: List[User]) -> List[Tuple[int, str, str]]:
+    """Top 8 lines as (user_id, line, line for that user themself)"""
+    lines = []
+    for i, leader in enumerate(rows[:8], 1):
+        name = leader.first_name or "Noma'lum"
+        lines.append((
+            leader.user_id,
+            f"\n{_medal(i)} <b>{name}</b> - {leader.rating_score:.1f} ball",
+            f"\n{_medal(i)} <b>👤 {name} (SIZ)</b> - {leader.rating_score:.1f} ball",
+        ))
+    return lines
+
+def render_admin_top(rows: List[User]) -> str:
+    """Top 5 with premium marks for the admin premium statistics"""
+    text = ""
+    for i, leader in enumerate(rows[:5], 1):
+        premium_mark = "💎" if leader.is_premium else "🆓"
+        name = leader.first_name or "Noma'lum"
+        text += f"{i}. {name} - {leader.rating_score or 0} ⭐ {premium_mark}\n"
+    return text
+
+class Snapshot:
+    """Top-N rows and their rendered text, replaced whole on every refresh"""
+    __slots__ = ("rows", "taken_at", "command_text", "top5_text", "rating_lines", "admin_top_text")
+
+    def __init__(self, rows: List[User]):
+        self.rows = rows
+        self.taken_at = time.time()
+        self.command_text = render_command(rows)
+        self.top5_text = render_top5(rows)
+        self.rating_lines = render_rating_lines(rows)
+        self.admin_top_text = render_admin_top(rows)
+
+    def rating_block(self, user_id: int) -> str:
+        """Top 8 lines with the viewer highlighted"""
+        return "".join(mine if uid == user_id else line for uid, line, mine in self.rating_lines)
+
+class LeaderboardSnapshots:
+    """Materialized top-N leaderboard, refreshed in the background
+
+    Refreshes every `interval` seconds, and sooner when a flushed rating
+    delta could change the top N.
+    """
+
+    def __init__(self, pool, size: int = RENDERED_ROWS, interval: float = 10.0):
+        if size < RENDERED_ROWS:
+            raise ValueError(f"Leaderboard snapshot size must be at least {RENDERED_ROWS}, got {size}")
+        self.pool = pool
+        self.size = size
+        self.interval = interval
+        self.snapshot: Optional[Snapshot] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> Snapshot:
+        async with self.pool.acquire() as db:
+            cursor = await db.execute(LEADERBOARD_QUERY, (self.size,))
+            rows = User.from_rows(await cursor.fetchall(), User.SNAPSHOT)
+        self.snapshot = Snapshot(rows)
+        return self.snapshot
+
+    async def get(self) -> Snapshot:
+        """Current snapshot, built on first use"""
+        return self.snapshot or await self.refresh()
+
+    def notify(self, scores: Dict[int, float]) -> None:
+        """Wake the refresher if any of these new scores reaches the top N"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return
+        if len(snapshot.rows) < self.size:
+            self._wake.set()
+            return
+        floor = snapshot.rows[-1].rating_score
+        shown = {row.user_id for row in snapshot.rows}
+        if any(score >= floor or user_id in shown for user_id, score in scores.items()):
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Leaderboard refresh error: {e}")
+
+    def start(self) -> None:
+        """Start the background refresh loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from utils.timeutil import now_ts
+
+async def create_lease_table(db) -> None:
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            acquired_at INTEGER NOT NULL,
+            heartbeat_at INTEGER NOT NULL,
+            expires_at INTEGER NOT NULL
+        )
+    """)
+
+def instance_id() -> str:
+    """Identifies this process among replicas"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class Lease:
+    """Database lease held by at most one replica at a time
+
+    The holder renews it every `heartbeat` seconds; if it stops renewing for
+    `ttl` seconds any other replica may take it over. on_acquired/on_lost are
+    awaited when this process gains or loses the lease.
+    """
+
+    def __init__(self, pool, name: str, ttl: int = 60, heartbeat: float = 15.0,
+                 on_acquired: Optional[Callable[[], Awaitable[None]]] = None,
+                 on_lost: Optional[Callable[[], Awaitable[None]]] = None):
+        self.pool = pool
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.on_acquired = on_acquired
+        self.on_lost = on_lost
+        self.holder = instance_id()
+        self.held = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def try_acquire(self) -> bool:
+        """Take the lease if it is free or expired, or renew it if already ours"""
+        now = now_ts()
+        async with self.pool.transaction() as db:
+            await db.execute("""
+                INSERT INTO leases (name, holder, acquired_at, heartbeat_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    holder = excluded.holder,
+                    acquired_at = CASE WHEN leases.holder = excluded.holder
+                                       THEN leases.acquired_at ELSE excluded.acquired_at END,
+                    heartbeat_at = excluded.heartbeat_at,
+                    expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at < excluded.heartbeat_at
+            """, (self.name, self.holder, now, now, now + self.ttl))
+            cursor = await db.execute("SELECT holder FROM leases WHERE name = ?", (self.name,))
+            row = await cursor.fetchone()
+        return row is not None and row[0] == self.holder
+
+    async def release(self) -> None:
+        """Give the lease up so another replica can take it at once"""
+        async with self.pool.transaction() as db:
+            await db.execute(
+                "DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder)
+            )
+        await self._set_held(False)
+
+    async def _set_held(self, held: bool) -> None:
+        if held == self.held:
+            return
+        self.held = held
+        callback = self.on_acquired if held else self.on_lost
+        print(f"[LEASE] {self.holder} {'acquired' if held else 'lost'} lease '{self.name}'")
+        if callback is not None:
+            try:
+                await callback()
+            except Exception as e:
+                print(f"[LEASE] {self.name} callback error: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                held = await self.try_acquire()
+            except Exception as e:
+                # A holder that cannot renew must assume someone else takes over after the TTL
+                print(f"[LEASE] {self.name} heartbeat error: {e}")
+                held = False
+            await self._set_held(held)
+            await asyncio.sleep(self.heartbeat)
+
+    def start(self) -> None:
+        """Start competing for the lease in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.held:
+            await self.release()
@@ -0,0 +1,94 @@
+import re
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import aiosqlite
+
+# (version, description, step) - step receives the writer connection
+Migration = Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    """Return the applied schema version, 0 for a database that was never migrated"""
+    try:
+        cursor = await db.execute("SELECT MAX(version) FROM schema_version")
+        row = await cursor.fetchone()
+    except aiosqlite.OperationalError:
+        return 0
+    return row[0] if row and row[0] else 0
+
+def latest_version(migrations: List[Migration]) -> int:
+    """Highest version in an ordered migration list"""
+    return migrations[-1][0] if migrations else 0
+
+async def rebuild_table(db: aiosqlite.Connection, table: str, retype: Dict[str, str],
+                        convert: Dict[str, str]) -> None:
+    """Recreate a table with regex-patched DDL, copying columns through convert expressions"""
+    cursor = await db.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    )
+    row = await cursor.fetchone()
+    if not row:
+        return
+    create_sql = row[0]
+
+    cursor = await db.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)
+    )
+    dependents = [r[0] for r in await cursor.fetchall()]
+
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    columns = [r[1] for r in await cursor.fetchall()]
+
+    new_table = f"{table}__new"
+    new_sql = re.sub(rf"^CREATE TABLE\s+\"?{table}\"?", f"CREATE TABLE {new_table}", create_sql, count=1)
+    for pattern, replacement in retype.items():
+        new_sql = re.sub(pattern, replacement, new_sql)
+
+    await db.execute(f"DROP TABLE IF EXISTS {new_table}")
+    await db.execute(new_sql)
+    select_list = ", ".join(convert.get(col, col) for col in columns)
+    await db.execute(
+        f"INSERT INTO {new_table} ({', '.join(columns)}) SELECT {select_list} FROM {table}"
+    )
+    await db.execute(f"DROP TABLE {table}")
+    await db.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    # Indexes and triggers went away with the old table
+    for statement in dependents:
+        await db.execute(statement)
+
+async def apply_migrations(db: aiosqlite.Connection, migrations: List[Migration]) -> int:
+    """Apply pending steps in order inside one transaction; the caller commits"""
+    versions = [version for version, _, _ in migrations]
+    if versions != sorted(set(versions)):
+        raise ValueError("Migrations must have unique, increasing versions")
+
+    # Explicit BEGIN so DDL is rolled back together with the version rows
+    if not db.in_transaction:
+        await db.execute("BEGIN")
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    current = await get_schema_version(db)
+    if current > latest_version(migrations):
+        # Forward-only: never touch a schema written by a newer release
+        print(f"Schema version {current} is newer than this release ({latest_version(migrations)})")
+        return current
+
+    for version, description, step in migrations:
+        if version <= current:
+            continue
+        await step(db)
+        await db.execute(
+            "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+            (version, description)
+        )
+        print(f"Applied migration {version}: {description}")
+        current = version
+
+    return current
@@ -0,0 +1,354 @@
+import asyncio
+import zlib
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from models import Campaign
+from utils.lease import instance_id
+from utils.send_engine import send_engine, SENT, BLOCKED, FAILED
+from utils.timeutil import now_ts
+
+# Delivery state of one outbox row; the others are the send engine outcomes
+PENDING = "pending"
+
+# Next undelivered recipients whose slot has come, earliest slot first
+PENDING_BATCH_QUERY = """
+    SELECT user_id, text FROM outbox
+    WHERE campaign_id = ? AND status = 'pending' AND due_at <= ?
+    ORDER BY due_at, user_id
+    LIMIT ?
+"""
+
+NEXT_DUE_QUERY = """
+    SELECT MIN(due_at) FROM outbox WHERE campaign_id = ? AND status = 'pending'
+"""
+
+# Campaigns whose recipients are all stored but not yet all delivered
+UNFINISHED_CAMPAIGNS_QUERY = """
+    SELECT id FROM campaigns WHERE finished_at IS NULL AND populated_at IS NOT NULL ORDER BY id
+"""
+
+# Takes a campaign for one drainer, or renews its claim; any process may take it once the claim lapses
+CLAIM_QUERY = """
+    UPDATE campaigns SET claimed_by = ?, claimed_until = ?
+    WHERE id = ? AND finished_at IS NULL
+    AND (claimed_by = ? OR claimed_until IS NULL OR claimed_until < ?)
+"""
+
+# Longest single wait between slot checks, so progress and cancellation stay responsive
+MAX_IDLE_SECONDS = 60
+
+# (user_id, personalised text or None for the campaign text)
+Recipient = Tuple[int, Optional[str]]
+
+async def create_outbox_tables(db) -> None:
+    """Campaigns with their counters and one outbox row per recipient"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS campaigns (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            text TEXT,
+            created_at INTEGER NOT NULL,
+            finished_at INTEGER,
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            campaign_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            text TEXT,
+            updated_at INTEGER,
+            PRIMARY KEY (campaign_id, user_id)
+        )
+    """)
+    # Only undelivered rows are indexed, so the index shrinks as a campaign drains
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending
+        ON outbox (campaign_id, user_id) WHERE status = 'pending'
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_campaigns_unfinished ON campaigns (id) WHERE finished_at IS NULL"
+    )
+
+async def _chunks(items: Union[Iterable, AsyncIterable], size: int):
+    """Group a sync or async stream into lists of up to `size` items"""
+    chunk = []
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    else:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+async def add_delivery_slots(db) -> None:
+    """outbox.due_at: when a recipient's slot in the campaign window opens"""
+    await db.execute("ALTER TABLE outbox ADD COLUMN due_at INTEGER NOT NULL DEFAULT 0")
+    await db.execute("DROP INDEX IF EXISTS idx_outbox_pending")
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_due
+        ON outbox (campaign_id, due_at, user_id) WHERE status = 'pending'
+    """)
+
+async def add_campaign_population(db) -> None:
+    """campaigns.populated_at: set once every recipient is in the outbox"""
+    await db.execute("ALTER TABLE campaigns ADD COLUMN populated_at INTEGER")
+    await db.execute("UPDATE campaigns SET populated_at = created_at")
+
+async def add_campaign_claims(db) -> None:
+    """campaigns.claimed_by/claimed_until: which process drains a campaign, and until when"""
+    await db.execute("ALTER TABLE campaigns ADD COLUMN claimed_by TEXT")
+    await db.execute("ALTER TABLE campaigns ADD COLUMN claimed_until INTEGER")
+
+def delivery_offset(user_id: int, window: int) -> int:
+    """Stable offset of a user within a `window`-second delivery window
+
+    crc32 rather than hash() so every process and restart assigns the same slot.
+    """
+    if window <= 0:
+        return 0
+    return zlib.crc32(str(user_id).encode()) % window
+
+class CampaignOutbox:
+    """Durable per-recipient delivery state for bulk sends
+
+    A campaign's recipients are written `batch_size` at a time, then drained
+    `batch_size` recipients at a time. Each batch's outcomes are
+    committed before the next one starts, so after a restart serve() picks
+    up at the first undelivered recipient; at most one batch can be resent
+    after a crash, and only the sends in flight after a cancel.
+
+    A campaign with a delivery window gives each recipient a slot inside it
+    (see delivery_offset), and drain() sends recipients as their slots open,
+    so the send rate is spread over the window instead of peaking at its start.
+
+    A drain claims its campaign in the database and renews the claim before
+    every batch, so however many processes call drain() only one sends; a
+    claim left by a crashed process lapses after `claim_ttl` seconds.
+    """
+
+    def __init__(self, pool, batch_size: int = 100, claim_ttl: int = 300, holder: Optional[str] = None):
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.claim_ttl = claim_ttl
+        self.holder = holder or instance_id()
+        # Campaigns being drained by this process
+        self._active: Set[int] = set()
+
+    async def _insert_campaign(self, db, key: str, title: str, text: Optional[str]) -> Tuple[int, bool]:
+        cursor = await db.execute("SELECT id FROM campaigns WHERE key = ?", (key,))
+        existing = await cursor.fetchone()
+        if existing:
+            return existing[0], False
+        cursor = await db.execute(
+            "INSERT INTO campaigns (key, title, text, created_at) VALUES (?, ?, ?, ?)",
+            (key, title, text, now_ts())
+        )
+        return cursor.lastrowid, True
+
+    async def _set_populated(self, db, campaign_id: int) -> None:
+        """Store the recipient count and mark the campaign ready to drain"""
+        await db.execute("""
+            UPDATE campaigns SET total = (SELECT COUNT(*) FROM outbox WHERE campaign_id = ?), populated_at = ?
+            WHERE id = ?
+        """, (campaign_id, now_ts(), campaign_id))
+
+    async def create(self, key: str, title: str,
+                     recipients: Union[Iterable[Recipient], AsyncIterable[Recipient]],
+                     text: Optional[str] = None, window: int = 0) -> Tuple[int, bool]:
+        """Store a campaign and its recipients; returns (campaign_id, created)
+
+        `key` identifies one logical run: a second create() with the same key
+        returns the existing campaign without adding recipients, unless the
+        first one was interrupted while storing them, in which case the rest
+        are added. Recipients may be a stream; each `batch_size` chunk is
+        committed on its own, so the writer is never held while the stream is
+        read. With a `window` (seconds) delivery is spread over that long from now.
+        """
+        start = now_ts()
+        async with self.pool.transaction() as db:
+            campaign_id, created = await self._insert_campaign(db, key, title, text)
+            cursor = await db.execute("SELECT populated_at FROM campaigns WHERE id = ?", (campaign_id,))
+            populated = (await cursor.fetchone())[0] is not None
+        if populated:
+            return campaign_id, created
+
+        async for chunk in _chunks(recipients, self.batch_size):
+            async with self.pool.transaction() as db:
+                await db.executemany(
+                    "INSERT OR IGNORE INTO outbox (campaign_id, user_id, text, due_at) VALUES (?, ?, ?, ?)",
+                    [(campaign_id, user_id, user_text, start + delivery_offset(user_id, window))
+                     for user_id, user_text in chunk]
+                )
+        async with self.pool.transaction() as db:
+            await self._set_populated(db, campaign_id)
+        return campaign_id, created
+
+    async def create_for_query(self, key: str, title: str, text: str, query: str,
+                               params: tuple = ()) -> Tuple[int, bool]:
+        """Like create(), with recipients selected by `query` (returning user_id) inside the database"""
+        async with self.pool.transaction() as db:
+            campaign_id, created = await self._insert_campaign(db, key, title, text)
+            if created:
+                await db.execute(
+                    f"INSERT OR IGNORE INTO outbox (campaign_id, user_id, due_at) SELECT ?, user_id, ? FROM ({query})",
+                    (campaign_id, now_ts(), *params)
+                )
+                await self._set_populated(db, campaign_id)
+        return campaign_id, created
+
+    async def _record(self, campaign_id: int, results: Dict[int, str], finished: bool) -> None:
+        """Commit one batch's outcomes and bump the campaign counters"""
+        now = now_ts()
+        counts = {SENT: 0, FAILED: 0, BLOCKED: 0}
+        for status in results.values():
+            counts[status] += 1
+        async with self.pool.transaction() as db:
+            await db.executemany(
+                "UPDATE outbox SET status = ?, updated_at = ? WHERE campaign_id = ? AND user_id = ?",
+                [(status, now, campaign_id, user_id) for user_id, status in results.items()]
+            )
+            await db.execute("""
+                UPDATE campaigns SET sent = sent + ?, failed = failed + ?, blocked = blocked + ?
+                WHERE id = ?
+            """, (counts[SENT], counts[FAILED], counts[BLOCKED], campaign_id))
+            if finished:
+                await db.execute(
+                    "UPDATE campaigns SET finished_at = ? WHERE id = ? AND finished_at IS NULL",
+                    (now, campaign_id)
+                )
+
+    async def _claim(self, campaign_id: int) -> bool:
+        """Take or renew this process's claim on an unfinished campaign"""
+        now = now_ts()
+        async with self.pool.transaction() as db:
+            cursor = await db.execute(
+                CLAIM_QUERY, (self.holder, now + self.claim_ttl, campaign_id, self.holder, now)
+            )
+            return cursor.rowcount == 1
+
+    async def _release(self, campaign_id: int) -> None:
+        try:
+            async with self.pool.transaction() as db:
+                await db.execute(
+                    "UPDATE campaigns SET claimed_until = NULL WHERE id = ? AND claimed_by = ?",
+                    (campaign_id, self.holder)
+                )
+        except Exception as e:
+            print(f"Campaign {campaign_id} claim release error: {e}")
+
+    async def drain(self, bot, campaign_id: int) -> Optional[Campaign]:
+        """Send every pending recipient of a campaign; returns its final progress
+
+        Returns None if the campaign is finished, or being drained by this or
+        another process; stops with None if another process takes it over.
+        """
+        if campaign_id in self._active:
+            return None
+        self._active.add(campaign_id)
+        claimed = False
+        try:
+            claimed = await self._claim(campaign_id)
+            if not claimed:
+                return None
+            async with self.pool.acquire() as db:
+                cursor = await db.execute("SELECT text FROM campaigns WHERE id = ?", (campaign_id,))
+                row = await cursor.fetchone()
+            if row is None:
+                return None
+            default_text = row[0]
+
+            while True:
+                # Renewed before every batch; losing it means another process owns the sends now
+                if not await self._claim(campaign_id):
+                    print(f"Campaign {campaign_id} claim lost, leaving it to its new drainer")
+                    return None
+                async with self.pool.acquire() as db:
+                    cursor = await db.execute(PENDING_BATCH_QUERY, (campaign_id, now_ts(), self.batch_size))
+                    batch = await cursor.fetchall()
+                    if not batch:
+                        cursor = await db.execute(NEXT_DUE_QUERY, (campaign_id,))
+                        next_due = (await cursor.fetchone())[0]
+                if not batch:
+                    if next_due is None:
+                        await self._record(campaign_id, {}, finished=True)
+                        break
+                    # Nothing due yet: wait for the next slot in the window
+                    await asyncio.sleep(min(MAX_IDLE_SECONDS, max(1, next_due - now_ts())))
+                    continue
+
+                results: Dict[int, str] = {}
+                try:
+                    await send_engine.send_many(
+                        bot, ((user_id, text or default_text) for user_id, text in batch),
+                        on_result=results.__setitem__
+                    )
+                except asyncio.CancelledError:
+                    # Keep what was delivered before the cancel, so the next drain does not resend it
+                    await asyncio.shield(self._record(campaign_id, results, finished=False))
+                    raise
+                await self._record(campaign_id, results, finished=False)
+        finally:
+            if claimed:
+                await asyncio.shield(self._release(campaign_id))
+            self._active.discard(campaign_id)
+        return await self.progress(campaign_id)
+
+    async def _drain_logged(self, bot, campaign_id: int) -> None:
+        try:
+            await self.drain(bot, campaign_id)
+        except Exception as e:
+            print(f"Campaign {campaign_id} drain error: {e}")
+
+    async def serve(self, bot, interval: float) -> None:
+        """Drain every unfinished campaign, looking for new ones every `interval` seconds
+
+        Picks up campaigns left by a previous run as well as ones created since,
+        e.g. by an admin broadcast on any replica; each is drained in its own
+        task. Runs until cancelled, and cancels its drains with it. Campaigns
+        interrupted while storing recipients are left for their creator's next
+        create() with the same key, which adds the rest.
+        """
+        tasks: Dict[int, asyncio.Task] = {}
+        try:
+            while True:
+                async with self.pool.acquire() as db:
+                    cursor = await db.execute(UNFINISHED_CAMPAIGNS_QUERY)
+                    campaign_ids = [row[0] for row in await cursor.fetchall()]
+                for campaign_id in campaign_ids:
+                    if campaign_id not in tasks and campaign_id not in self._active:
+                        tasks[campaign_id] = asyncio.create_task(self._drain_logged(bot, campaign_id))
+                await asyncio.sleep(interval)
+                tasks = {campaign_id: task for campaign_id, task in tasks.items() if not task.done()}
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    async def progress(self, campaign_id: int) -> Optional[Campaign]:
+        async with self.pool.acquire() as db:
+            cursor = await db.execute(
+                f"SELECT {Campaign.select_list(Campaign.PROGRESS)} FROM campaigns WHERE id = ?", (campaign_id,)
+            )
+            return Campaign.from_row(await cursor.fetchone(), Campaign.PROGRESS)
+
+    async def recent(self, limit: int = 5) -> List[Campaign]:
+        """Latest campaigns with their counters, newest first"""
+        async with self.pool.acquire() as db:
+            cursor = await db.execute(
+                f"SELECT {Campaign.select_list(Campaign.PROGRESS)} FROM campaigns ORDER BY id DESC LIMIT ?",
+                (limit,)
+            )
+            return Campaign.from_rows(await cursor.fetchall(), Campaign.PROGRESS)
@@ -0,0 +1,114 @@
+import asyncio
+import sys
+from typing import List, Tuple
+
+import aiosqlite
+
+from database import (
+    migrate, users_page_query, GET_USER_QUERY, NEW_USERS_QUERY, PREMIUM_CONTENT_QUERY,
+    QUIZ_QUESTIONS_QUERY, QUIZZES_BY_TYPE_QUERY, REFERRAL_COUNT_QUERY, STATS_QUERY,
+)
+from handlers.admin import (
+    ACTIVE_PREMIUM_COUNT_QUERY, ACTIVE_USERS_QUERY, BROADCAST_RECIPIENTS_QUERY,
+    EXPIRED_PREMIUM_COUNT_QUERY, PREMIUM_USERS_QUERY,
+)
+from handlers.content import CONTENT_BY_SECTION_QUERY, CONTENT_BY_SUBSECTION_QUERY
+from handlers.sections import SECTION_ROOT_CONTENT_QUERY, SECTIONS_BY_LANGUAGE_QUERY, SUBSECTIONS_QUERY
+from handlers.start import REFERRER_QUERY
+from handlers.tests import MY_QUIZZES_QUERY
+from utils.leaderboard import LEADERBOARD_QUERY
+from utils.outbox import NEXT_DUE_QUERY, PENDING_BATCH_QUERY, UNFINISHED_CAMPAIGNS_QUERY
+from utils.rank_index import RANK_INDEX_QUERY
+from utils.rating_ledger import ROLLUP_DELTAS_QUERY
+from utils.rating_system import (
+    LANGUAGE_LEADERBOARD_QUERY, RATING_LEADERBOARD_QUERY, WEEKLY_BONUS_QUERY,
+    WINDOW_LEADERBOARD_QUERY, WINDOW_POINTS_QUERY, WINDOW_RANK_QUERY,
+)
+from utils.scheduler import (
+    ACTIVE_RECIPIENTS, EXPIRE_PREMIUM_QUERY, EXPIRED_PREMIUMS_QUERY, INACTIVE_RECIPIENTS, PROMOTION_RECIPIENTS,
+    REMINDER_RECIPIENTS,
+)
+
+# Hot query paths that must be served by an index: (label, sql, params).
+# The SQL is imported from the modules that run it, so the check follows code changes.
+KNOWN_QUERIES = [
+    ("get_user", GET_USER_QUERY, (1,)),
+    ("referral_lookup", REFERRER_QUERY, ("REF000001",)),
+    ("referral_count", REFERRAL_COUNT_QUERY, (1,)),
+    ("leaderboard_snapshot", LEADERBOARD_QUERY, (10,)),
+    ("outbox_pending_batch", PENDING_BATCH_QUERY, (1, 0, 100)),
+    ("outbox_next_due", NEXT_DUE_QUERY, (1,)),
+    ("unfinished_campaigns", UNFINISHED_CAMPAIGNS_QUERY, ()),
+    ("rank_index_load", RANK_INDEX_QUERY, ()),
+    ("motivational_recipients", users_page_query(*ACTIVE_RECIPIENTS), (0, 0, 500)),
+    ("promotion_recipients", users_page_query(*PROMOTION_RECIPIENTS), (0, 0, 0, 500)),
+    ("engagement_recipients", users_page_query(*INACTIVE_RECIPIENTS), (0, 0, 0, 500)),
+    ("reminder_bucket", users_page_query(*REMINDER_RECIPIENTS), (600, 0, 500)),
+    ("expired_premiums", EXPIRED_PREMIUMS_QUERY, (0, 500)),
+    ("expire_premium", EXPIRE_PREMIUM_QUERY, (1, 0)),
+    ("broadcast_recipients", BROADCAST_RECIPIENTS_QUERY, ()),
+    ("premium_users_list", PREMIUM_USERS_QUERY, ()),
+    ("active_premium_count", ACTIVE_PREMIUM_COUNT_QUERY, (0,)),
+    ("expired_premium_count", EXPIRED_PREMIUM_COUNT_QUERY, (0,)),
+    ("stats_counters", STATS_QUERY, ()),
+    ("new_users_days", NEW_USERS_QUERY, (0,)),
+    ("active_users_day", ACTIVE_USERS_QUERY, (0,)),
+    ("sections_by_language", SECTIONS_BY_LANGUAGE_QUERY, ("korean",)),
+    ("subsections_by_section", SUBSECTIONS_QUERY, (1,)),
+    ("content_by_section", CONTENT_BY_SECTION_QUERY, (1,)),
+    ("content_section_root", SECTION_ROOT_CONTENT_QUERY, (1,)),
+    ("content_by_subsection", CONTENT_BY_SUBSECTION_QUERY, (1,)),
+    ("quizzes_by_type", QUIZZES_BY_TYPE_QUERY, ("topik",)),
+    ("quizzes_by_creator", MY_QUIZZES_QUERY, (1,)),
+    ("quiz_questions", QUIZ_QUESTIONS_QUERY, (1,)),
+    ("weekly_bonus", WEEKLY_BONUS_QUERY, (0, 0, 10, 1.0, 0, 10, 0)),
+    ("rating_rollup_users", ROLLUP_DELTAS_QUERY, (0, 10)),
+    ("rating_leaderboard", RATING_LEADERBOARD_QUERY, (10,)),
+    ("language_leaderboard", LANGUAGE_LEADERBOARD_QUERY, ("korean", 10)),
+    ("window_leaderboard", WINDOW_LEADERBOARD_QUERY, (0, 10)),
+    ("window_user_points", WINDOW_POINTS_QUERY, (1, 0)),
+    ("window_rank", WINDOW_RANK_QUERY, (0, 1.0)),
+    ("premium_content_section", PREMIUM_CONTENT_QUERY, ("topik1",)),
+]
+
+def find_full_scans(plan_rows) -> List[str]:
+    """Return plan details that read a whole table without an index"""
+    scans = []
+    # CTEs are built once ("MATERIALIZE name") and then walked like a subquery result
+    materialized = {row[-1].split()[1] for row in plan_rows if row[-1].startswith("MATERIALIZE ")}
+    for row in plan_rows:
+        detail = row[-1]
+        # "SCAN (subquery-N)" walks an already materialized result, not a table
+        if detail.startswith("SCAN ") and not detail.startswith("SCAN (") and "USING" not in detail:
+            if detail.split()[1] not in materialized:
+                scans.append(detail)
+    return scans
+
+async def check_query_plans(db) -> List[Tuple[str, List[str]]]:
+    """Run EXPLAIN QUERY PLAN on KNOWN_QUERIES and collect full table scans"""
+    failures = []
+    for label, sql, params in KNOWN_QUERIES:
+        cursor = await db.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        scans = find_full_scans(await cursor.fetchall())
+        if scans:
+            failures.append((label, scans))
+    return failures
+
+async def main() -> int:
+    """Build the schema in memory and fail if any known query scans a table"""
+    async with aiosqlite.connect(":memory:") as db:
+        await migrate(db)
+        failures = await check_query_plans(db)
+
+    for label, scans in failures:
+        print(f"FULL SCAN in {label}: {'; '.join(scans)}")
+
+    if failures:
+        print(f"{len(failures)} of {len(KNOWN_QUERIES)} queries do full table scans")
+        return 1
+
+    print(f"All {len(KNOWN_QUERIES)} queries use indexes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,88 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Tuple
+
+# Sorts after every user id, so bisect_right((score, _TOP)) lands past all equal scores
+_TOP = float("inf")
+
+RANK_INDEX_QUERY = "SELECT user_id, rating_score FROM users WHERE rating_score > 0"
+
+class RankIndex:
+    """Sorted in-memory copy of users.rating_score for O(log n) rank lookups
+
+    Mirrors `SELECT COUNT(*) + 1 FROM users WHERE rating_score > ? AND rating_score > 0`:
+    only users with points are indexed and tied scores share a rank.
+    """
+
+    def __init__(self):
+        # (score, user_id) ascending
+        self._entries: List[Tuple[float, int]] = []
+        self._scores: Dict[int, float] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def load(self, pool) -> int:
+        """Rebuild from the users table, returns the number of ranked users
+
+        Reads on the writer connection so no activity flush can commit in between.
+        """
+        async with pool.transaction() as db:
+            cursor = await db.execute(RANK_INDEX_QUERY)
+            rows = await cursor.fetchall()
+
+        self._scores = {user_id: score for user_id, score in rows}
+        self._entries = sorted((score, user_id) for user_id, score in rows)
+        self.loaded = True
+        return len(self._entries)
+
+    def score(self, user_id: int) -> float:
+        return self._scores.get(user_id, 0.0)
+
+    def set_score(self, user_id: int, score: float) -> None:
+        old = self._scores.get(user_id)
+        if old is not None:
+            i = bisect_left(self._entries, (old, user_id))
+            if i < len(self._entries) and self._entries[i] == (old, user_id):
+                del self._entries[i]
+            del self._scores[user_id]
+        if score > 0:
+            self._scores[user_id] = score
+            insort(self._entries, (score, user_id))
+
+    def apply_deltas(self, deltas: Iterable[Tuple[int, float]]) -> None:
+        """Add rating deltas that were just written to the database"""
+        if not self.loaded:
+            return
+        for user_id, delta in deltas:
+            if delta:
+                self.set_score(user_id, self.score(user_id) + delta)
+
+    def _above(self, score: float) -> int:
+        """Number of ranked users with a strictly higher score"""
+        return len(self._entries) - bisect_right(self._entries, (score, _TOP))
+
+    def rank(self, user_id: int) -> int:
+        """1-based position; users without points rank after everyone with points"""
+        return self._above(self.score(user_id)) + 1
+
+    def percentile(self, user_id: int) -> float:
+        """Share of ranked users this user is ahead of, 0-100"""
+        total = len(self._entries)
+        if not total:
+            return 0.0
+        score = self.score(user_id)
+        below = bisect_left(self._entries, (score, -_TOP))
+        return below * 100.0 / total
+
+    def neighbours(self, user_id: int, count: int = 1) -> Tuple[List[Tuple[int, float]], List[Tuple[int, float]]]:
+        """Up to `count` users directly above and below, nearest first, as (user_id, score)"""
+        score = self._scores.get(user_id)
+        if score is None:
+            # Unranked users sit just below the lowest ranked one
+            return [(uid, s) for s, uid in self._entries[:count]], []
+
+        i = bisect_left(self._entries, (score, user_id))
+        above = self._entries[i + 1:i + 1 + count]
+        below = self._entries[max(0, i - count):i]
+        return [(uid, s) for s, uid in above], [(uid, s) for s, uid in reversed(below)]
@@ -0,0 +1,134 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+from utils.timeutil import DAY
+
+# Stored activity codes; append new ones, never renumber
+ACTIVITY_CODES = {
+    'legacy': 0,  # rating_score carried over when the ledger was introduced
+    'session_start': 1,
+    'content_access': 2,
+    'content_view': 3,
+    'content_complete': 4,
+    'quiz_start': 5,
+    'quiz_complete': 6,
+    'quiz_good': 7,
+    'quiz_excellent': 8,
+    'daily_login': 9,
+    'weekly_active': 10,
+    'referral_success': 11,
+    'premium_subscribe': 12,
+    'conversation_ai': 13,
+    'grammar_ai': 14,
+    'other': 99,
+}
+
+# (user_id, activity code, points, ts)
+RatingEvent = Tuple[int, int, float, int]
+
+def activity_code(activity) -> int:
+    """Code for an activity name; unknown names are stored as 'other'"""
+    return ACTIVITY_CODES.get(activity, ACTIVITY_CODES['other'])
+
+async def create_ledger_tables(db) -> None:
+    """Ledger, per-day aggregates and the rollup watermark"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS rating_events (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            activity INTEGER NOT NULL,
+            points REAL NOT NULL,
+            ts INTEGER NOT NULL
+        )
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_rating_events_user ON rating_events (user_id, ts)"
+    )
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS rating_daily (
+            user_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            points REAL NOT NULL DEFAULT 0,
+            events INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS rating_rollup (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_event_id INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    await db.execute("INSERT OR IGNORE INTO rating_rollup (id) VALUES (1)")
+
+async def append_events(db, events: Iterable[RatingEvent]) -> None:
+    await db.executemany(
+        "INSERT INTO rating_events (user_id, activity, points, ts) VALUES (?, ?, ?, ?)",
+        list(events)
+    )
+
+# Per-user points of the events past the watermark
+ROLLUP_DELTAS_QUERY = """
+    SELECT user_id, SUM(points) FROM rating_events
+    WHERE id > ? AND id <= ?
+    GROUP BY user_id
+"""
+
+async def rollup_events(db) -> Dict[int, float]:
+    """Fold events past the watermark into users.rating_score and rating_daily
+
+    Runs on the writer inside the caller's transaction; returns the per-user deltas.
+    """
+    cursor = await db.execute("SELECT last_event_id FROM rating_rollup WHERE id = 1")
+    last_id = (await cursor.fetchone())[0]
+    cursor = await db.execute("SELECT MAX(id) FROM rating_events")
+    max_id = (await cursor.fetchone())[0]
+    if max_id is None or max_id <= last_id:
+        return {}
+
+    cursor = await db.execute(ROLLUP_DELTAS_QUERY, (last_id, max_id))
+    deltas = {user_id: points for user_id, points in await cursor.fetchall()}
+
+    await db.executemany(
+        "UPDATE users SET rating_score = rating_score + ? WHERE user_id = ?",
+        [(points, user_id) for user_id, points in deltas.items()]
+    )
+    await db.execute(f"""
+        INSERT INTO rating_daily (user_id, day, points, events)
+        SELECT user_id, ts / {DAY}, SUM(points), COUNT(*) FROM rating_events
+        WHERE id > ? AND id <= ?
+        GROUP BY user_id, ts / {DAY}
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            points = points + excluded.points,
+            events = events + excluded.events
+    """, (last_id, max_id))
+    await db.execute("UPDATE rating_rollup SET last_event_id = ? WHERE id = 1", (max_id,))
+    return deltas
+
+async def rebuild_from_ledger(db, prices: Optional[Dict[int, float]] = None) -> None:
+    """Recompute users.rating_score and rating_daily from every event
+
+    `prices` (activity code -> points) first rewrites the points of every event
+    with that code, so a change to the point table applies to past activity too;
+    legacy and other events keep their stored points. Reload the rank index and
+    clear the user cache afterwards.
+    """
+    if prices:
+        await db.executemany(
+            "UPDATE rating_events SET points = ? WHERE activity = ? AND points != ?",
+            [(points, code, points) for code, points in prices.items()]
+        )
+    await db.execute("""
+        UPDATE users SET rating_score = COALESCE(
+            (SELECT SUM(points) FROM rating_events e WHERE e.user_id = users.user_id), 0
+        )
+    """)
+    await db.execute("DELETE FROM rating_daily")
+    await db.execute(f"""
+        INSERT INTO rating_daily (user_id, day, points, events)
+        SELECT user_id, ts / {DAY}, SUM(points), COUNT(*) FROM rating_events
+        WHERE activity != ?
+        GROUP BY user_id, ts / {DAY}
+    """, (ACTIVITY_CODES['legacy'],))
+    await db.execute(
+        "UPDATE rating_rollup SET last_event_id = COALESCE((SELECT MAX(id) FROM rating_events), 0) WHERE id = 1"
+    )
@@ -1,6 +1,9 @@
-import aiosqlite
-from datetime import datetime, timedelta
-from config import DATABASE_PATH
+from typing import List, Tuple
+
+from database import db_pool, activity_buffer, get_user_rank, leaderboard, rank_index, ratings_applied, user_cache
+from models import User
+from utils.rating_ledger import ACTIVITY_CODES, rebuild_from_ledger, rollup_events
+from utils.timeutil import DAY, days_ago, now_ts
 
 # Rating points for different activities
 RATING_POINTS = {
@@ -20,6 +23,83 @@ RATING_POINTS = {
     'grammar_ai': 2.0        # Grammar AI
 }
 
+# Leaderboard windows in UTC days, today included
+RATING_WINDOWS = {
+    'day': 1,
+    'week': 7,
+    'month': 30,
+}
+
+# Users with at least 5 activities this week get one ledger event each,
+# unless they already got one in the last 6 days
+WEEKLY_BONUS_QUERY = """
+    WITH active AS (
+        SELECT user_id, COUNT(*) AS activity_count
+        FROM (
+            SELECT user_id FROM user_progress 
+            WHERE completed_at > ?
+            UNION ALL
+            SELECT user_id FROM quiz_attempts 
+            WHERE completed_at > ?
+        )
+        GROUP BY user_id
+        HAVING activity_count >= 5
+    )
+    INSERT INTO rating_events (user_id, activity, points, ts)
+    SELECT active.user_id, ?, ?, ?
+    FROM active
+    JOIN users u ON u.user_id = active.user_id
+    WHERE NOT EXISTS (
+        SELECT 1 FROM rating_events e
+        WHERE e.user_id = active.user_id AND e.activity = ? AND e.ts > ?
+    )
+"""
+
+RATING_LEADERBOARD_QUERY = f"""
+    SELECT {User.select_list(User.LEADERBOARD)}
+    FROM users u
+    WHERE u.rating_score > 0
+    ORDER BY u.rating_score DESC LIMIT ?
+"""
+
+# Served by idx_users_language_rating
+LANGUAGE_LEADERBOARD_QUERY = f"""
+    SELECT {User.select_list(User.LEADERBOARD)}
+    FROM users u
+    WHERE u.rating_score > 0 AND u.study_language = ?
+    ORDER BY u.rating_score DESC LIMIT ?
+"""
+
+# INDEXED BY: without it the planner walks the whole primary key to skip the GROUP BY sort
+WINDOW_LEADERBOARD_QUERY = """
+    SELECT r.user_id, u.first_name, SUM(r.points) AS points
+    FROM rating_daily r INDEXED BY idx_rating_daily_window
+    JOIN users u ON u.user_id = r.user_id
+    WHERE r.day >= ?
+    GROUP BY r.user_id
+    HAVING points > 0
+    ORDER BY points DESC
+    LIMIT ?
+"""
+
+WINDOW_POINTS_QUERY = """
+    SELECT COALESCE(SUM(points), 0) FROM rating_daily
+    WHERE user_id = ? AND day >= ?
+"""
+
+WINDOW_RANK_QUERY = """
+    SELECT COUNT(*) + 1 FROM (
+        SELECT user_id FROM rating_daily INDEXED BY idx_rating_daily_window
+        WHERE day >= ?
+        GROUP BY user_id
+        HAVING SUM(points) > ?
+    )
+"""
+
+def window_start_day(window: str) -> int:
+    """First rating_daily bucket inside the window"""
+    return now_ts() // DAY - RATING_WINDOWS[window] + 1
+
 async def update_user_rating(user_id: int, activity_type: str, bonus_points: float = 0):
     """Update user's rating based on activity"""
     base_points = RATING_POINTS.get(activity_type, 0)
@@ -28,158 +108,119 @@ async def update_user_rating(user_id: int, activity_type: str, bonus_points: flo
     if total_points <= 0:
         return
     
-    try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            # Update rating score
-            await db.execute("""
-                UPDATE users 
-                SET rating_score = rating_score + ?,
-                    last_activity = CURRENT_TIMESTAMP
-                WHERE user_id = ?
-            """, (total_points, user_id))
-            
-            # Update words learned for content activities
-            if activity_type in ['content_complete', 'quiz_excellent']:
-                words_bonus = 1 if activity_type == 'content_complete' else 2
-                await db.execute("""
-                    UPDATE users 
-                    SET words_learned = words_learned + ?
-                    WHERE user_id = ?
-                """, (words_bonus, user_id))
-            
-            await db.commit()
-    except Exception as e:
-        print(f"Rating update error: {e}")
+    # Update words learned for content activities
+    words_bonus = 0
+    if activity_type in ['content_complete', 'quiz_excellent']:
+        words_bonus = 1 if activity_type == 'content_complete' else 2
+    
+    # Appended to the rating ledger with the next batch
+    activity_buffer.record(user_id, rating=total_points, words=words_bonus, activity=activity_type)
 
-async def get_user_rating_details(user_id: int):
-    """Get detailed user rating information"""
-    try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            # Get user data with all columns by position
-            cursor = await db.execute("""
-                SELECT * FROM users WHERE user_id = ?
-            """, (user_id,))
-            user = await cursor.fetchone()
-            
-            if not user:
-                return None
-            
-            # Extract data based on correct database positions
-            first_name = user[2] if len(user) > 2 else 'Anonim'  # [2] first_name
-            rating_score = user[14] if len(user) > 14 and user[14] is not None else 0.0  # [14] rating_score
-            words_learned = user[11] if len(user) > 11 and user[11] is not None else 0  # [11] words_learned 
-            quiz_score_total = user[12] if len(user) > 12 and user[12] is not None else 0  # [12] quiz_score_total
-            quiz_attempts = user[13] if len(user) > 13 and user[13] is not None else 0  # [13] quiz_attempts
-            total_sessions = user[10] if len(user) > 10 and user[10] is not None else 0  # [10] total_sessions
-            created_at = user[8] if len(user) > 8 else None  # [8] created_at
-            
-            # Calculate level (every 50 points = 1 level)
-            level = min(100, max(1, int(rating_score / 50) + 1))
-            
-            # Get ranking
-            cursor = await db.execute("""
-                SELECT COUNT(*) + 1 as ranking
-                FROM users 
-                WHERE rating_score > ? AND rating_score > 0
-            """, (rating_score,))
-            ranking_result = await cursor.fetchone()
-            ranking = ranking_result[0] if ranking_result else 1
-            
-            return {
-                'first_name': first_name or 'Anonim',
-                'rating_score': rating_score,
-                'words_learned': words_learned,
-                'quiz_score_total': quiz_score_total,
-                'quiz_attempts': quiz_attempts,
-                'total_sessions': total_sessions,
-                'level': level,
-                'ranking': ranking,
-                'created_at': created_at
-            }
-    except Exception as e:
-        print(f"Get user rating details error: {e}")
-        return None
-
-async def calculate_weekly_bonus():
-    """Calculate and award weekly activity bonuses"""
-    one_week_ago = datetime.now() - timedelta(days=7)
+async def reprice_ratings() -> int:
+    """Reprice every ledger event at the current RATING_POINTS and rebuild all ratings
+
+    Returns the number of users with points afterwards.
+    """
+    prices = {ACTIVITY_CODES[activity]: points for activity, points in RATING_POINTS.items()}
+    # Queued events are priced already; write them so the rebuild sees them
+    await activity_buffer.flush()
+    async with db_pool.transaction() as db:
+        await rebuild_from_ledger(db, prices)
+    user_cache.clear()
+    ranked = await rank_index.load(db_pool)
+    await leaderboard.refresh()
+    return ranked
+
+async def calculate_weekly_bonus() -> Tuple[int, List[Tuple[int, str, float]]]:
+    """Award the weekly activity bonus in one transaction
+
+    Returns the number of awarded users and their (user_id, first_name, rating_score),
+    highest rating first. Users already awarded in the last 6 days are skipped,
+    so a repeated run does not pay twice.
+    """
+    one_week_ago = days_ago(7)
+    weekly_code = ACTIVITY_CODES['weekly_active']
     
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        # Get users who were active this week
-        cursor = await db.execute("""
-            SELECT user_id, COUNT(*) as activity_count
-            FROM (
-                SELECT user_id FROM user_progress 
-                WHERE completed_at > ?
-                UNION ALL
-                SELECT user_id FROM quiz_attempts 
-                WHERE completed_at > ?
-            ) as activities
-            GROUP BY user_id
-            HAVING activity_count >= 5  -- At least 5 activities this week
-        """, (one_week_ago.isoformat(), one_week_ago.isoformat()))
+    async with db_pool.transaction() as db:
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM rating_events")
+        first_new_id = (await cursor.fetchone())[0]
         
-        active_users = await cursor.fetchall()
+        await db.execute(WEEKLY_BONUS_QUERY, (one_week_ago, one_week_ago, weekly_code, RATING_POINTS['weekly_active'], now_ts(),
+              weekly_code, days_ago(6)))
         
-        # Award weekly bonus
-        for user_id, activity_count in active_users:
-            await update_user_rating(user_id, 'weekly_active', 0)
+        deltas = await rollup_events(db)
+        
+        cursor = await db.execute("""
+            SELECT u.user_id, u.first_name, u.rating_score
+            FROM rating_events e
+            JOIN users u ON u.user_id = e.user_id
+            WHERE e.id > ? AND e.activity = ?
+            ORDER BY u.rating_score DESC
+        """, (first_new_id, weekly_code))
+        awarded = await cursor.fetchall()
+    
+    ratings_applied(deltas)
+    return len(awarded), awarded
 
 async def get_user_rating_details(user_id: int):
     """Get detailed rating information for user"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("""
-            SELECT rating_score, words_learned, quiz_score_total, 
-                   quiz_attempts, total_sessions, last_activity
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(f"""
+            SELECT {User.select_list(User.RATING)}
             FROM users 
             WHERE user_id = ?
         """, (user_id,))
-        user_data = await cursor.fetchone()
+        user = User.from_row(await cursor.fetchone(), User.RATING)
         
-        if not user_data:
+        if not user:
             return None
         
-        # Get user's ranking
-        cursor = await db.execute("""
-            SELECT COUNT(*) + 1 as ranking
-            FROM users 
-            WHERE rating_score > ? AND rating_score > 0
-        """, (user_data[0],))
-        ranking = (await cursor.fetchone())[0]
-        
-        # Calculate level based on rating
-        rating_score = user_data[0]
-        level = min(100, max(1, int(rating_score // 50) + 1))
-        
-        return {
-            'rating_score': rating_score,
-            'words_learned': user_data[1],
-            'quiz_score_total': user_data[2],
-            'quiz_attempts': user_data[3],
-            'total_sessions': user_data[4],
-            'last_activity': user_data[5],
-            'ranking': ranking,
-            'level': level
-        }
-
-async def get_rating_leaderboard(limit: int = 10, language: str = None):
-    """Get top users by rating, optionally filtered by language preference"""
-    query = """
-        SELECT u.user_id, u.first_name, u.username, u.rating_score, 
-               u.words_learned, u.quiz_score_total, u.last_activity
-        FROM users u
-        WHERE u.rating_score > 0
-    """
-    params = []
+        rating_score = user.rating_score or 0.0
     
-    if language:
-        # This would require tracking user's preferred language
-        # For now, we'll just get all users
-        pass
+    ranking = await get_user_rank(user_id)
     
-    query += " ORDER BY u.rating_score DESC LIMIT ?"
-    params.append(limit)
+    # Calculate level based on rating
+    level = min(100, max(1, int(rating_score // 50) + 1))
     
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute(query, params)
-        return await cursor.fetchall()
\ No newline at end of file
+    return {
+        'first_name': user.first_name or 'Anonim',
+        'rating_score': rating_score,
+        'words_learned': user.words_learned or 0,
+        'quiz_score_total': user.quiz_score_total or 0,
+        'quiz_attempts': user.quiz_attempts or 0,
+        'total_sessions': user.total_sessions or 0,
+        'last_activity': user.last_activity,
+        'created_at': user.created_at,
+        'ranking': ranking,
+        'percentile': rank_index.percentile(user_id),
+        'level': level
+    }
+
+async def get_rating_leaderboard(limit: int = 10, language: str = None):
+    """Get top users by rating, optionally filtered by language preference"""
+    if not language and limit <= leaderboard.size:
+        return (await leaderboard.get()).rows[:limit]
+
+    async with db_pool.acquire() as db:
+        if language:
+            cursor = await db.execute(LANGUAGE_LEADERBOARD_QUERY, (language, limit))
+        else:
+            cursor = await db.execute(RATING_LEADERBOARD_QUERY, (limit,))
+        return User.from_rows(await cursor.fetchall(), User.LEADERBOARD)
+
+async def get_window_leaderboard(window: str = 'week', limit: int = 10) -> List[Tuple[int, str, float]]:
+    """Top users by points earned inside the window, as (user_id, first_name, points)"""
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(WINDOW_LEADERBOARD_QUERY, (window_start_day(window), limit))
+        return await cursor.fetchall()
+
+async def get_window_rank(user_id: int, window: str = 'week') -> Tuple[int, float]:
+    """User's (rank, points) inside the window; users without points rank after everyone with points"""
+    start_day = window_start_day(window)
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(WINDOW_POINTS_QUERY, (user_id, start_day))
+        points = (await cursor.fetchone())[0]
+        
+        cursor = await db.execute(WINDOW_RANK_QUERY, (start_day, max(points, 0)))
+        ranking = (await cursor.fetchone())[0]
+    return ranking, points
@@ -1,48 +1,104 @@
 import asyncio
+import time
+from typing import Dict, Optional, Set
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime, timedelta
-import aiosqlite
 from aiogram import Bot
 
-from config import DATABASE_PATH, MOTIVATIONAL_MESSAGE_HOUR, PREMIUM_PROMOTION_DAYS
-from messages import MOTIVATIONAL_MESSAGES, PREMIUM_PROMOTION_MESSAGES
+from config import (
+    CAMPAIGN_POLL_SECONDS, CAMPAIGN_WINDOW_MINUTES, REMINDER_CATCHUP_MINUTES, JOB_MISFIRE_GRACE_SECONDS, SCHEDULER_LEASE_TTL, SCHEDULER_LEASE_HEARTBEAT,
+    MOTIVATIONAL_MESSAGE_HOUR, PREMIUM_PROMOTION_DAYS, RECIPIENT_PAGE_SIZE,
+)
+from database import (
+    db_pool, invalidate_users, campaign_outbox, iter_users, start_job_run, finish_job_run,
+    get_job_watermark, set_job_watermark,
+)
+from messages import DAILY_REMINDER, MOTIVATIONAL_MESSAGES, PREMIUM_PROMOTION_MESSAGES
+from utils.lease import Lease
 from utils.rating_system import calculate_weekly_bonus
+from utils.send_engine import send_engine, SENT, BLOCKED, FAILED
+from utils.timeutil import MINUTES_PER_DAY, days_ago, now_ts
 import random
-
-scheduler = AsyncIOScheduler()
+from datetime import datetime
+
+# Jobs live in memory; each run's start time is kept in job_state through the pool,
+# so a new leader catches up on a run missed within the grace time instead of
+# skipping it. A late or repeated trigger collapses into one run and a job never
+# overlaps itself
+scheduler = AsyncIOScheduler(
+    job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": JOB_MISFIRE_GRACE_SECONDS},
+)
+
+# Jobs hold only a job name; the bot is registered here by start_scheduler()
+_bot: Optional[Bot] = None
+_outbox_task: Optional[asyncio.Task] = None
+# Job runs in progress on this replica, cancelled when it stops being the leader
+_running_jobs: Set[asyncio.Task] = set()
+
+# Recipient selections streamed with iter_users(): (columns, where)
+ACTIVE_RECIPIENTS = (
+    ("user_id", "first_name", "rating_score", "words_learned", "quiz_score_total", "total_sessions"),
+    "last_activity > ? AND total_sessions >= 1",
+)
+PROMOTION_RECIPIENTS = (
+    ("user_id", "first_name", "rating_score", "words_learned", "quiz_score_total",
+     "total_sessions", "COALESCE(referral_count, 0)"),
+    "(is_premium = FALSE OR premium_expires_at < ?) AND last_activity > ? AND total_sessions >= 3",
+)
+# Users with their own daily reminder already hear from us every day
+INACTIVE_RECIPIENTS = (
+    ("user_id", "first_name"),
+    "last_activity BETWEEN ? AND ? AND total_sessions >= 2 AND reminder_utc_minute IS NULL",
+)
+REMINDER_RECIPIENTS = (("user_id", "first_name"), "reminder_utc_minute = ?")
+
+EXPIRED_PREMIUMS_QUERY = """
+    SELECT user_id, first_name, blocked_at 
+    FROM users 
+    WHERE is_premium = 1 
+    AND premium_expires_at < ?
+    LIMIT ?
+"""
+
+EXPIRE_PREMIUM_QUERY = """
+    UPDATE users 
+    SET is_premium = FALSE 
+    WHERE user_id = ? AND is_premium = 1 
+    AND premium_expires_at < ?
+"""
 
 async def send_weekly_motivational_messages(bot: Bot):
     """Send personalized weekly motivational messages based on user activity and progress"""
-    try:
-        # Get users with different activity levels for personalized messages
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT user_id, first_name, rating_score, words_learned, quiz_score_total, 
-                       total_sessions, last_activity
-                FROM users 
-                WHERE last_activity > date('now', '-7 days') AND total_sessions >= 1
-                ORDER BY rating_score DESC, last_activity DESC
-                LIMIT 500
-            """)
-            active_users = await cursor.fetchall()
-        
-        print(f"Database query returned {len(active_users)} users")
-        if not active_users:
-            print("No active users found, exiting function")
-            return
-        
-        sent_count = 0
-        print(f"Found {len(active_users)} active users to send messages to")
-        
-        for user_id, first_name, rating, words, quiz_score, sessions, last_activity in active_users:
-            try:
-                name = first_name or "Do'stim"
-                print(f"Attempting to send message to user {user_id} ({name})")
-                
-                # Personalized message based on user progress
-                if rating >= 100:  # High achievers - motivate to continue
-                    message = f"""
+    # Every user active this week, streamed page by page into the outbox
+    active_users = iter_users(*ACTIVE_RECIPIENTS, (days_ago(7),))
+    
+    # One campaign per ISO week, so a rerun or a restart resumes instead of resending
+    campaign = await run_campaign(
+        bot, f"weekly_motivational:{datetime.now().strftime('%G-W%V')}", "Haftalik motivatsiya",
+        ((row[0], motivational_message(*row[1:])) async for row in active_users)
+    )
+    if campaign is None:
+        return None
+    print(f"Sent personalized weekly motivational messages to {campaign.sent} users "
+          f"({campaign.blocked} blocked, {campaign.failed} failed, {campaign.pending} pending)")
+    return {SENT: campaign.sent, FAILED: campaign.failed, BLOCKED: campaign.blocked}
+
+async def run_campaign(bot: Bot, key: str, title: str, recipients):
+    """Store a scheduled campaign spread over the delivery window and drain it"""
+    campaign_id, created = await campaign_outbox.create(
+        key, title, recipients, window=CAMPAIGN_WINDOW_MINUTES * 60
+    )
+    if not created:
+        print(f"Campaign {key} already exists, resuming it")
+    # None when the outbox loop got to it first; report the progress so far then
+    return await campaign_outbox.drain(bot, campaign_id) or await campaign_outbox.progress(campaign_id)
+
+def motivational_message(first_name, rating, words, quiz_score, sessions) -> str:
+    """Personalized weekly message based on user progress"""
+    name = first_name or "Do'stim"
+    if rating >= 100:  # High achievers - motivate to continue
+        message = f"""
 🏆 <b>Mukammal natijalar, {name}!</b>
 
 Siz haqiqatan ham ajoyib o'rganyapsiz! 
@@ -64,9 +120,9 @@ Siz haqiqatan ham ajoyib o'rganyapsiz!
 /premium - batafsil ma'lumot olish
 
 Davom eting - muvaffaqiyat sizni kutmoqda! 🚀
-                    """
-                elif rating >= 50:  # Medium achievers - encourage and promote premium
-                    message = f"""
+        """
+    elif rating >= 50:  # Medium achievers - encourage and promote premium
+        message = f"""
 ⭐ <b>Ajoyib natijalar, {name}!</b>
 
 Siz yaxshi yo'lda ketyapsiz!
@@ -91,9 +147,9 @@ Siz yaxshi yo'lda ketyapsiz!
 /premium buyrug'ini yuboring!
 
 Bu hafta yangi cho'qqilarga chiqaylik! 📚
-                    """
-                else:  # Beginners - basic motivation with gentle premium hint
-                    message = f"""
+        """
+    else:  # Beginners - basic motivation with gentle premium hint
+        message = f"""
 🚀 <b>Ajoyib boshlanish, {name}!</b>
 
 Til o'rganish sayohatingiz boshlanmoqda!
@@ -117,54 +173,31 @@ Til o'rganish sayohatingiz boshlanmoqda!
 /premium - batafsil ma'lumot
 
 Kichik qadamlar katta natijalarga olib keladi! 📖
-                    """
-                
-                await bot.send_message(user_id, message.strip())
-                print(f"✅ Message sent successfully to user {user_id}")
-                sent_count += 1
-                
-                # Small delay to avoid hitting rate limits
-                await asyncio.sleep(0.15)
-                
-            except Exception as e:
-                # User might have blocked the bot
-                print(f"❌ Failed to send message to user {user_id}: {e}")
-                continue
-        
-        print(f"Sent personalized weekly motivational messages to {sent_count} users")
-        
-    except Exception as e:
-        print(f"Error sending motivational messages: {e}")
+        """
+    return message.strip()
 
 async def send_premium_promotion_messages(bot: Bot):
     """Send personalized premium promotion based on user engagement and progress"""
-    try:
-        # Get active non-premium users with their progress data
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT user_id, first_name, rating_score, words_learned, quiz_score_total, 
-                       total_sessions, COALESCE(referral_count, 0) as referral_count
-                FROM users 
-                WHERE (is_premium = FALSE OR premium_expires_at < CURRENT_TIMESTAMP)
-                AND last_activity > date('now', '-14 days')
-                AND total_sessions >= 3
-                ORDER BY rating_score DESC, total_sessions DESC
-                LIMIT 300
-            """)
-            non_premium_users = await cursor.fetchall()
-        
-        if not non_premium_users:
-            return
-            
-        sent_count = 0
-        for user_id, first_name, rating, words, quiz_score, sessions, referrals in non_premium_users:
-            try:
-                name = first_name or "Do'stim"
-                remaining_referrals = max(0, 10 - (referrals or 0))
-                
-                # Personalized premium promotion based on user engagement  
-                if rating >= 80 and sessions >= 15:  # High engagement users - special offers
-                    message = f"""
+    # Active non-premium users with their progress data
+    non_premium_users = iter_users(*PROMOTION_RECIPIENTS, (now_ts(), days_ago(14)))
+    
+    campaign = await run_campaign(
+        bot, f"premium_promotion:{datetime.now().strftime('%Y-%m-%d')}", "Premium taklifi",
+        ((row[0], promotion_message(*row[1:])) async for row in non_premium_users)
+    )
+    if campaign is None:
+        return None
+    print(f"Sent premium promotion messages to {campaign.sent} users")
+    return {SENT: campaign.sent, FAILED: campaign.failed, BLOCKED: campaign.blocked}
+
+def promotion_message(first_name, rating, words, quiz_score, sessions, referrals) -> str:
+    """Premium promotion tailored to user engagement"""
+    name = first_name or "Do'stim"
+    remaining_referrals = max(0, 10 - (referrals or 0))
+    
+    # Personalized premium promotion based on user engagement  
+    if rating >= 80 and sessions >= 15:  # High engagement users - special offers
+        message = f"""
 💎 <b>TOP foydalanuvchi uchun maxsus taklif!</b>
 
 {name}, siz bizning eng faol o'quvchimiz!
@@ -188,9 +221,9 @@ async def send_premium_promotion_messages(bot: Bot):
 🎁 Yoki {remaining_referrals} ta do'st = 1 oy BEPUL!
 
 Sizning darajangizda Premium zarur! /premium
-                    """
-                elif sessions >= 8:  # Medium engagement - convince with benefits
-                    message = f"""
+        """
+    elif sessions >= 8:  # Medium engagement - convince with benefits
+        message = f"""
 🌟 <b>Natijalaringizni 2x oshiring!</b>
 
 {name}, siz yaxshi yo'ldasiz!
@@ -213,9 +246,9 @@ Sizning darajangizda Premium zarur! /premium
 👥 {remaining_referrals} ta referral = BEPUL oy!
 
 Bugun boshlang: /premium
-                    """
-                else:  # New/less active users - basic introduction
-                    message = f"""
+        """
+    else:  # New/less active users - basic introduction
+        message = f"""
 🚀 <b>Imkoniyatlaringizni oshiring!</b>
 
 {name}, ajoyib boshlanish!
@@ -234,43 +267,18 @@ Premium bilan nima olasiz:
 Sizning referral hisobingiz: {referrals or 0}/10
 
 Bugun boshlang! /premium
-                    """
-                
-                await bot.send_message(user_id, message.strip())
-                sent_count += 1
-                
-                # Delay to avoid rate limits
-                await asyncio.sleep(0.2)
-                
-            except Exception as e:
-                continue
-        
-        print(f"Sent premium promotion messages to {sent_count} users")
-        
-    except Exception as e:
-        print(f"Error sending premium promotion messages: {e}")
+        """
+    return message.strip()
 
 async def award_weekly_bonuses(bot: Bot):
     """Award weekly activity bonuses to users"""
-    try:
-        awarded_users = await calculate_weekly_bonus()
-        print(f"Awarded weekly bonuses to {awarded_users} users")
-        
-        # Optionally notify top performers
-        if awarded_users > 0:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                cursor = await db.execute("""
-                    SELECT user_id, first_name, rating_score
-                    FROM users 
-                    WHERE rating_score > 0
-                    ORDER BY rating_score DESC
-                    LIMIT 3
-                """)
-                top_users = await cursor.fetchall()
-                
-                for user_id, first_name, rating_score in top_users:
-                    try:
-                        bonus_message = f"""
+    awarded_count, awarded_users = await calculate_weekly_bonus()
+    print(f"Awarded weekly bonuses to {awarded_count} users")
+    
+    # Notify the top 3 awarded users
+    if awarded_count > 0:
+        return await send_engine.send_many(bot, (
+            (user_id, f"""
 🏆 <b>Haftalik bonus!</b>
 
 Salom {first_name}! 🎉
@@ -281,41 +289,50 @@ Siz bu hafta juda faol bo'ldingiz va haftalik faollik bonusi oldingiz!
 🎯 Davom eting va eng yaxshilar orasida bo'ling!
 
 Ko'proq o'rganing, ko'proq ball to'plang! 💪
-                        """
-                        await bot.send_message(user_id, bonus_message)
-                        await asyncio.sleep(0.2)
-                    except:
-                        continue
-        
-    except Exception as e:
-        print(f"Error awarding weekly bonuses: {e}")
+            """)
+            for user_id, first_name, rating_score in awarded_users[:3]
+        ))
 
 async def cleanup_expired_premiums(bot: Bot):
     """Clean up expired premium subscriptions"""
-    try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            # Get users whose premium just expired
-            cursor = await db.execute("""
-                SELECT user_id, first_name 
-                FROM users 
-                WHERE is_premium = TRUE 
-                AND premium_expires_at < CURRENT_TIMESTAMP
-            """)
+    now = now_ts()
+    expired_count = 0
+    counts = {SENT: 0, FAILED: 0, BLOCKED: 0}
+    
+    # Expired users drop out of the query once updated, so each pass reads the next page
+    while True:
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(EXPIRED_PREMIUMS_QUERY, (now, RECIPIENT_PAGE_SIZE))
             expired_users = await cursor.fetchall()
-            
-            # Update their status
-            await db.execute("""
-                UPDATE users 
-                SET is_premium = FALSE 
-                WHERE is_premium = TRUE 
-                AND premium_expires_at < CURRENT_TIMESTAMP
-            """)
-            await db.commit()
-            
-            # Notify users about expiration
-            for user_id, first_name in expired_users:
-                try:
-                    expiry_message = f"""
+        if not expired_users:
+            break
+        
+        # Update their status; the condition is rechecked per user in case of a renewal in between,
+        # and only users whose row actually changed are told
+        expired = []
+        async with db_pool.transaction() as db:
+            for user_id, first_name, blocked_at in expired_users:
+                cursor = await db.execute(EXPIRE_PREMIUM_QUERY, (user_id, now))
+                if cursor.rowcount == 1:
+                    expired.append((user_id, first_name, blocked_at))
+        invalidate_users(user_id for user_id, _, _ in expired_users)
+        expired_count += len(expired)
+        
+        # Notify users about expiration, skipping chats known to be dead
+        page_counts = await send_engine.send_many(bot, (
+            (user_id, premium_expired_message(first_name))
+            for user_id, first_name, blocked_at in expired if blocked_at is None
+        ))
+        for status, count in page_counts.items():
+            counts[status] += count
+        counts[BLOCKED] += sum(1 for _, _, blocked_at in expired if blocked_at is not None)
+    
+    print(f"Cleaned up {expired_count} expired premium subscriptions")
+    return counts
+
+def premium_expired_message(first_name) -> str:
+    """Notice sent when a premium subscription lapses"""
+    return f"""
 ⏰ <b>Premium obuna tugadi!</b>
 
 Salom {first_name}!
@@ -328,118 +345,219 @@ Sizning premium obunangiz tugadi. Premium imkoniyatlardan foydalanishni davom et
 Premium obuna uchun: /premium
 
 Rahmat! 🙏
-                    """
-                    await bot.send_message(user_id, expiry_message)
-                    await asyncio.sleep(0.1)
-                except:
-                    continue
-            
-            print(f"Cleaned up {len(expired_users)} expired premium subscriptions")
-        
-    except Exception as e:
-        print(f"Error cleaning up expired premiums: {e}")
+            """
 
 async def send_engagement_reminders(bot: Bot):
     """Send reminders to inactive users"""
-    try:
-        # Get users inactive for 3-7 days
-        three_days_ago = datetime.now() - timedelta(days=3)
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute("""
-                SELECT user_id, first_name, last_activity
-                FROM users 
-                WHERE last_activity BETWEEN ? AND ?
-                AND total_sessions >= 2
-                ORDER BY rating_score DESC
-                LIMIT 200
-            """, (seven_days_ago.isoformat(), three_days_ago.isoformat()))
-            inactive_users = await cursor.fetchall()
-        
-        reminder_messages = [
-            "👋 {name}, sizni sog'indik! Til o'rganishni davom ettiramizmi? 📚",
-            "🌟 {name}, yangi darslar kutayapti! Keling, o'rganishni davom ettiraylik! 🚀",
-            "📖 {name}, bilimlaringizni yangilash vaqti keldi! Testlarni ham unutmang! 🧠",
-            "🎯 {name}, maqsadlaringizga erishish uchun har kun bir qadam tashlang! 💪"
-        ]
-        
-        sent_count = 0
-        for user_id, first_name, last_activity in inactive_users:
-            try:
-                message = random.choice(reminder_messages)
-                personalized_message = message.format(name=first_name or "Do'stim")
-                await bot.send_message(user_id, personalized_message)
-                sent_count += 1
-                await asyncio.sleep(0.2)
-            except:
-                continue
-        
-        print(f"Sent engagement reminders to {sent_count} users")
-        
-    except Exception as e:
-        print(f"Error sending engagement reminders: {e}")
-
-async def start_scheduler(bot: Bot):
-    """Start the scheduler with all jobs"""
+    # Get users inactive for 3-7 days
+    three_days_ago = days_ago(3)
+    seven_days_ago = days_ago(7)
     
-    print(f"[SCHEDULER] Starting scheduler setup...")
-    print(f"[SCHEDULER] Current scheduler state: {scheduler.running}")
+    inactive_users = iter_users(*INACTIVE_RECIPIENTS, (seven_days_ago, three_days_ago))
     
-    # Check if scheduler is already running
-    if scheduler.running:
-        print("[SCHEDULER] Scheduler already running, skipping setup")
+    reminder_messages = [
+        "👋 {name}, sizni sog'indik! Til o'rganishni davom ettiramizmi? 📚",
+        "🌟 {name}, yangi darslar kutayapti! Keling, o'rganishni davom ettiraylik! 🚀",
+        "📖 {name}, bilimlaringizni yangilash vaqti keldi! Testlarni ham unutmang! 🧠",
+        "🎯 {name}, maqsadlaringizga erishish uchun har kun bir qadam tashlang! 💪"
+    ]
+    
+    counts = await send_engine.send_many(bot, (
+        (user_id, random.choice(reminder_messages).format(name=first_name or "Do'stim"))
+        async for user_id, first_name in inactive_users
+    ))
+    print(f"Sent engagement reminders to {counts[SENT]} users")
+    return counts
+
+async def send_daily_reminders(bot: Bot):
+    """Send the daily reminder to every minute bucket since the last one served
+
+    The watermark is the last absolute UTC minute whose bucket was fully sent.
+    Minutes skipped by a slow tick, a restart or a leader change are caught
+    up on the next run, unless they are more than REMINDER_CATCHUP_MINUTES late.
+    """
+    current = now_ts() // 60
+    last = await get_job_watermark('daily_reminders')
+    first = current if last is None else max(last + 1, current - REMINDER_CATCHUP_MINUTES + 1)
+    
+    counts = {SENT: 0, FAILED: 0, BLOCKED: 0}
+    for minute in range(first, current + 1):
+        due_users = iter_users(*REMINDER_RECIPIENTS, (minute % MINUTES_PER_DAY,))
+        bucket_counts = await send_engine.send_many(bot, (
+            (user_id, DAILY_REMINDER.format(name=first_name or "Do'stim"))
+            async for user_id, first_name in due_users
+        ))
+        for status, count in bucket_counts.items():
+            counts[status] += count
+        await set_job_watermark('daily_reminders', minute)
+    
+    if not any(counts.values()):
+        return None
+    print(f"Sent daily reminders to {counts[SENT]} users")
+    return counts
+
+# Job name -> coroutine taking the bot and returning send counts (or None when nothing was sent)
+JOBS = {
+    'weekly_motivational': send_weekly_motivational_messages,
+    'premium_promotion': send_premium_promotion_messages,
+    'weekly_bonuses': award_weekly_bonuses,
+    'cleanup_premiums': cleanup_expired_premiums,
+    'engagement_reminders': send_engagement_reminders,
+    'daily_reminders': send_daily_reminders,
+}
+
+# Per-minute jobs that only get a job_runs row when they sent something or failed;
+# they catch up through their own watermark instead of a recorded run time
+QUIET_JOBS = {'daily_reminders'}
+
+def last_run_key(job_id: str) -> str:
+    """job_state row holding when a scheduled job last started"""
+    return f"last_run:{job_id}"
+
+async def run_job(name: str, job_id: Optional[str] = None):
+    """Entry point of every scheduled job: runs it with the registered bot and logs it to job_runs"""
+    if _bot is None:
+        print(f"[SCHEDULER] No bot registered, skipping {name}")
+        return
+    if not scheduler_lease.held:
+        print(f"[SCHEDULER] Not the lease holder, skipping {name}")
         return
     
+    # Quiet jobs open their row only once there is something to log
+    started_at = now_ts()
+    if job_id is not None and name not in QUIET_JOBS:
+        await set_job_watermark(last_run_key(job_id), started_at)
+    run_id = None if name in QUIET_JOBS else await start_job_run(name)
+    started = time.monotonic()
+    counts: Optional[Dict[str, int]] = None
+    error = None
+    task = asyncio.current_task()
+    _running_jobs.add(task)
+    try:
+        counts = await JOBS[name](_bot)
+    except asyncio.CancelledError:
+        error = "cancelled: scheduler lease lost"
+        print(f"[SCHEDULER] {name} cancelled, this replica is no longer the leader")
+        raise
+    except Exception as e:
+        error = str(e)
+        print(f"[SCHEDULER] Error in {name}: {e}")
+    finally:
+        _running_jobs.discard(task)
+        if run_id is None and (counts is not None or error is not None):
+            run_id = await start_job_run(name, started_at)
+        if run_id is not None:
+            counts = counts or {}
+            await finish_job_run(
+                run_id, int((time.monotonic() - started) * 1000),
+                counts.get(SENT, 0), counts.get(FAILED, 0), counts.get(BLOCKED, 0), error
+            )
+
+def _schedule(job_id: str, name: str, trigger: CronTrigger) -> None:
+    scheduler.add_job(run_job, trigger, args=[name, job_id], id=job_id, replace_existing=True)
+
+def _configure_jobs() -> None:
     # Weekly motivational messages - every Monday at 10 AM
-    scheduler.add_job(
-        send_weekly_motivational_messages,
-        CronTrigger(day_of_week=0, hour=MOTIVATIONAL_MESSAGE_HOUR, minute=0),
-        args=[bot],
-        id='weekly_motivational'
-    )
+    _schedule('weekly_motivational', 'weekly_motivational',
+              CronTrigger(day_of_week=0, hour=MOTIVATIONAL_MESSAGE_HOUR, minute=0))
     
     # Premium promotion messages - 1st and 15th of every month at 2 PM
     for day in PREMIUM_PROMOTION_DAYS:
-        scheduler.add_job(
-            send_premium_promotion_messages,
-            CronTrigger(day=day, hour=14, minute=0),
-            args=[bot],
-            id=f'premium_promotion_{day}'
-        )
+        _schedule(f'premium_promotion_{day}', 'premium_promotion', CronTrigger(day=day, hour=14, minute=0))
     
     # Weekly bonuses - every Sunday at 11 PM
-    scheduler.add_job(
-        award_weekly_bonuses,
-        CronTrigger(day_of_week=6, hour=23, minute=0),
-        args=[bot],
-        id='weekly_bonuses'
-    )
+    _schedule('weekly_bonuses', 'weekly_bonuses', CronTrigger(day_of_week=6, hour=23, minute=0))
     
     # Clean up expired premiums - daily at midnight
-    scheduler.add_job(
-        cleanup_expired_premiums,
-        CronTrigger(hour=0, minute=30),
-        args=[bot],
-        id='cleanup_premiums'
-    )
+    _schedule('cleanup_premiums', 'cleanup_premiums', CronTrigger(hour=0, minute=30))
     
     # Engagement reminders - every Tuesday and Friday at 6 PM
-    scheduler.add_job(
-        send_engagement_reminders,
-        CronTrigger(day_of_week='1,4', hour=18, minute=0),
-        args=[bot],
-        id='engagement_reminders'
-    )
+    _schedule('engagement_reminders', 'engagement_reminders', CronTrigger(day_of_week='1,4', hour=18, minute=0))
     
-    # Start scheduler
+    # Daily reminders - every minute, each tick serves one UTC minute bucket
+    _schedule('daily_reminders', 'daily_reminders', CronTrigger(minute='*'))
+
+async def _catch_up_missed_runs() -> None:
+    """Run each job at once whose fire time passed since its recorded last run, within the grace time
+
+    Covers restarts and leader changes: the in-memory schedule only knows
+    fire times from now on.
+    """
+    now = now_ts()
+    for job in scheduler.get_jobs():
+        if job.args[0] in QUIET_JOBS:
+            continue
+        last = await get_job_watermark(last_run_key(job.id))
+        if last is None:
+            # First start with this job: nothing to catch up on, but later starts can tell
+            await set_job_watermark(last_run_key(job.id), now)
+            continue
+        missed = job.trigger.get_next_fire_time(None, datetime.fromtimestamp(last + 1, job.trigger.timezone))
+        if missed is not None and 0 <= now - missed.timestamp() <= JOB_MISFIRE_GRACE_SECONDS:
+            print(f"[SCHEDULER] {job.id} missed its run at {missed}, running it now")
+            job.modify(next_run_time=datetime.now(job.trigger.timezone))
+
+async def _became_leader() -> None:
+    """This replica holds the lease: run the cron jobs and drain the campaign outbox"""
+    global _outbox_task
     try:
-        scheduler.start()
+        if not scheduler.running:
+            # Paused until the jobs are configured, so nothing fires half-configured
+            scheduler.start(paused=True)
+        # The last leader may have run jobs since this replica's schedule was built,
+        # so it is rebuilt from the recorded run times rather than resumed
+        _configure_jobs()
+        await _catch_up_missed_runs()
+        scheduler.resume()
         print("[SCHEDULER] ✅ Scheduler started successfully with all jobs")
     except Exception as e:
         print(f"[SCHEDULER] ❌ Error starting scheduler: {e}")
+    
+    _outbox_task = asyncio.create_task(campaign_outbox.serve(_bot, CAMPAIGN_POLL_SECONDS))
+
+async def _stop_jobs() -> None:
+    """Pause the triggers and cancel every send this replica has in flight
+
+    Waits for the cancelled runs to finish, so nothing is sent once this returns.
+    A cancelled campaign keeps its pending outbox rows; at most the batch in
+    flight is sent again by the next leader.
+    """
+    if scheduler.running:
+        scheduler.pause()
+    tasks = list(_running_jobs)
+    if _outbox_task is not None:
+        tasks.append(_outbox_task)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def _lost_leadership() -> None:
+    """Another replica runs the jobs now; pending outbox rows are left for it"""
+    await _stop_jobs()
+    print("[SCHEDULER] Lease lost, jobs stopped on this replica")
+
+# Only the replica holding this lease runs cron jobs and drains campaigns
+scheduler_lease = Lease(
+    db_pool, "scheduler", ttl=SCHEDULER_LEASE_TTL, heartbeat=SCHEDULER_LEASE_HEARTBEAT,
+    on_acquired=_became_leader, on_lost=_lost_leadership,
+)
+
+async def start_scheduler(bot: Bot):
+    """Register the bot and compete for the scheduler lease; jobs start once it is held"""
+    global _bot
+    
+    print(f"[SCHEDULER] Starting scheduler setup...")
+    print(f"[SCHEDULER] Current scheduler state: {scheduler.running}")
+    
+    _bot = bot
+    scheduler_lease.start()
+    print(f"[SCHEDULER] Waiting for the scheduler lease as {scheduler_lease.holder}")
 
 async def stop_scheduler():
-    """Stop the scheduler"""
-    scheduler.shutdown()
+    """Stop the scheduler and hand the lease to another replica"""
+    # Sends stop before the lease is released, so the next leader never overlaps them
+    await _stop_jobs()
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await scheduler_lease.stop()
     print("Scheduler stopped")
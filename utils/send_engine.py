@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import random
+import time
+from typing import AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError,
+)
+
+from config import (
+    SEND_RATE_PER_SEC, SEND_PER_CHAT_INTERVAL, SEND_WORKERS, SEND_MAX_RETRIES, SEND_BACKOFF_BASE, SEND_BACKOFF_MAX,
+)
+
+logger = logging.getLogger(__name__)
+
+# Outcome of one delivery attempt
+SENT = "sent"
+BLOCKED = "blocked"  # user blocked the bot, deleted the account or the chat is gone
+FAILED = "failed"
+
+# (chat_id, text)
+Outgoing = Tuple[int, str]
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        # Default capacity of one token paces sends evenly instead of bursting
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for `seconds`, e.g. during a Telegram flood wait"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        # The lock queues waiters in arrival order, so one token is handed out at a time
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class ChatLimiter:
+    """Keeps at least `interval` seconds between two messages to the same chat"""
+
+    def __init__(self, interval: float, max_chats: int = 10000):
+        self.interval = interval
+        self.max_chats = max_chats
+        self._next: Dict[int, float] = {}
+
+    async def acquire(self, chat_id: int) -> None:
+        now = time.monotonic()
+        if len(self._next) > self.max_chats:
+            self._next = {cid: t for cid, t in self._next.items() if t > now}
+        slot = max(now, self._next.get(chat_id, 0.0))
+        self._next[chat_id] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class SendEngine:
+    """Shared outgoing message pipeline for every bulk sender
+
+    All sends pass one global token bucket (Telegram allows about 30 msg/s per
+    bot) and a per-chat limiter; send_many() fans a recipient stream out to
+    `workers` concurrent senders. A flood wait (RetryAfter) pauses the bucket,
+    so every sender stops until it is over; network and 5xx errors are retried
+    with capped exponential backoff.
+    """
+
+    def __init__(self, rate: float = 29, per_chat_interval: float = 1.0, workers: int = 8,
+                 max_retries: int = 3, backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.bucket = TokenBucket(rate)
+        self.chats = ChatLimiter(per_chat_interval)
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Awaited with the chat ids that came back BLOCKED, e.g. to flag them in the database
+        self.on_blocked: Optional[Callable[[List[int]], Awaitable[None]]] = None
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential delay capped at backoff_max, with jitter so workers do not retry in step"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def _send(self, bot: Bot, chat_id: int, text: str, **kwargs) -> str:
+        attempt = 0
+        while True:
+            await self.chats.acquire(chat_id)
+            await self.bucket.acquire()
+            delay = 0.0
+            try:
+                await bot.send_message(chat_id, text, **kwargs)
+                return SENT
+            except TelegramRetryAfter as e:
+                # The limit is per bot, so hold back every sender; the bucket does the waiting
+                self.bucket.pause(e.retry_after)
+                error = e
+            except TelegramForbiddenError:
+                return BLOCKED
+            except TelegramBadRequest as e:
+                if "chat not found" in str(e).lower():
+                    return BLOCKED
+                logger.warning("Send to %s failed: %s", chat_id, e)
+                return FAILED
+            except (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError) as e:
+                delay = self._backoff(attempt)
+                error = e
+            except Exception as e:
+                logger.warning("Send to %s failed: %s", chat_id, e)
+                return FAILED
+
+            if attempt >= self.max_retries:
+                logger.warning("Send to %s failed after %d attempts: %s", chat_id, attempt + 1, error)
+                return FAILED
+            attempt += 1
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def send(self, bot: Bot, chat_id: int, text: str, **kwargs) -> str:
+        """Send one message through the limiters with retries; returns SENT, BLOCKED or FAILED"""
+        status = await self._send(bot, chat_id, text, **kwargs)
+        if status == BLOCKED and self.on_blocked is not None:
+            try:
+                await self.on_blocked([chat_id])
+            except Exception as e:
+                logger.error("Blocked chats update error: %s", e)
+        return status
+
+    async def send_many(self, bot: Bot, messages: Union[Iterable[Outgoing], AsyncIterable[Outgoing]],
+                        on_result: Optional[Callable[[int, str], None]] = None, **kwargs) -> Dict[str, int]:
+        """Deliver (chat_id, text) pairs with bounded concurrency; returns counts per outcome
+
+        on_result(chat_id, status) is called after every attempt.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        counts = {SENT: 0, BLOCKED: 0, FAILED: 0}
+        blocked: List[int] = []
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    chat_id, text = item
+                    status = await self._send(bot, chat_id, text, **kwargs)
+                    counts[status] += 1
+                    if status == BLOCKED:
+                        blocked.append(chat_id)
+                    if on_result is not None:
+                        on_result(chat_id, status)
+                finally:
+                    queue.task_done()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            if hasattr(messages, "__aiter__"):
+                async for item in messages:
+                    await queue.put(item)
+            else:
+                for item in messages:
+                    await queue.put(item)
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if blocked and self.on_blocked is not None:
+                try:
+                    await self.on_blocked(blocked)
+                except Exception as e:
+                    logger.error("Blocked chats update error: %s", e)
+        return counts
+
+# Process-wide engine; every bulk sender goes through it so the limits are shared
+send_engine = SendEngine(
+    rate=SEND_RATE_PER_SEC, per_chat_interval=SEND_PER_CHAT_INTERVAL, workers=SEND_WORKERS,
+    max_retries=SEND_MAX_RETRIES, backoff_base=SEND_BACKOFF_BASE, backoff_max=SEND_BACKOFF_MAX,
+)
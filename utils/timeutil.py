@@ -0,0 +1,48 @@
+import time
+from datetime import datetime
+from typing import Optional
+
+# All time columns are stored as INTEGER epoch seconds (UTC)
+DAY = 86400
+
+# Column default for new rows, same value as now_ts() at insert time
+SQL_NOW = "(CAST(strftime('%s', 'now') AS INTEGER))"
+
+def now_ts() -> int:
+    """Current time as epoch seconds"""
+    return int(time.time())
+
+def days_ago(days: float) -> int:
+    return now_ts() - int(days * DAY)
+
+def days_from_now(days: float) -> int:
+    return now_ts() + int(days * DAY)
+
+def to_ts(value: datetime) -> int:
+    return int(value.timestamp())
+
+def from_ts(ts: Optional[int]) -> Optional[datetime]:
+    """Local datetime for display, None stays None"""
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(int(ts))
+
+# Daily reminders are bucketed by UTC minute of the day
+MINUTES_PER_DAY = 1440
+
+def utc_minute_of_day(local_minute: int, tz_offset: int) -> int:
+    """UTC minute of the day for a local minute at `tz_offset` minutes east of UTC"""
+    return (local_minute - tz_offset) % MINUTES_PER_DAY
+
+def format_ts(ts: Optional[int], fmt: str = "%Y-%m-%d %H:%M", default: str = "") -> str:
+    if ts is None:
+        return default
+    return from_ts(ts).strftime(fmt)
+
+def epoch_sql(column: str) -> str:
+    """SQL expression converting a legacy text/datetime column to epoch seconds"""
+    return (
+        f"CASE WHEN {column} IS NULL THEN NULL "
+        f"WHEN typeof({column}) IN ('integer', 'real') THEN CAST({column} AS INTEGER) "
+        f"ELSE CAST(strftime('%s', {column}) AS INTEGER) END"
+    )
@@ -0,0 +1,110 @@
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from utils.rating_ledger import RatingEvent, activity_code, append_events, rollup_events
+from utils.timeutil import now_ts
+
+class ActivityCoalescer:
+    """Collects per-user session/words deltas and rating events and writes them in batches
+
+    Rating points are appended to the rating_events ledger and folded into
+    users.rating_score by the rollup in the same transaction.
+    """
+
+    def __init__(self, pool, interval_ms: int = 1000, max_events: int = 200,
+                 on_flush: Optional[Callable[[Dict[int, List]], None]] = None):
+        self.pool = pool
+        # Called with the flushed {user_id: [sessions, rating, words]}, e.g. to drop cached rows
+        self.on_flush = on_flush
+        self.interval = interval_ms / 1000
+        self.max_events = max(1, max_events)
+        # user_id -> [sessions, rating, words]; rating is filled in from the rollup on flush
+        self._pending: Dict[int, List] = {}
+        self._rating_events: List[RatingEvent] = []
+        self._events = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending_users(self) -> int:
+        return len(self._pending)
+
+    def _merge(self, user_id: int, sessions: int, rating: float, words: int) -> None:
+        entry = self._pending.get(user_id)
+        if entry is None:
+            self._pending[user_id] = [sessions, rating, words]
+        else:
+            entry[0] += sessions
+            entry[1] += rating
+            entry[2] += words
+
+    def record(self, user_id: int, sessions: int = 0, rating: float = 0.0, words: int = 0,
+               activity: str = 'other') -> None:
+        """Queue deltas for a user; they reach the database on the next flush"""
+        self._merge(user_id, sessions, 0.0, words)
+        if rating:
+            self._rating_events.append((user_id, activity_code(activity), rating, now_ts()))
+        self._events += 1
+        if self._events >= self.max_events:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        """Write all queued deltas in one transaction, returns the number of users"""
+        if not self._pending:
+            return 0
+
+        batch, self._pending = self._pending, {}
+        events, self._rating_events = self._rating_events, []
+        self._events = 0
+        now = now_ts()
+        try:
+            async with self.pool.transaction() as db:
+                await db.executemany("""
+                    UPDATE users
+                    SET total_sessions = total_sessions + ?,
+                        words_learned = words_learned + ?,
+                        last_activity = ?
+                    WHERE user_id = ?
+                """, [(s, w, now, user_id) for user_id, (s, _, w) in batch.items()])
+                await append_events(db, events)
+                deltas = await rollup_events(db)
+        except BaseException:
+            # Put the batch back so nothing is lost, newer deltas are merged in
+            for user_id, (s, r, w) in batch.items():
+                self._merge(user_id, s, r, w)
+            self._rating_events[:0] = events
+            raise
+
+        for user_id, points in deltas.items():
+            batch.setdefault(user_id, [0, 0.0, 0])[1] = points
+        if self.on_flush:
+            self.on_flush(batch)
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Activity flush error: {e}")
+
+    def start(self) -> None:
+        """Start the background flush loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()